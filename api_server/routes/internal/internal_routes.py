@@ -4,6 +4,8 @@ from folder_paths import models_dir, user_directory, output_directory, folder_na
 from api_server.services.file_service import FileService
 from api_server.services.terminal_service import TerminalService
 import app.logger
+from app import json_util
+from app import startup_profiler
 
 class InternalRoutes:
     '''
@@ -29,20 +31,20 @@ class InternalRoutes:
             directory_key = request.query.get('directory', '')
             try:
                 file_list = self.file_service.list_files(directory_key)
-                return web.json_response({"files": file_list})
+                return json_util.json_response({"files": file_list})
             except ValueError as e:
-                return web.json_response({"error": str(e)}, status=400)
+                return json_util.json_response({"error": str(e)}, status=400)
             except Exception as e:
-                return web.json_response({"error": str(e)}, status=500)
+                return json_util.json_response({"error": str(e)}, status=500)
 
         @self.routes.get('/logs')
         async def get_logs(request):
-            return web.json_response("".join([(l["t"] + " - " + l["m"]) for l in app.logger.get_logs()]))
+            return json_util.json_response("".join([(l["t"] + " - " + l["m"]) for l in app.logger.get_logs()]))
 
         @self.routes.get('/logs/raw')
         async def get_logs(request):
             self.terminal_service.update_size()
-            return web.json_response({
+            return json_util.json_response({
                 "entries": list(app.logger.get_logs()),
                 "size": {"cols": self.terminal_service.cols, "rows": self.terminal_service.rows}
             })
@@ -60,12 +62,18 @@ class InternalRoutes:
             return web.Response(status=200)
 
 
+        @self.routes.get('/startup_profile')
+        async def get_startup_profile(request):
+            if startup_profiler.profiler is None:
+                return json_util.json_response({"error": "Startup profiling is not enabled, start with --profile-startup"}, status=404)
+            return json_util.json_response(startup_profiler.profiler.report())
+
         @self.routes.get('/folder_paths')
         async def get_folder_paths(request):
             response = {}
             for key in folder_names_and_paths:
                 response[key] = folder_names_and_paths[key][0]
-            return web.json_response(response)
+            return json_util.json_response(response)
 
     def get_app(self):
         if self._app is None:
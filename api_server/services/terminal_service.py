@@ -1,14 +1,21 @@
-from app.logger import on_flush
+from app.logger import on_flush, is_progress_update
 import os
 import shutil
+import threading
 
 
 class TerminalService:
+    # Log entries are collected for this many seconds before being pushed to subscribers in a single message
+    batch_interval = 0.1
+
     def __init__(self, server):
         self.server = server
         self.cols = None
         self.rows = None
         self.subscriptions = set()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._send_scheduled = False
         on_flush(self.send_messages)
 
     def get_terminal_size(self):
@@ -46,11 +53,39 @@ class TerminalService:
         self.subscriptions.discard(client_id)
 
     def send_messages(self, entries):
+        """
+        Queues log entries for subscribers, called from whichever thread flushed the output stream.
+        Entries are sent in batches every batch_interval seconds and a progress line overwritten with \\r
+        several times within one batch is only sent once, with its latest content.
+        """
         if not len(entries) or not len(self.subscriptions):
             return
-        
+
+        with self._lock:
+            for entry in entries:
+                if len(self._pending) > 0 and is_progress_update(self._pending[-1]["m"], entry["m"]):
+                    self._pending[-1] = entry
+                else:
+                    self._pending.append(entry)
+
+            if self._send_scheduled:
+                return
+            self._send_scheduled = True
+
+        loop = self.server.loop
+        loop.call_soon_threadsafe(loop.call_later, self.batch_interval, self.send_pending)
+
+    def send_pending(self):
+        with self._lock:
+            entries = self._pending
+            self._pending = []
+            self._send_scheduled = False
+
+        if not len(entries):
+            return
+
         new_size = self.update_size()
-        
+
         for client_id in self.subscriptions.copy(): # prevent: Set changed size during iteration
             if client_id not in self.server.sockets:
                 # Automatically unsub if the socket has disconnected
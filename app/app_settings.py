@@ -1,6 +1,7 @@
 import os
 import json
 from aiohttp import web
+from . import json_util
 
 
 class AppSettings():
@@ -25,7 +26,7 @@ class AppSettings():
     def add_routes(self, routes):
         @routes.get("/settings")
         async def get_settings(request):
-            return web.json_response(self.get_settings(request))
+            return json_util.json_response(self.get_settings(request))
 
         @routes.get("/settings/{id}")
         async def get_setting(request):
@@ -34,7 +35,7 @@ class AppSettings():
             setting_id = request.match_info.get("id", None)
             if setting_id and setting_id in settings:
                 value = settings[setting_id]
-            return web.json_response(value)
+            return json_util.json_response(value)
 
         @routes.post("/settings")
         async def post_settings(request):
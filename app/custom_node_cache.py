@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import tomllib
+except ImportError:  # python < 3.11
+    tomllib = None
+
+CACHE_VERSION = 2
+# Packs that failed to import are imported again after this long even if nothing changed, the failure can come from
+# something the fingerprints don't cover (a missing model file, a network download, an environment variable...)
+FAILURE_RETRY_SECONDS = 24 * 60 * 60
+EXCLUDED_DIR_NAMES = {"__pycache__", "node_modules", "web", "js"}
+
+
+def environment_fingerprint() -> str:
+    """
+    Changes when the python environment does: installing or removing a package changes the mtime of its
+    site-packages directory, which can make a pack that failed to import work.
+    """
+    h = hashlib.sha256(sys.version.encode())
+    for path in sys.path:
+        try:
+            h.update(f"{path}:{os.stat(path).st_mtime_ns}".encode())
+        except OSError:
+            pass
+    return h.hexdigest()
+
+
+def pack_fingerprint(module_path: str) -> str:
+    """Hash of the path, size and mtime of the python and config files of a custom node pack."""
+    h = hashlib.sha256()
+    if os.path.isfile(module_path):
+        st = os.stat(module_path)
+        h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        return h.hexdigest()
+
+    for root, dirs, files in os.walk(module_path):
+        dirs[:] = sorted(x for x in dirs if x not in EXCLUDED_DIR_NAMES and not x.startswith("."))
+        for name in sorted(files):
+            if not name.endswith((".py", ".pyd", ".so", ".toml", ".txt", ".json", ".yaml", ".yml")):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            h.update(f"{os.path.relpath(path, module_path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def declares_parallel_import(module_path: str) -> bool:
+    """
+    Packs opt in to being imported (and having their prestartup script run) on a worker thread with:
+
+        [tool.comfy]
+        parallel-import = true
+
+    in their pyproject.toml.
+    """
+    if tomllib is None or not os.path.isdir(module_path):
+        return False
+    try:
+        with open(os.path.join(module_path, "pyproject.toml"), "rb") as f:
+            config = tomllib.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logging.warning(f"Unable to read pyproject.toml of {module_path}: {e}")
+        return False
+    return config.get("tool", {}).get("comfy", {}).get("parallel-import", False) is True
+
+
+class CustomNodeCache:
+    """
+    Outcome of importing every custom node pack on previous startups: whether it succeeded, how long it took and
+    when. Entries are only used while the files of the pack and the python environment are unchanged, packs that
+    failed to import are then skipped instead of being imported again, for up to FAILURE_RETRY_SECONDS.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.packs: dict[str, dict] = {}
+        self.dirty = False
+        self.environment = environment_fingerprint()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version", None) == CACHE_VERSION and data.get("environment", None) == self.environment:
+                self.packs = data.get("packs", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable custom node cache {path}: {e}")
+
+    def get(self, module_path: str, fingerprint: str) -> dict | None:
+        with self.lock:
+            entry = self.packs.get(os.path.abspath(module_path), None)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return None
+        if not entry["success"] and time.time() - entry["recorded_at"] > FAILURE_RETRY_SECONDS:
+            return None
+        return entry
+
+    def record(self, module_path: str, fingerprint: str, success: bool, import_time: float):
+        with self.lock:
+            self.packs[os.path.abspath(module_path)] = {
+                "fingerprint": fingerprint,
+                "success": success,
+                "import_time": round(import_time, 3),
+                "recorded_at": int(time.time()),
+            }
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": CACHE_VERSION, "environment": self.environment, "packs": self.packs}
+            self.dirty = False
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Unable to write custom node cache {self.path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
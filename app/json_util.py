@@ -0,0 +1,62 @@
+import json
+from typing import Any, Callable, Optional
+
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    except TypeError:
+        # orjson is stricter than the stdlib (e.g. ints wider than 64 bits), retry with the stdlib before giving up
+        return _stdlib_dumps(obj)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+_dumps: Callable[[Any], bytes] = _orjson_dumps if orjson is not None else _stdlib_dumps
+
+
+def set_serializer(serializer: Optional[Callable[[Any], bytes]]) -> None:
+    """
+    Replace the function used to encode API responses and websocket messages.
+    The serializer takes a JSON compatible object and returns UTF-8 encoded bytes.
+    Passing None restores the default (orjson when installed, otherwise the stdlib).
+    """
+    global _dumps
+    if serializer is None:
+        serializer = _orjson_dumps if orjson is not None else _stdlib_dumps
+    _dumps = serializer
+
+
+def get_serializer_name() -> str:
+    if _dumps is _orjson_dumps:
+        return "orjson"
+    if _dumps is _stdlib_dumps:
+        return "json"
+    return getattr(_dumps, "__name__", "custom")
+
+
+def dumps(obj: Any) -> bytes:
+    return _dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    return _dumps(obj).decode("utf-8")
+
+
+def encoded_response(body: bytes, status: int = 200, headers=None) -> web.Response:
+    return web.Response(body=body, status=status, headers=headers, content_type="application/json", charset="utf-8")
+
+
+def json_response(data: Any, status: int = 200, headers=None) -> web.Response:
+    """Drop in replacement for aiohttp's web.json_response that uses the configured serializer."""
+    return encoded_response(dumps(data), status=status, headers=headers)
+
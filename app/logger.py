@@ -1,14 +1,61 @@
-from collections import deque
-from datetime import datetime
+from datetime import datetime, timedelta
 import io
 import logging
 import sys
 import threading
+import time
 
 logs = None
 stdout_interceptor = None
 stderr_interceptor = None
 
+# Entries are timestamped with time.monotonic() and only turned into wall clock time when they are read
+_wall_clock_start = datetime.now()
+_monotonic_start = time.monotonic()
+
+
+def format_timestamp(t: float) -> str:
+    return (_wall_clock_start + timedelta(seconds=t - _monotonic_start)).isoformat()
+
+
+def is_progress_update(previous: str, data: str) -> bool:
+    """True when data starts with a carriage return overwriting previous, an unfinished line (e.g. a tqdm progress bar)."""
+    return isinstance(data, str) and data.startswith("\r") and not previous.endswith("\n")
+
+
+class LogBuffer:
+    """Fixed size ring buffer of [monotonic time, message] entries, slots are allocated once and reused."""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = [[0.0, ""] for _ in range(capacity)]
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, t: float, message: str):
+        if self._count < self.capacity:
+            entry = self._entries[(self._start + self._count) % self.capacity]
+            self._count += 1
+        else:
+            entry = self._entries[self._start]
+            self._start = (self._start + 1) % self.capacity
+        entry[0] = t
+        entry[1] = message
+
+    def last(self):
+        if self._count == 0:
+            return None
+        return self._entries[(self._start + self._count - 1) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._entries[(self._start + i) % self.capacity]
+
+    def snapshot(self) -> list:
+        return [{"t": format_timestamp(t), "m": m} for t, m in self]
+
 
 class LogInterceptor(io.TextIOWrapper):
     def __init__(self, stream,  *args, **kwargs):
@@ -20,29 +67,39 @@ class LogInterceptor(io.TextIOWrapper):
         self._logs_since_flush = []
 
     def write(self, data):
-        entry = {"t": datetime.now().isoformat(), "m": data}
+        t = time.monotonic()
         with self._lock:
-            self._logs_since_flush.append(entry)
+            self._logs_since_flush.append((t, data))
 
             # Simple handling for cr to overwrite the last output if it isnt a full line
             # else logs just get full of progress messages
-            if isinstance(data, str) and data.startswith("\r") and not logs[-1]["m"].endswith("\n"):
-                logs.pop()
-            logs.append(entry)
+            last = logs.last()
+            if last is not None and is_progress_update(last[1], data):
+                last[0] = t
+                last[1] = data
+            else:
+                logs.append(t, data)
         super().write(data)
 
     def flush(self):
         super().flush()
-        for cb in self._flush_callbacks:
-            cb(self._logs_since_flush)
+        with self._lock:
+            entries = self._logs_since_flush
             self._logs_since_flush = []
+        if not entries or not self._flush_callbacks:
+            return
+        entries = [{"t": format_timestamp(t), "m": m} for t, m in entries]
+        for cb in self._flush_callbacks:
+            cb(entries)
 
     def on_flush(self, callback):
         self._flush_callbacks.append(callback)
 
 
 def get_logs():
-    return logs
+    if logs is None:
+        return []
+    return logs.snapshot()
 
 
 def on_flush(callback):
@@ -53,11 +110,11 @@ def on_flush(callback):
 
 def setup_logger(log_level: str = 'INFO', capacity: int = 300):
     global logs
-    if logs:
+    if logs is not None:
         return
 
     # Override output streams and log to buffer
-    logs = deque(maxlen=capacity)
+    logs = LogBuffer(capacity)
 
     global stdout_interceptor
     global stderr_interceptor
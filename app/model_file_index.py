@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from collections.abc import Collection
+from concurrent.futures import ThreadPoolExecutor
+
+EXCLUDED_DIR_NAMES = {".git"}
+
+# inotify(7) constants
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class _IndexedDir:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: set[str], subdirs: set[str]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class DirectoryIndex:
+    """
+    In-memory listing of every file below one root directory, keyed by directory path relative to the root
+    (os.sep separated, "" for the root itself). Symlinked directories are followed like os.walk(followlinks=True).
+
+    Directories reported as changed by a watcher are marked dirty and rescanned on the next refresh(), so only
+    the directories that actually changed are listed again.
+    """
+    def __init__(self, root: str, watcher: InotifyWatcher | None = None):
+        self.root = root
+        self.watcher = watcher
+        self.lock = threading.Lock()
+        self.dirs: dict[str, _IndexedDir] = {}
+        self.dirty: set[str] = {""}
+        self.version = 0
+
+    def _fullpath(self, rel_dir: str) -> str:
+        return os.path.join(self.root, rel_dir) if rel_dir else self.root
+
+    def _drop(self, rel_dir: str):
+        indexed = self.dirs.pop(rel_dir, None)
+        if indexed is None:
+            return
+        if self.watcher is not None:
+            self.watcher.remove_watch(self, rel_dir)
+        for sub_dir in indexed.subdirs:
+            self._drop(sub_dir)
+        self.version += 1
+
+    def _scan(self, rel_dir: str):
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            full_path = self._fullpath(current)
+            if self.watcher is not None:
+                # Added before listing so changes made while scanning are not missed
+                self.watcher.add_watch(self, current, full_path)
+            try:
+                mtime_ns = os.stat(full_path).st_mtime_ns
+                with os.scandir(full_path) as it:
+                    entries = list(it)
+            except OSError:
+                self._drop(current)
+                continue
+
+            files = set()
+            subdirs = set()
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if entry.name not in EXCLUDED_DIR_NAMES:
+                            subdirs.add(os.path.join(current, entry.name) if current else entry.name)
+                    else:
+                        files.add(entry.name)
+                except OSError:
+                    logging.warning(f"Warning: Unable to access {entry.path}. Skipping this path.")
+
+            previous = self.dirs.get(current, None)
+            if previous is not None:
+                for sub_dir in previous.subdirs - subdirs:
+                    self._drop(sub_dir)
+            self.dirs[current] = _IndexedDir(mtime_ns, files, subdirs)
+            self.version += 1
+            pending.extend(x for x in subdirs if x not in self.dirs)
+
+    def mark_dirty(self, rel_dir: str):
+        with self.lock:
+            self.dirty.add(rel_dir)
+
+    def refresh(self):
+        with self.lock:
+            while len(self.dirty) > 0:
+                self._scan(self.dirty.pop())
+
+    def files(self) -> list[str]:
+        """Paths of all files relative to the root, call refresh() first to pick up pending changes."""
+        with self.lock:
+            out = []
+            for rel_dir, indexed in self.dirs.items():
+                if rel_dir:
+                    out.extend(os.path.join(rel_dir, x) for x in indexed.files)
+                else:
+                    out.extend(indexed.files)
+            return out
+
+    def files_in(self, rel_dir: str) -> list[str]:
+        """Names of the files directly inside rel_dir."""
+        with self.lock:
+            indexed = self.dirs.get(rel_dir, None)
+            return list(indexed.files) if indexed is not None else []
+
+    def contains(self, relative_path: str) -> bool:
+        rel_dir, name = os.path.split(relative_path)
+        with self.lock:
+            indexed = self.dirs.get(rel_dir, None)
+            return indexed is not None and name in indexed.files
+
+    def has_pending_changes(self) -> bool:
+        with self.lock:
+            return len(self.dirty) > 0
+
+    def is_missing(self) -> bool:
+        with self.lock:
+            return "" not in self.dirs and len(self.dirty) == 0
+
+    def changed_dirs(self) -> list[str]:
+        """Directories whose mtime no longer matches the index, used when polling. Blocking, stats every directory."""
+        with self.lock:
+            known = [(rel_dir, indexed.mtime_ns) for rel_dir, indexed in self.dirs.items()]
+        changed = []
+        for rel_dir, mtime_ns in known:
+            try:
+                if os.stat(self._fullpath(rel_dir)).st_mtime_ns != mtime_ns:
+                    changed.append(rel_dir)
+            except OSError:
+                changed.append(rel_dir)
+        return changed
+
+
+class InotifyWatcher:
+    """Watches indexed directories through a single inotify instance and marks them dirty when their entries change."""
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.lock = threading.Lock()
+        self.watches: dict[int, tuple[DirectoryIndex, str]] = {}
+        self.paths: dict[tuple[int, str], int] = {}
+        self.failed = False
+        threading.Thread(target=self._run, daemon=True, name="model-folder-watcher").start()
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    def add_watch(self, index: DirectoryIndex, rel_dir: str, full_path: str):
+        wd = self._add_watch(self.fd, os.fsencode(full_path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if errno == 28 and not self.failed:  # ENOSPC, fs.inotify.max_user_watches reached
+                self.failed = True
+                logging.warning("Ran out of inotify watches, model folder changes are now only picked up by polling. Consider raising fs.inotify.max_user_watches.")
+            return
+        with self.lock:
+            # A directory moved inside the tree keeps its watch descriptor, remap it to the new path
+            self.watches[wd] = (index, rel_dir)
+            self.paths[(id(index), rel_dir)] = wd
+
+    def remove_watch(self, index: DirectoryIndex, rel_dir: str):
+        with self.lock:
+            wd = self.paths.pop((id(index), rel_dir), None)
+            if wd is None or self.watches.get(wd, None) != (index, rel_dir):
+                return
+            del self.watches[wd]
+        self._rm_watch(self.fd, wd)
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                logging.warning(f"Model folder watcher stopped: {e}")
+                self.failed = True
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size + name_len
+                if mask & IN_Q_OVERFLOW:
+                    with self.lock:
+                        targets = list(self.watches.values())
+                    for index, rel_dir in targets:
+                        index.mark_dirty(rel_dir)
+                    continue
+
+                with self.lock:
+                    target = self.watches.get(wd, None)
+                    if mask & IN_IGNORED and target is not None:
+                        del self.watches[wd]
+                        self.paths.pop((id(target[0]), target[1]), None)
+                if target is not None:
+                    target[0].mark_dirty(target[1])
+
+
+class ModelFileIndex:
+    """
+    Index of the model folders served from memory instead of walking them on every file list request.
+
+    Changes are picked up through inotify when available (mode "auto" or "inotify"). In "poll" mode, or when
+    inotify can't be used, a background thread compares directory mtimes every poll_interval seconds instead,
+    which is also what works for network filesystems where inotify doesn't see remote changes. Roots that don't
+    exist yet are checked by the same thread in every mode.
+    """
+    def __init__(self, mode: str = "auto", poll_interval: float = 5.0):
+        self.lock = threading.Lock()
+        self.indexes: dict[str, DirectoryIndex] = {}
+        self.filename_lists: dict[tuple, tuple[tuple[int, ...], list[str]]] = {}
+        self.poll_interval = poll_interval
+        self.executor: ThreadPoolExecutor | None = None
+        self.watcher = None
+        if mode in ("auto", "inotify") and InotifyWatcher.available():
+            try:
+                self.watcher = InotifyWatcher()
+            except Exception as e:
+                logging.warning(f"Unable to use inotify for model folders, falling back to polling: {e}")
+        elif mode == "inotify":
+            logging.warning("inotify is not available on this platform, falling back to polling model folders.")
+        logging.info(f"Watching model folders using {'inotify' if self.watcher is not None else 'polling'}.")
+        threading.Thread(target=self._poll, daemon=True, name="model-folder-poll").start()
+
+    @property
+    def polling(self) -> bool:
+        return self.watcher is None or self.watcher.failed
+
+    def get_index(self, path: str, refresh: bool = True) -> DirectoryIndex:
+        with self.lock:
+            index = self.indexes.get(path, None)
+            if index is None:
+                index = DirectoryIndex(path, self.watcher)
+                self.indexes[path] = index
+        if refresh:
+            index.refresh()
+        return index
+
+    def get_indexes(self, paths: list[str]) -> list[DirectoryIndex]:
+        """Indexes for the paths, the ones with pending changes (or never scanned) are refreshed concurrently."""
+        indexes = [self.get_index(x, refresh=False) for x in paths]
+        dirty = [x for x in indexes if x.has_pending_changes()]
+        if len(dirty) > 1:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="model_file_index_scan")
+            list(self.executor.map(DirectoryIndex.refresh, dirty))
+        elif len(dirty) == 1:
+            dirty[0].refresh()
+        return indexes
+
+    def get_filename_list(self, paths: list[str], extensions: Collection[str]) -> list[str]:
+        indexes = self.get_indexes(paths)
+        key = (tuple(paths), tuple(sorted(extensions)))
+        versions = tuple(x.version for x in indexes)
+        cached = self.filename_lists.get(key, None)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        files = set()
+        for index in indexes:
+            files.update(index.files())
+        out = sorted(x for x in files if len(extensions) == 0 or os.path.splitext(x)[-1].lower() in extensions)
+        self.filename_lists[key] = (versions, out)
+        return out
+
+    def get_version(self, paths: list[str]) -> tuple[int, ...]:
+        return tuple(x.version for x in self.get_indexes(paths))
+
+    def get_full_path(self, paths: list[str], filename: str) -> str | None:
+        for path in paths:
+            if self.get_index(path).contains(filename):
+                return os.path.join(path, filename)
+        return None
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                with self.lock:
+                    indexes = list(self.indexes.values())
+                for index in indexes:
+                    if index.is_missing():
+                        if os.path.isdir(index.root):
+                            index.mark_dirty("")
+                    elif self.polling:
+                        for rel_dir in index.changed_dirs():
+                            index.mark_dirty(rel_dir)
+            except Exception as e:
+                logging.warning(f"Error while polling model folders: {e}")
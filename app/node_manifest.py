@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import traceback
+from typing import Callable
+
+MANIFEST_VERSION = 1
+
+
+class LazyNode:
+    """Placeholder for a node class whose module hasn't been imported yet."""
+    __slots__ = ("module_path", "load")
+
+    def __init__(self, module_path: str, load: Callable[[], bool]):
+        self.module_path = module_path
+        self.load = load
+
+    def __repr__(self):
+        return f"LazyNode({self.module_path})"
+
+
+class NodeClassMappings(dict):
+    """
+    NODE_CLASS_MAPPINGS, a dict of node name to node class that also lists the nodes registered from the manifest
+    whose module hasn't been imported yet. Their LazyNode placeholders are kept out of the dict itself, so nothing
+    ever gets one, but the names are in iteration, len() and "in". Looking one up imports its module, which
+    registers the real classes of all the nodes of that module.
+
+    keys(), items(), values() and so anything copying the mappings (dict(mappings), {**mappings},
+    update(mappings)) import every deferred module first. Iterating doesn't, but the /object_info the UI requests
+    when it loads looks up every node and so imports them all too.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+        # node name -> placeholder of the module that registers it
+        self.lazy: dict[str, LazyNode] = {}
+
+    def add_lazy(self, names, module_path: str, load: Callable[[], bool]):
+        placeholder = LazyNode(module_path, load)
+        with self.lock:
+            for name in names:
+                super().pop(name, None)
+                self.lazy[name] = placeholder
+
+    def __missing__(self, name):
+        with self.lock:
+            if super().__contains__(name):  # registered while waiting for the lock
+                return super().__getitem__(name)
+            placeholder = self.lazy.get(name, None)
+            if placeholder is None:
+                raise KeyError(name)
+            logging.info(f"Importing node module on first use: {placeholder.module_path}")
+            try:
+                placeholder.load()
+            except Exception:
+                logging.warning(traceback.format_exc())
+            # Nodes the module no longer provides (or all of them if the import failed) are gone
+            for k in [k for k, v in self.lazy.items() if v is placeholder]:
+                del self.lazy[k]
+            return super().__getitem__(name)
+
+    def resolve_all(self):
+        """Imports every deferred module."""
+        with self.lock:
+            for name in list(self.lazy):
+                self.get(name)
+
+    def __setitem__(self, name, value):
+        super().__setitem__(name, value)
+        self.lazy.pop(name, None)
+
+    def __delitem__(self, name):
+        if self.lazy.pop(name, None) is not None and not super().__contains__(name):
+            return
+        super().__delitem__(name)
+
+    def __contains__(self, name):
+        return super().__contains__(name) or name in self.lazy
+
+    def _lazy_names(self):
+        return [k for k in self.lazy if not dict.__contains__(self, k)]
+
+    def __iter__(self):
+        # Also makes dict(), {**} and update() go through keys() and __getitem__ instead of copying the dict storage
+        return iter(list(super().keys()) + self._lazy_names())
+
+    def __len__(self):
+        return super().__len__() + len(self._lazy_names())
+
+    def keys(self):
+        self.resolve_all()
+        return super().keys()
+
+    def items(self):
+        self.resolve_all()
+        return super().items()
+
+    def values(self):
+        self.resolve_all()
+        return super().values()
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def pop(self, name, *default):
+        if name in self:
+            value = self.get(name)
+            del self[name]
+            if value is not None:
+                return value
+        return super().pop(name, *default)
+
+    def setdefault(self, name, default=None):
+        if name in self:
+            return self[name]
+        self[name] = default
+        return default
+
+    def copy(self):
+        return dict(self.items())
+
+    def __copy__(self):
+        return self.copy()
+
+    def lazy_modules(self) -> set[str]:
+        return {v.module_path for v in self.lazy.values()}
+
+
+def module_signature(module_path: str) -> list[int]:
+    st = os.stat(module_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class NodeManifest:
+    """
+    The nodes each module registers, stored in a json file so the modules can be registered without importing them.
+    Entries are keyed by module file name and only used while the size and mtime of the file are unchanged.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.modules: dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version", None) == MANIFEST_VERSION:
+                self.modules = data.get("modules", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable node manifest {path}: {e}")
+
+    def get(self, module_path: str) -> dict[str, dict] | None:
+        """Metadata of the nodes of the module by node name, None if the module isn't in the manifest or changed."""
+        entry = self.modules.get(os.path.basename(module_path), None)
+        if entry is None:
+            return None
+        try:
+            if entry["signature"] != module_signature(module_path):
+                return None
+        except OSError:
+            return None
+        return entry["nodes"]
+
+    def update(self, module_path: str, nodes: dict[str, dict]):
+        self.modules[os.path.basename(module_path)] = {"signature": module_signature(module_path), "nodes": nodes}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "modules": self.modules}, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logging.warning(f"Unable to write node manifest {self.path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import tarfile
+import zipfile
+from typing import Iterable
+
+from aiohttp import web
+
+import folder_paths
+
+CHUNK_SIZE = 256 * 1024
+MAX_QUEUED_CHUNKS = 8
+
+
+def get_output_files(history_entry: dict) -> list[tuple[str, str]]:
+    """
+    Returns (full_path, archive_name) for every file referenced by the outputs of a history entry.
+    Files are looked up the same way the /view endpoint does, anything outside the output, input or temp
+    directories or that no longer exists on disk is skipped.
+    """
+    files = []
+    seen = set()
+    for node_output in history_entry.get("outputs", {}).values():
+        for items in node_output.values():
+            if not isinstance(items, list):
+                continue
+            for item in items:
+                if not isinstance(item, dict) or "filename" not in item:
+                    continue
+                file_type = item.get("type", "output")
+                base_dir = folder_paths.get_directory_by_type(file_type)
+                if base_dir is None:
+                    continue
+                base_dir = os.path.abspath(base_dir)
+                subfolder = item.get("subfolder", "")
+                filename = os.path.basename(item["filename"])
+                full_path = os.path.abspath(os.path.join(base_dir, subfolder, filename))
+                if os.path.commonpath((base_dir, full_path)) != base_dir:
+                    continue
+                if full_path in seen or not os.path.isfile(full_path):
+                    continue
+                seen.add(full_path)
+
+                archive_name = os.path.relpath(full_path, base_dir).replace("\\", "/")
+                if file_type != "output":
+                    archive_name = f"{file_type}/{archive_name}"
+                files.append((full_path, archive_name))
+    return files
+
+
+class _QueueWriter:
+    """File-like object handing fixed size chunks from a worker thread to the event loop, blocking while the queue is full."""
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+        self.buffer = bytearray()
+        self.cancelled = False
+
+    def _put(self, item):
+        if self.cancelled:
+            raise ConnectionAbortedError("Archive download was cancelled.")
+        asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop).result()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        if len(self.buffer) > 0 and not self.cancelled:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+
+def write_archive(fileobj, files: Iterable[tuple[str, str]], archive_format: str, compress: bool):
+    if archive_format == "zip":
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(fileobj, mode="w", compression=compression, allowZip64=True) as zf:
+            for full_path, archive_name in files:
+                zf.write(full_path, archive_name)
+    elif archive_format == "tar":
+        with tarfile.open(fileobj=fileobj, mode="w|gz" if compress else "w|") as tf:
+            for full_path, archive_name in files:
+                tf.add(full_path, archive_name, recursive=False)
+    else:
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+
+
+async def stream_archive(request: web.Request, files: list[tuple[str, str]], archive_format: str, compress: bool, filename: str) -> web.StreamResponse:
+    """Streams the files as an archive with chunked transfer encoding, the archive is never held in memory as a whole."""
+    if archive_format == "zip":
+        content_type = "application/zip"
+    else:
+        content_type = "application/gzip" if compress else "application/x-tar"
+
+    response = web.StreamResponse(headers={
+        "Content-Type": content_type,
+        "Content-Disposition": f"attachment; filename=\"{filename}\"",
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=MAX_QUEUED_CHUNKS)
+    writer = _QueueWriter(loop, queue)
+
+    def produce():
+        try:
+            write_archive(writer, files, archive_format, compress)
+            writer.finish()
+        finally:
+            if not writer.cancelled:
+                writer._put(None)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            await response.write(chunk)
+    except BaseException:
+        # Unblock the worker thread so it can notice the cancellation and exit
+        writer.cancelled = True
+        while not producer.done():
+            try:
+                await asyncio.wait_for(queue.get(), timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+        if not producer.cancelled():
+            producer.exception()
+        raise
+
+    try:
+        await producer
+    except Exception as e:
+        # Leave out the final chunk so the client sees an incomplete download instead of a truncated archive
+        logging.error(f"Error while creating output archive: {e}")
+        raise
+
+    await response.write_eof()
+    return response
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import contextlib
+import importlib._bootstrap
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Modules whose import time is reported on their own, comfy.model_management probes the devices when imported
+MODULES_OF_INTEREST = ("torch", "comfy.model_management", "comfy.sd", "nodes", "execution", "server")
+
+
+class StartupProfiler:
+    """
+    Times every module import (through importlib's _find_and_load, so only modules that weren't imported yet) and
+    the phases of the startup until the server listens.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.imports = []
+        self.folded = defaultdict(float)
+        self.phases = []
+        self.open_phases = {}
+        self.current_phase = None
+        self.original_find_and_load = None
+
+    def install(self):
+        self.original_find_and_load = importlib._bootstrap._find_and_load
+        importlib._bootstrap._find_and_load = self._find_and_load
+
+    def uninstall(self):
+        if self.original_find_and_load is not None and importlib._bootstrap._find_and_load == self._find_and_load:
+            importlib._bootstrap._find_and_load = self.original_find_and_load
+
+    def _find_and_load(self, name, *args, **kwargs):
+        module = sys.modules.get(name, None)
+        if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+            # importlib.import_module and from imports go through here for modules that are already imported
+            return self.original_find_and_load(name, *args, **kwargs)
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        # [name, start, time spent importing children]
+        frame = [name, time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            return self.original_find_and_load(name, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - frame[1]
+            stack.pop()
+            if len(stack) > 0:
+                stack[-1][2] += elapsed
+            self_time = elapsed - frame[2]
+            root = self.current_phase or "startup"
+            thread = threading.current_thread()
+            if thread is not threading.main_thread():
+                root = "{};{}".format(root, thread.name)
+            with self.lock:
+                self.imports.append({
+                    "module": name,
+                    "parent": stack[-1][0] if len(stack) > 0 else None,
+                    "start": frame[1] - self.start_time,
+                    "inclusive": elapsed,
+                    "self": self_time,
+                    "phase": self.current_phase,
+                })
+                self.folded[";".join([root] + [x[0] for x in stack] + [name])] += self_time
+
+    def start_phase(self, name):
+        with self.lock:
+            self.open_phases[name] = time.perf_counter()
+            self.current_phase = name
+
+    def end_phase(self, name):
+        with self.lock:
+            start = self.open_phases.pop(name, None)
+            if start is None:
+                return
+            self.phases.append({"name": name, "start": start - self.start_time, "duration": time.perf_counter() - start})
+            if self.current_phase == name:
+                self.current_phase = next(reversed(self.open_phases), None)
+
+    def finish(self):
+        if self.end_time is not None:
+            return
+        for name in list(reversed(self.open_phases)):
+            self.end_phase(name)
+        self.end_time = time.perf_counter()
+        self.uninstall()
+
+    def report(self) -> dict:
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        with self.lock:
+            imports = sorted(self.imports, key=lambda x: x["self"], reverse=True)
+            phases = sorted(self.phases, key=lambda x: x["start"])
+        by_name = {}
+        for x in imports:
+            by_name[x["module"]] = max(x["inclusive"], by_name.get(x["module"], 0.0))
+        return {
+            "total": end - self.start_time,
+            "finished": self.end_time is not None,
+            "phases": phases,
+            "modules_of_interest": {k: by_name[k] for k in MODULES_OF_INTEREST if k in by_name},
+            "import_count": len(imports),
+            "import_total": sum(x["self"] for x in imports),
+            "imports": imports,
+        }
+
+    def write_folded(self, path):
+        """Stacks in the folded format of flamegraph.pl (also opened by speedscope), values in microseconds."""
+        with self.lock:
+            lines = ["{} {}".format(k, int(v * 1000000)) for k, v in self.folded.items() if v > 0]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+profiler: StartupProfiler | None = None
+
+
+def enable():
+    global profiler
+    profiler = StartupProfiler()
+    profiler.install()
+
+
+def start_phase(name):
+    if profiler is not None:
+        profiler.start_phase(name)
+
+
+def end_phase(name):
+    if profiler is not None:
+        profiler.end_phase(name)
+
+
+@contextlib.contextmanager
+def phase(name):
+    start_phase(name)
+    try:
+        yield
+    finally:
+        end_phase(name)
+
+
+def finish(report_path, flamegraph_path=None):
+    """Stops profiling and writes the report, does nothing when startup profiling is off or already finished."""
+    if profiler is None or profiler.end_time is not None:
+        return
+    profiler.finish()
+    report = profiler.report()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        if flamegraph_path:
+            profiler.write_folded(flamegraph_path)
+    except OSError as e:
+        logging.warning(f"Unable to write startup profile: {e}")
+        return
+    slowest = ", ".join("{} {:.2f}s".format(x["module"], x["self"]) for x in report["imports"][:5])
+    logging.info("Startup took {:.2f}s ({:.2f}s importing {} modules, slowest: {}), profile written to {}".format(report["total"], report["import_total"], report["import_count"], slowest, report_path))
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import logging
+import mimetypes
+import os
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".js", ".mjs", ".css", ".html", ".json", ".map", ".svg", ".txt", ".xml", ".wasm", ".ttf", ".otf"}
+MIN_COMPRESS_SIZE = 1024
+# Build tools append a content hash to asset names, e.g. GraphView-BW5soyxY.js, so these never change in place
+HASHED_ASSET_NAME = re.compile(r"-[A-Za-z0-9_-]{8}(\.[A-Za-z0-9]+)+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# (Content-Encoding token, suffix of precompressed files on disk)
+ENCODINGS = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+
+def supported_encodings() -> list[str]:
+    """Encodings in order of preference, brotli is only offered when the optional brotli package is installed."""
+    if brotli is not None:
+        return ["br", "gzip"]
+    return ["gzip"]
+
+
+def parse_accept_encoding(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(token)
+    if "*" in accepted:
+        accepted.update(ENCODINGS.keys())
+    return accepted
+
+
+def compress_file(path: str, encoding: str) -> bytes:
+    """
+    Returns the file compressed with the given encoding. A precompressed sibling (e.g. index.js.gz) that is
+    at least as new as the file is used instead of compressing it again.
+    """
+    try:
+        sibling = path + ENCODINGS[encoding]
+        if os.stat(sibling).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            with open(sibling, "rb") as f:
+                return f.read()
+    except OSError:
+        pass
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if encoding == "br":
+        return brotli.compress(data, quality=9)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressedCache:
+    """LRU cache of compressed file contents limited to max_bytes, entries are invalidated when the file changes."""
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple[str, str], tuple[int, int, bytes]] = OrderedDict()
+        self.size = 0
+
+    def get(self, path: str, encoding: str, st: os.stat_result) -> bytes | None:
+        with self.lock:
+            entry = self.entries.get((path, encoding), None)
+            if entry is None:
+                return None
+            if entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+                self._remove((path, encoding))
+                return None
+            self.entries.move_to_end((path, encoding))
+            return entry[2]
+
+    def put(self, path: str, encoding: str, st: os.stat_result, data: bytes) -> bool:
+        """Stores data, returns False when it does not fit into the cache."""
+        if len(data) > self.max_bytes:
+            return False
+        with self.lock:
+            self._remove((path, encoding))
+            self.entries[(path, encoding)] = (st.st_mtime_ns, st.st_size, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+            return True
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+compressed_cache = CompressedCache()
+
+
+class StaticFiles:
+    """
+    Serves the files in a directory, replacing web.static.
+
+    Text assets are sent gzip or brotli compressed depending on the Accept-Encoding of the request. Compressed
+    variants are taken from precompressed files next to the originals when present, otherwise they are
+    created on first request (or by precompress at startup) and kept in memory. Every response carries an ETag,
+    and with hashed_assets set, content hashed names under assets/ are marked as immutable.
+    """
+    def __init__(self, directory: str, hashed_assets: bool = False, cache: CompressedCache = compressed_cache):
+        self.directory = os.path.realpath(directory)
+        self.hashed_assets = hashed_assets
+        self.cache = cache
+
+    def resolve(self, filename: str) -> str | None:
+        path = os.path.realpath(os.path.join(self.directory, filename))
+        if os.path.commonpath((self.directory, path)) != self.directory:
+            return None
+        return path
+
+    def is_immutable(self, filename: str) -> bool:
+        return self.hashed_assets and filename.startswith("assets/") and HASHED_ASSET_NAME.search(filename) is not None
+
+    @staticmethod
+    def is_compressible(path: str, st: os.stat_result) -> bool:
+        return st.st_size >= MIN_COMPRESS_SIZE and os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+    def get_compressed(self, path: str, encoding: str, st: os.stat_result) -> bytes:
+        data = self.cache.get(path, encoding, st)
+        if data is None:
+            data = compress_file(path, encoding)
+            if len(data) >= st.st_size:
+                data = b""  # not worth it, remember that and send the original
+            self.cache.put(path, encoding, st, data)
+        return data
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        filename = request.match_info["filename"]
+        path = self.resolve(filename)
+        if path is None:
+            raise web.HTTPForbidden()
+        try:
+            st = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise web.HTTPNotFound()
+        if stat.S_ISDIR(st.st_mode):
+            raise web.HTTPForbidden()
+
+        headers = {}
+        if self.is_immutable(filename):
+            headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+
+        if not self.is_compressible(path, st):
+            return web.FileResponse(path, headers=headers)
+
+        headers["Vary"] = "Accept-Encoding"
+        accepted = parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+        encoding = next((x for x in supported_encodings() if x in accepted), None)
+        if encoding is None:
+            return web.FileResponse(path, headers=headers)
+
+        data = self.cache.get(path, encoding, st)
+        if data is None:
+            data = await asyncio.get_running_loop().run_in_executor(None, self.get_compressed, path, encoding, st)
+        if len(data) == 0:
+            return web.FileResponse(path, headers=headers)
+
+        etag = f"{st.st_mtime_ns:x}-{st.st_size:x}-{encoding}"
+        headers["ETag"] = f'"{etag}"'
+        if request.if_none_match is not None and any(x.value in (etag, "*") for x in request.if_none_match):
+            return web.Response(status=304, headers=headers)
+
+        content_type, _ = mimetypes.guess_type(path)
+        headers["Content-Type"] = content_type or "application/octet-stream"
+        headers["Content-Encoding"] = encoding
+        response = web.Response(body=data, headers=headers)
+        response.last_modified = st.st_mtime
+        return response
+
+    def precompress(self):
+        """Fills the cache with compressed variants of every compressible file, meant to run in a background thread."""
+        start = time.perf_counter()
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    if not self.is_compressible(path, st):
+                        continue
+                    for encoding in supported_encodings():
+                        self.get_compressed(path, encoding, st)
+                except Exception as e:
+                    logging.debug(f"Failed to precompress {path}: {e}")
+                    continue
+                count += 1
+                if self.cache.size >= self.cache.max_bytes:
+                    logging.debug("Static file compression cache is full, skipping the remaining files.")
+                    return
+        logging.debug(f"Precompressed {count} static files in {self.directory} in {time.perf_counter() - start:.2f}s")
+
+    def add_routes(self, router: web.UrlDispatcher, prefix: str):
+        router.add_get(prefix.rstrip("/") + "/{filename:.*}", self.handle)
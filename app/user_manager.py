@@ -1,15 +1,18 @@
 from __future__ import annotations
+import asyncio
 import json
 import os
 import re
+import time
 import uuid
-import glob
 import shutil
 import logging
+import threading
 from aiohttp import web
 from urllib import parse
 from comfy.cli_args import args
 import folder_paths
+from . import json_util
 from .app_settings import AppSettings
 from typing import TypedDict
 
@@ -30,6 +33,178 @@ def get_file_info(path: str, relative_to: str) -> FileInfo:
     }
 
 
+class _IndexedDir:
+    __slots__ = ("mtime_ns", "scanned_ns", "files")
+
+    def __init__(self, mtime_ns: int, scanned_ns: int, files: dict[str, tuple[int, float]]):
+        self.mtime_ns = mtime_ns
+        self.scanned_ns = scanned_ns
+        self.files = files
+
+
+class UserDataIndex:
+    """
+    In-memory index of the files in one user directory, keyed by directory path relative to the user root
+    (forward slashes, "" for the root itself).
+
+    The index is built with os.scandir on first use and kept up to date by the userdata endpoints. Every listing
+    also compares the mtime of each indexed directory so files created or deleted outside of the API are still
+    picked up, which costs one stat per directory instead of one per file. Hidden files and directories are left
+    out, matching the glob based listing this replaces.
+    """
+    # Directories modified this close to when they were scanned are rescanned on the next listing, the filesystem
+    # timestamp granularity could otherwise hide a change made right after the scan.
+    RACY_WINDOW_NS = 2_000_000_000
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.dirs: dict[str, _IndexedDir] = {}
+        self.loaded = False
+
+    def _relpath(self, path: str) -> str | None:
+        path = os.path.abspath(path)
+        if os.path.commonpath((self.root, path)) != self.root:
+            return None
+        rel = os.path.relpath(path, self.root).replace(os.sep, '/')
+        if rel == ".":
+            return ""
+        if any(part.startswith('.') for part in rel.split('/')):
+            return None
+        return rel
+
+    def _fullpath(self, rel_dir: str) -> str:
+        return os.path.join(self.root, *rel_dir.split('/')) if rel_dir else self.root
+
+    def _drop(self, rel_dir: str):
+        prefix = rel_dir + '/' if rel_dir else ''
+        for key in [k for k in self.dirs if k == rel_dir or k.startswith(prefix)]:
+            del self.dirs[key]
+
+    def _scan(self, rel_dir: str):
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            full_path = self._fullpath(current)
+            try:
+                mtime_ns = os.stat(full_path).st_mtime_ns
+                with os.scandir(full_path) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError):
+                self._drop(current)
+                continue
+
+            files = {}
+            real_path = None
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        if entry.is_symlink():
+                            # Symlinked directories are followed like glob did, except ones pointing at the
+                            # directory itself or one of its parents which would loop forever
+                            if real_path is None:
+                                real_path = os.path.realpath(full_path)
+                            target = os.path.realpath(entry.path)
+                            if os.path.commonpath((target, real_path)) == target:
+                                continue
+                        sub_dir = f"{current}/{entry.name}" if current else entry.name
+                        if sub_dir not in self.dirs:
+                            pending.append(sub_dir)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime)
+                except OSError:
+                    continue
+
+            self.dirs[current] = _IndexedDir(mtime_ns, time.time_ns(), files)
+
+    def _validate(self):
+        for rel_dir, indexed in list(self.dirs.items()):
+            if rel_dir not in self.dirs:
+                continue  # dropped along with its parent
+            try:
+                mtime_ns = os.stat(self._fullpath(rel_dir)).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                self._drop(rel_dir)
+                continue
+            if mtime_ns != indexed.mtime_ns or indexed.scanned_ns - indexed.mtime_ns < self.RACY_WINDOW_NS:
+                self._scan(rel_dir)
+
+    def refresh(self):
+        with self.lock:
+            if self.loaded:
+                self._validate()
+            else:
+                self._scan("")
+                self.loaded = True
+
+    def list(self, directory: str, recurse: bool) -> list[tuple[str, int, float]]:
+        """Returns sorted (path relative to directory, size, modified) for the files in directory. Blocking, run it in an executor."""
+        self.refresh()
+        rel_dir = self._relpath(directory)
+        if rel_dir is None:
+            return []
+        prefix = rel_dir + '/' if rel_dir else ''
+        results = []
+        with self.lock:
+            for key, indexed in self.dirs.items():
+                if key == rel_dir:
+                    sub_prefix = ''
+                elif recurse and key.startswith(prefix):
+                    sub_prefix = key[len(prefix):] + '/'
+                else:
+                    continue
+                for name, (size, modified) in indexed.files.items():
+                    results.append((sub_prefix + name, size, modified))
+        results.sort()
+        return results
+
+    def _update_dir_mtime(self, rel_dir: str):
+        indexed = self.dirs.get(rel_dir, None)
+        if indexed is None:
+            return
+        try:
+            indexed.mtime_ns = os.stat(self._fullpath(rel_dir)).st_mtime_ns
+        except OSError:
+            self._drop(rel_dir)
+
+    def update_file(self, path: str):
+        """Records a file written through the API, no-op until the index has been loaded by a listing."""
+        rel = self._relpath(path)
+        if not rel:
+            return
+        rel_dir, _, name = rel.rpartition('/')
+        with self.lock:
+            if not self.loaded:
+                return
+            indexed = self.dirs.get(rel_dir, None)
+            if indexed is None:
+                self._scan(rel_dir)
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                indexed.files.pop(name, None)
+            else:
+                indexed.files[name] = (stat.st_size, stat.st_mtime)
+            self._update_dir_mtime(rel_dir)
+
+    def remove_file(self, path: str):
+        rel = self._relpath(path)
+        if not rel:
+            return
+        rel_dir, _, name = rel.rpartition('/')
+        with self.lock:
+            if not self.loaded:
+                return
+            indexed = self.dirs.get(rel_dir, None)
+            if indexed is not None:
+                indexed.files.pop(name, None)
+                self._update_dir_mtime(rel_dir)
+
+
 class UserManager():
     def __init__(self):
         user_directory = folder_paths.get_user_directory()
@@ -50,6 +225,8 @@ class UserManager():
         else:
             self.users = {"default": "default"}
 
+        self.userdata_indexes: dict[str, UserDataIndex] = {}
+
     def get_users_file(self):
         return os.path.join(folder_paths.get_user_directory(), "users.json")
 
@@ -109,16 +286,24 @@ class UserManager():
 
         return user_id
 
+    def get_userdata_index(self, user_root: str) -> UserDataIndex:
+        user_root = os.path.abspath(user_root)
+        index = self.userdata_indexes.get(user_root, None)
+        if index is None:
+            index = UserDataIndex(user_root)
+            self.userdata_indexes[user_root] = index
+        return index
+
     def add_routes(self, routes):
         self.settings.add_routes(routes)
 
         @routes.get("/users")
         async def get_users(request):
             if args.multi_user:
-                return web.json_response({"storage": "server", "users": self.users})
+                return json_util.json_response({"storage": "server", "users": self.users})
             else:
                 user_dir = self.get_request_user_filepath(request, None, create_dir=False)
-                return web.json_response({
+                return json_util.json_response({
                     "storage": "server",
                     "migrated": os.path.exists(user_dir)
                 })
@@ -128,10 +313,10 @@ class UserManager():
             body = await request.json()
             username = body["username"]
             if username in self.users.values():
-                return web.json_response({"error": "Duplicate username."}, status=400)
+                return json_util.json_response({"error": "Duplicate username."}, status=400)
 
             user_id = self.add_user(username)
-            return web.json_response(user_id)
+            return json_util.json_response(user_id)
 
         @routes.get("/userdata")
         async def listuserdata(request):
@@ -146,12 +331,18 @@ class UserManager():
             - recurse (optional): If "true", recursively list files in subdirectories.
             - full_info (optional): If "true", return detailed file information (path, size, modified time).
             - split (optional): If "true", split file paths into components (only applies when full_info is false).
+            - offset (optional): Number of files to skip, files are sorted by path.
+            - limit (optional): Maximum number of files to return.
+
+            Files are served from an in-memory index of the user directory (see UserDataIndex), the directory
+            walk runs in an executor so large directories don't block the event loop.
 
             Returns:
-            - 400: If 'dir' parameter is missing.
+            - 400: If 'dir' parameter is missing or offset/limit are invalid.
             - 403: If the requested path is not allowed.
             - 404: If the requested directory does not exist.
-            - 200: JSON response with the list of files or file information.
+            - 200: JSON response with the list of files or file information, the X-Total-Count header holds
+                   the number of files before pagination.
 
             The response format depends on the query parameters:
             - Default: List of relative file paths.
@@ -173,29 +364,32 @@ class UserManager():
             full_info = request.rel_url.query.get('full_info', '').lower() == "true"
             split_path = request.rel_url.query.get('split', '').lower() == "true"
 
-            # Use different patterns based on whether we're recursing or not
-            if recurse:
-                pattern = os.path.join(glob.escape(path), '**', '*')
-            else:
-                pattern = os.path.join(glob.escape(path), '*')
-
-            def process_full_path(full_path: str) -> FileInfo | str | list[str]:
+            try:
+                offset = int(request.rel_url.query.get('offset', 0))
+                limit = request.rel_url.query.get('limit', None)
+                limit = int(limit) if limit is not None else None
+            except ValueError:
+                return web.Response(status=400, text="Invalid offset or limit")
+            if offset < 0 or (limit is not None and limit < 0):
+                return web.Response(status=400, text="Invalid offset or limit")
+
+            index = self.get_userdata_index(self.get_request_user_filepath(request, None))
+            files = await asyncio.get_running_loop().run_in_executor(None, index.list, path, recurse)
+            total = len(files)
+            files = files[offset:offset + limit if limit is not None else None]
+
+            def process_file(rel_path: str, size: int, modified: float) -> FileInfo | str | list[str]:
                 if full_info:
-                    return get_file_info(full_path, path)
+                    return {"path": rel_path, "size": size, "modified": modified}
 
-                rel_path = os.path.relpath(full_path, path).replace(os.sep, '/')
                 if split_path:
                     return [rel_path] + rel_path.split('/')
 
                 return rel_path
 
-            results = [
-                process_full_path(full_path)
-                for full_path in glob.glob(pattern, recursive=recurse)
-                if os.path.isfile(full_path)
-            ]
+            results = [process_file(*file) for file in files]
 
-            return web.json_response(results)
+            return json_util.json_response(results, headers={"X-Total-Count": str(total)})
 
         def get_user_data_path(request, check_exists = False, param = "file"):
             file = request.match_info.get(param, None)
@@ -261,12 +455,14 @@ class UserManager():
                 f.write(body)
 
             user_path = self.get_request_user_filepath(request, None)
+            index = self.get_userdata_index(user_path)
+            await asyncio.get_running_loop().run_in_executor(None, index.update_file, path)
             if full_info:
                 resp = get_file_info(path, user_path)
             else:
                 resp = os.path.relpath(path, user_path)
 
-            return web.json_response(resp)
+            return json_util.json_response(resp)
 
         @routes.delete("/userdata/{file}")
         async def delete_userdata(request):
@@ -276,6 +472,9 @@ class UserManager():
 
             os.remove(path)
 
+            index = self.get_userdata_index(self.get_request_user_filepath(request, None))
+            await asyncio.get_running_loop().run_in_executor(None, index.remove_file, path)
+
             return web.Response(status=204)
 
         @routes.post("/userdata/{file}/move/{dest}")
@@ -322,9 +521,13 @@ class UserManager():
             shutil.move(source, dest)
 
             user_path = self.get_request_user_filepath(request, None)
+            index = self.get_userdata_index(user_path)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, index.remove_file, source)
+            await loop.run_in_executor(None, index.update_file, dest)
             if full_info:
                 resp = get_file_info(dest, user_path)
             else:
                 resp = os.path.relpath(dest, user_path)
 
-            return web.json_response(resp)
+            return json_util.json_response(resp)
@@ -99,6 +99,13 @@ parser.add_argument("--preview-size", type=int, default=512, help="Sets the maxi
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
+parser.add_argument("--converted-model-cache", type=str, nargs="?", const="", default=None, metavar="DIR", help="Store diffusion models that need converting on load (diffusers format or weights cast to a smaller dtype) in DIR, models/converted_cache by default, as ready to load safetensors files so the next load skips the conversion.")
+parser.add_argument("--converted-model-cache-size", type=float, default=50.0, metavar="GB", help="Maximum size in GB of the --converted-model-cache directory, the least recently used models are removed when a new one makes it bigger. 0 means no limit.")
+parser.add_argument("--state-dict-cache-size", type=float, default=0.0, metavar="GB", help="Keep up to this many GB of loaded model files (checkpoints, loras, vaes, etc...) in RAM so loading them again does not read them from disk. 0 disables it.")
+parser.add_argument("--patched-weight-cache-size", type=float, default=0.0, metavar="GB", help="Keep up to this many GB of LoRA patched weights in RAM so switching back to a LoRA combination used before does not patch the weights again. 0 disables it.")
+parser.add_argument("--prefetch-models", type=int, nargs="?", const=2, default=0, metavar="PROMPTS", help="While a prompt runs, once its own loader nodes are done, read the model files of the loader nodes of the next PROMPTS queued prompts (2 if not specified) into the page cache so they load faster.")
+parser.add_argument("--prefetch-models-ram", type=float, default=8.0, metavar="GB", help="Maximum size in GB of the model files read ahead by --prefetch-models, it never uses more than half of the available RAM.")
+parser.add_argument("--unmerged-lora", action="store_true", help="Apply LoRA/LoCon patches at runtime as low rank side branches of the Linear and Conv2d layers instead of merging them into the model weights. Changing LoRA strengths or switching between LoRAs then doesn't recalculate any weights, at the cost of slightly slower sampling.")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -135,9 +142,17 @@ parser.add_argument("--windows-standalone-build", action="store_true", help="Win
 
 parser.add_argument("--disable-metadata", action="store_true", help="Disable saving prompt metadata in files.")
 parser.add_argument("--disable-all-custom-nodes", action="store_true", help="Disable loading all custom nodes.")
+parser.add_argument("--custom-node-cache", type=str, nargs="?", const="", default=None, metavar="PATH", help="Remember the import outcome of every custom node pack (custom_node_cache.json in the user directory by default) and skip the packs that failed to import until their files or the python environment change, or for at most a day.")
+parser.add_argument("--lazy-extra-nodes", type=str, nargs="?", const="", default=None, metavar="MANIFEST", help="Register the built-in comfy_extras nodes from a manifest file and only import their modules when one of their nodes is first used. The manifest (comfy_extras/node_manifest.json by default) is written on the first run and updated when a module changes. The node info the UI requests when it loads (/object_info) needs every node class so it imports all the deferred modules then, this mainly speeds up the startup and API only use.")
 
 parser.add_argument("--multi-user", action="store_true", help="Enables per-user storage.")
 
+parser.add_argument("--watch-model-folders", type=str, nargs="?", const="auto", default=None, choices=["auto", "inotify", "poll"], help="Keep an in-memory index of the model folders that is updated when files change instead of checking the folders on every file list request. auto uses inotify when available and polls otherwise, use poll for network filesystems.")
+parser.add_argument("--model-folder-poll-interval", type=float, default=5.0, help="Seconds between checks for changes in the model folders when --watch-model-folders is polling.")
+
+parser.add_argument("--profile-startup", type=str, nargs="?", const="", default=None, metavar="PATH", help="Time every module import and startup phase until the server listens and write the report as json (startup_profile.json in the user directory by default). The report is also served at /internal/startup_profile.")
+parser.add_argument("--profile-startup-flamegraph", type=str, default=None, metavar="PATH", help="With --profile-startup, also write the import times as folded stacks for flamegraph.pl or speedscope.")
+
 parser.add_argument("--verbose", default='INFO', const='DEBUG', nargs="?", choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Set the logging level')
 
 # The default built-in provider hosted under web/
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import torch
+
+import comfy.utils
+
+# Bump when the conversion code changes in a way that makes previously cached files invalid
+CACHE_VERSION = 2
+HASHED_BYTES = 1024 * 1024
+# Stored in the metadata of the cached files: the dtype of the source weights and the dtypes the model was loaded with
+DTYPE_KEYS = ("weight_dtype", "unet_dtype", "manual_cast_dtype")
+
+
+def source_fingerprint(path):
+    """
+    Hash identifying the source file: its size, mtime and header (the safetensors header lists every tensor with
+    its dtype, shape and offsets, for other formats the first MB of the file is used).
+    """
+    st = os.stat(path)
+    h = hashlib.sha256()
+    h.update("{}:{}:{}".format(CACHE_VERSION, st.st_size, st.st_mtime_ns).encode())
+    header = None
+    if path.lower().endswith(".safetensors") or path.lower().endswith(".sft"):
+        header = comfy.utils.safetensors_header(path)
+    if header is None:
+        with open(path, "rb") as f:
+            header = f.read(HASHED_BYTES)
+    h.update(header)
+    return h.hexdigest()
+
+
+class ConvertedModelCache:
+    """
+    On disk cache of diffusion model state dicts that had to be converted on load, either because they were in
+    the diffusers format or because their weights had to be cast to the dtype of the model parameters.
+
+    Entries are safetensors files in the comfy key layout and the storage dtype of the model (fp8 included),
+    keyed by a fingerprint of the source file and the load options, so loading the same model again with the
+    same options is a straight mmap of the cached file. The dtypes the model was loaded with depend on the device
+    too, they are stored in the metadata of the file (see DTYPE_KEYS) so a load that resolves other ones can fall
+    back to the source file.
+
+    When the files take more than max_bytes (0 for no limit) the least recently used ones are removed.
+    """
+    def __init__(self, directory, max_bytes=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def key(self, path, model_options):
+        options = {k: str(model_options[k]) for k in ("dtype", "weight_dtype", "fp8_optimizations") if k in model_options}
+        try:
+            fingerprint = source_fingerprint(path)
+        except OSError:
+            return None
+        return hashlib.sha256("{}:{}".format(fingerprint, json.dumps(options, sort_keys=True)).encode()).hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(self.directory, "{}.safetensors".format(key))
+
+    def get(self, key):
+        """The cached state dict and the dtypes it was stored with (DTYPE_KEYS to dtype names), or None."""
+        path = self.cache_path(key)
+        if not os.path.isfile(path):
+            self.stats["misses"] += 1
+            return None
+        try:
+            sd = comfy.utils.load_torch_file(path, lazy=True)
+            metadata = sd.metadata() or {}
+            dtypes = {k: metadata[k] for k in DTYPE_KEYS}
+        except Exception as e:
+            logging.warning("Ignoring unreadable converted model cache file {}: {}".format(path, e))
+            self.stats["misses"] += 1
+            return None
+        try:
+            # The mtime orders the files for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        logging.info("Using converted model from cache: {}".format(path))
+        return sd, dtypes
+
+    def put(self, key, sd, target_dtypes, dtypes):
+        """
+        Stores the state dict, floating point tensors are cast to the dtype of the model parameter they are
+        loaded into (target_dtypes maps keys to dtypes), the ones that are not in target_dtypes are stored as is.
+        dtypes maps DTYPE_KEYS to the dtypes the model was loaded with.
+        """
+        path = self.cache_path(key)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        start = time.perf_counter()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            out = {}
+            for k in sd.keys():
+                t = sd[k]
+                dtype = target_dtypes.get(k, None)
+                if dtype is not None and t.is_floating_point() and t.dtype != dtype:
+                    t = t.to(dtype)
+                out[k] = t.contiguous()
+            metadata = {k: str(dtypes[k]) for k in DTYPE_KEYS}
+            metadata["comfy_converted_model_cache"] = str(CACHE_VERSION)
+            comfy.utils.save_torch_file(out, temp_path, metadata=metadata)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.warning("Unable to store converted model in cache: {}".format(e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.stats["stores"] += 1
+        logging.info("Stored converted model in cache in {:.2f}s: {}".format(time.perf_counter() - start, path))
+        self.evict(keep=path)
+        return True
+
+    def evict(self, keep=None):
+        """Removes the least recently used files until the cache fits in max_bytes, never the keep one."""
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".safetensors") and entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime_ns, entry.path, st.st_size))
+        except OSError as e:
+            logging.warning("Unable to list converted model cache {}: {}".format(self.directory, e))
+            return
+        total = sum(x[2] for x in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:  # still memory mapped on windows
+                logging.debug("Unable to remove converted model cache file {}: {}".format(path, e))
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+            logging.info("Removed least recently used converted model from cache: {}".format(path))
+
+
+cache = None
+
+
+def enable(directory, max_bytes=0):
+    global cache
+    cache = ConvertedModelCache(directory, max_bytes=max_bytes)
+    logging.info("Caching converted models in: {}".format(directory))
+
+
+def dtype_from_name(name):
+    """Inverse of str(dtype) for the names stored in the metadata, "None" is None."""
+    if name == "None":
+        return None
+    return getattr(torch, name.replace("torch.", "", 1))
+
+
+def target_dtypes(model):
+    return {k: v.dtype for k, v in model.diffusion_model.state_dict().items() if isinstance(v, torch.Tensor)}
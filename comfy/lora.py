@@ -21,6 +21,7 @@ import comfy.utils
 import comfy.model_management
 import comfy.model_base
 import logging
+import math
 import torch
 
 LORA_CLIP_MAP = {
@@ -32,11 +33,39 @@ LORA_CLIP_MAP = {
     "self_attn.out_proj": "self_attn_out_proj",
 }
 
+# Every suffix load_lora looks up after the name of a layer, a layer is only worth checking if the lora has a key
+# ending with one of these after its name.
+LORA_KEY_SUFFIXES = (
+    ".alpha", ".dora_scale", ".reshape_weight",
+    ".lora_up.weight", ".lora_down.weight", ".lora_mid.weight", "_lora.up.weight", "_lora.down.weight",
+    ".lora_B.weight", ".lora_A.weight", ".lora.up.weight", ".lora.down.weight", ".lora_B", ".lora_A",
+    ".lora_linear_layer.up.weight", ".lora_linear_layer.down.weight",
+    ".hada_w1_a", ".hada_w1_b", ".hada_w2_a", ".hada_w2_b", ".hada_t1", ".hada_t2",
+    ".lokr_w1", ".lokr_w2", ".lokr_w1_a", ".lokr_w1_b", ".lokr_t2", ".lokr_w2_a", ".lokr_w2_b",
+    ".a1.weight", ".a2.weight", ".b1.weight", ".b2.weight",
+    ".w_norm", ".b_norm", ".diff", ".diff_b", ".set_weight",
+)
+
+_SUFFIXES_BY_LAST_PART = {}
+for _s in LORA_KEY_SUFFIXES:
+    _SUFFIXES_BY_LAST_PART.setdefault(_s.rpartition(".")[2], []).append(_s)
+
+def lora_layer_names(lora):
+    """Names of the layers the keys of the lora belong to (the keys with the suffixes load_lora knows removed)."""
+    out = set()
+    for k in lora.keys():
+        for s in _SUFFIXES_BY_LAST_PART.get(k.rpartition(".")[2], ()):
+            if k.endswith(s):
+                out.add(k[:-len(s)])
+    return out
 
 def load_lora(lora, to_load, log_missing=True):
     patch_dict = {}
     loaded_keys = set()
+    layer_names = lora_layer_names(lora)
     for x in to_load:
+        if x not in layer_names: # skips trying every suffix for the entries of the key map the lora doesn't touch
+            continue
         alpha_name = "{}.alpha".format(x)
         alpha = None
         if alpha_name in lora.keys():
@@ -220,7 +249,22 @@ def load_lora(lora, to_load, log_missing=True):
 
     return patch_dict
 
+def _cached_key_map(model, attr, build):
+    """
+    The lora key map of a model only depends on its state dict keys and config so it is built once and stored on
+    the model object, chaining lora loaders then only has to copy it.
+    """
+    key_map = model.__dict__.get(attr, None)
+    if key_map is None:
+        key_map = build(model, {})
+        model.__dict__[attr] = key_map
+    return key_map
+
 def model_lora_keys_clip(model, key_map={}):
+    key_map.update(_cached_key_map(model, "lora_key_map_clip", _model_lora_keys_clip))
+    return key_map
+
+def _model_lora_keys_clip(model, key_map):
     sdk = model.state_dict().keys()
     for k in sdk:
         if k.endswith(".weight"):
@@ -299,6 +343,10 @@ def model_lora_keys_clip(model, key_map={}):
     return key_map
 
 def model_lora_keys_unet(model, key_map={}):
+    key_map.update(_cached_key_map(model, "lora_key_map_unet", _model_lora_keys_unet))
+    return key_map
+
+def _model_lora_keys_unet(model, key_map):
     sd = model.state_dict()
     sdk = sd.keys()
 
@@ -430,6 +478,151 @@ def pad_tensor_to_shape(tensor: torch.Tensor, new_shape: list[int]) -> torch.Ten
 
     return padded_tensor
 
+def unmerged_lora_supported(module, patches):
+    """
+    True when the patches of the weight of module can be applied at forward time by apply_unmerged_lora instead
+    of being merged into the weight: plain lora/locon patches (no mid weight, dora or reshape) on a Linear or
+    ungrouped Conv2d.
+    """
+    if isinstance(module, torch.nn.Conv2d):
+        if module.groups != 1 or module.padding_mode != "zeros":
+            return False
+    elif not isinstance(module, torch.nn.Linear):
+        return False
+
+    for p in patches:
+        strength, v, strength_model, offset, function = p
+        if strength_model != 1.0 or offset is not None or function is not None:
+            return False
+        if isinstance(v, list) or len(v) != 2 or v[0] != "lora":
+            return False
+        mat1, mat2, alpha, mid, dora_scale, reshape = v[1]
+        if mid is not None or dora_scale is not None or reshape is not None:
+            return False
+        if mat1.numel() // mat1.shape[0] != mat2.shape[0] or mat1.shape[0] != module.weight.shape[0]:
+            return False
+        if mat2.numel() != mat2.shape[0] * module.weight[0].numel():
+            return False
+    return True
+
+def has_nonzero_strength(patches):
+    """False when every patch has a strength of 0.0, a side branch for them would add nothing to the output."""
+    return any(p[0] != 0.0 for p in patches)
+
+def apply_unmerged_lora(module, input, patches):
+    """
+    Output of the lora patches as low rank side branches for module: the sum of strength * alpha * up(down(input)),
+    which is what merging them into the weight would add to the output of the layer.
+    """
+    out = None
+    for p in patches:
+        strength = p[0]
+        if strength == 0.0:
+            continue
+        mat1, mat2, alpha, _, _, _ = p[1][1]
+        rank = mat2.shape[0]
+        up = comfy.model_management.cast_to(mat1, input.dtype, input.device).reshape(mat1.shape[0], rank)
+        down = comfy.model_management.cast_to(mat2, input.dtype, input.device)
+        if alpha is not None:
+            alpha = alpha / rank
+        else:
+            alpha = 1.0
+
+        if isinstance(module, torch.nn.Conv2d):
+            x = torch.nn.functional.conv2d(input, down.reshape((rank,) + module.weight.shape[1:]), None, module.stride, module.padding, module.dilation)
+            x = torch.nn.functional.conv2d(x, up.reshape(up.shape + (1, 1)))
+        else:
+            x = torch.nn.functional.linear(torch.nn.functional.linear(input, down.reshape(rank, -1)), up)
+
+        x = x * (strength * alpha)
+        out = x if out is None else out + x
+    return out
+
+def is_plain_lora(patches, weight):
+    """True when all the patches are lora/locon patches without mid weights, dora, reshape, offsets or functions."""
+    for p in patches:
+        strength, v, strength_model, offset, function = p
+        if strength_model != 1.0 or offset is not None or function is not None:
+            return False
+        if isinstance(v, list) or len(v) != 2 or v[0] != "lora":
+            return False
+        mat1, mat2, alpha, mid, dora_scale, reshape = v[1]
+        if mid is not None or dora_scale is not None or reshape is not None:
+            return False
+        if mat1.shape[0] != weight.shape[0] or mat1.numel() // mat1.shape[0] != mat2.shape[0] or mat2.numel() * weight.shape[0] != mat2.shape[0] * weight.numel():
+            return False
+    return True
+
+def _lora_scale(p):
+    strength = p[0]
+    alpha = p[1][1][2]
+    rank = p[1][1][1].shape[0]
+    if alpha is not None:
+        return strength * alpha / rank
+    return strength
+
+def _stacked_lora_factors(batch, device, dtype):
+    """
+    The lora stacks of a batch of weights with the same ranks as (batch, out, total_rank) and (batch, total_rank, in)
+    tensors so up @ down is the sum of all the loras of each weight, with strengths and alphas folded into up.
+    """
+    patches = [x[1] for x in batch]
+    out_features = batch[0][2].shape[0]
+    ups = []
+    downs = []
+    scales = []
+    for j in range(len(patches[0])):
+        rank = patches[0][j][1][1][1].shape[0]
+        ups.append(torch.stack([p[j][1][1][0] for p in patches]).reshape(len(patches), out_features, rank))
+        downs.append(torch.stack([p[j][1][1][1] for p in patches]).reshape(len(patches), rank, -1))
+        scales.append(torch.tensor([_lora_scale(p[j]) for p in patches], dtype=torch.float64).reshape(-1, 1, 1).expand(-1, 1, rank))
+    up = comfy.model_management.cast_to_device(torch.cat(ups, dim=2), device, dtype)
+    down = comfy.model_management.cast_to_device(torch.cat(downs, dim=1), device, dtype)
+    return up * comfy.model_management.cast_to_device(torch.cat(scales, dim=2), device, dtype), down
+
+def calculate_weights(items, intermediate_dtype=torch.float32, original_weights=None, max_batch_bytes=None):
+    """
+    calculate_weight for a list of (key, patches, weight), returns the patched weights in the same order.
+
+    Weights whose patches are all plain loras are grouped by shape, device, dtype and lora shapes. The loras of a
+    group are stacked along the rank dimension so each batch of weights is patched with a single baddbmm, the
+    batches are at most max_batch_bytes (a quarter of the free memory of the device by default). The other
+    weights go through calculate_weight one by one.
+    """
+    out = [None] * len(items)
+    groups = {}
+    for i, (key, patches, weight) in enumerate(items):
+        if len(patches) > 0 and weight.dim() > 1 and is_plain_lora(patches, weight):
+            lora_shapes = tuple((p[1][1][0].shape, p[1][1][1].shape) for p in patches)
+            groups.setdefault((tuple(weight.shape), weight.device, weight.dtype, lora_shapes), []).append(i)
+        else:
+            out[i] = calculate_weight(patches, weight, key, intermediate_dtype=intermediate_dtype, original_weights=original_weights)
+
+    for (shape, device, dtype, lora_shapes), indexes in groups.items():
+        compute_dtype = dtype if dtype in (torch.float32, torch.float16, torch.bfloat16) else intermediate_dtype
+        weight_numel = math.prod(shape)
+        rank = sum(x[1][0] for x in lora_shapes)
+        item_bytes = (2 * weight_numel + 2 * rank * (shape[0] + weight_numel // shape[0])) * compute_dtype.itemsize
+        budget = max_batch_bytes
+        if budget is None:
+            budget = comfy.model_management.get_free_memory(device) // 4
+        batch_size = max(1, budget // item_bytes)
+
+        for start in range(0, len(indexes), batch_size):
+            batch = indexes[start:start + batch_size]
+            try:
+                up, down = _stacked_lora_factors([items[i] for i in batch], device, compute_dtype)
+                weights = torch.stack([items[i][2].reshape(shape[0], -1) for i in batch]).to(compute_dtype)
+                weights = torch.baddbmm(weights, up, down)
+            except Exception as e:
+                logging.error("ERROR batched lora merge {} {}".format(items[batch[0]][0], e))
+                for i in batch:
+                    out[i] = calculate_weight(items[i][1], items[i][2], items[i][0], intermediate_dtype=intermediate_dtype, original_weights=original_weights)
+                continue
+            for j, i in enumerate(batch):
+                out[i] = weights[j].reshape(shape).to(dtype, copy=True)
+    return out
+
 def calculate_weight(patches, weight, key, intermediate_dtype=torch.float32, original_weights=None):
     for p in patches:
         strength = p[0]
@@ -25,6 +25,7 @@ import sys
 import platform
 import weakref
 import gc
+import time
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -279,6 +280,9 @@ except:
 
 current_loaded_models = []
 
+#Totals since startup, read by the /metrics endpoint
+model_load_stats = {"loads": 0, "loaded_bytes": 0, "unloads": 0, "unloaded_bytes": 0, "load_seconds": 0.0}
+
 def module_size(module):
     module_mem = 0
     sd = module.state_dict()
@@ -324,6 +328,7 @@ class LoadedModel:
             return self.model_memory()
 
     def model_load(self, lowvram_model_memory=0, force_patch_weights=False):
+        loaded_before = self.model.loaded_size()
         self.model.model_patches_to(self.device)
         self.model.model_patches_to(self.model.model_dtype())
 
@@ -333,6 +338,8 @@ class LoadedModel:
             use_more_vram = 1e32
         self.model_use_more_vram(use_more_vram, force_patch_weights=force_patch_weights)
         real_model = self.model.model
+        model_load_stats["loads"] += 1
+        model_load_stats["loaded_bytes"] += max(0, self.model.loaded_size() - loaded_before)
 
         if is_intel_xpu() and not args.disable_ipex_optimize and 'ipex' in globals() and real_model is not None:
             with torch.no_grad():
@@ -351,8 +358,11 @@ class LoadedModel:
         if memory_to_free is not None:
             if memory_to_free < self.model.loaded_size():
                 freed = self.model.partially_unload(self.model.offload_device, memory_to_free)
+                model_load_stats["unloaded_bytes"] += freed
                 if freed >= memory_to_free:
                     return False
+        model_load_stats["unloads"] += 1
+        model_load_stats["unloaded_bytes"] += self.model.loaded_size()
         self.model.detach(unpatch_weights)
         self.model_finalizer.detach()
         self.model_finalizer = None
@@ -441,6 +451,7 @@ def free_memory(memory_required, device, keep_loaded=[]):
     return unloaded_models
 
 def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+    load_start_time = time.perf_counter()
     cleanup_models_gc()
     global vram_state
 
@@ -514,6 +525,7 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
 
         cur_loaded_model = loaded_model.model_load(lowvram_model_memory, force_patch_weights=force_patch_weights)
         current_loaded_models.insert(0, loaded_model)
+    model_load_stats["load_seconds"] += time.perf_counter() - load_start_time
     return
 
 def load_model_gpu(model):
@@ -916,6 +928,26 @@ def get_free_memory(dev=None, torch_free_too=False):
     else:
         return mem_free_total
 
+def reset_peak_memory_stats(dev=None):
+    if dev is None:
+        dev = get_torch_device()
+
+    if is_device_cuda(dev):
+        torch.cuda.reset_peak_memory_stats(dev)
+    elif is_device_type(dev, 'xpu'):
+        torch.xpu.reset_peak_memory_stats(dev)
+
+def get_peak_memory_allocated(dev=None):
+    """Peak bytes allocated by torch on the device since the last reset_peak_memory_stats, None if the device doesn't track it."""
+    if dev is None:
+        dev = get_torch_device()
+
+    if is_device_cuda(dev):
+        return torch.cuda.max_memory_allocated(dev)
+    elif is_device_type(dev, 'xpu'):
+        return torch.xpu.max_memory_allocated(dev)
+    return None
+
 def cpu_mode():
     global cpu_state
     return cpu_state == CPUState.CPU
@@ -25,6 +25,9 @@ import logging
 import uuid
 import collections
 import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import comfy.utils
 import comfy.float
@@ -34,6 +37,77 @@ import comfy.hooks
 import comfy.patcher_extension
 from comfy.patcher_extension import CallbacksMP, WrappersMP, PatcherInjection
 from comfy.comfy_types import UnetWrapperFunction
+from comfy.cli_args import args
+
+PATCH_WORKERS = min(8, os.cpu_count() or 1)
+PATCH_PIPELINE_DEPTH = 2
+PATCH_BATCH_BYTES = 32 * 1024 * 1024
+_patch_executor = None
+_patch_executor_lock = threading.Lock()
+
+def get_patch_executor():
+    """Thread pool used to calculate patched weights on the cpu while loading, None when there is a single core."""
+    global _patch_executor
+    if PATCH_WORKERS < 2:
+        return None
+    with _patch_executor_lock:
+        if _patch_executor is None:
+            _patch_executor = ThreadPoolExecutor(max_workers=PATCH_WORKERS, thread_name_prefix="patch_weights")
+        return _patch_executor
+
+class PatchedWeightCache:
+    """
+    LRU of patched weights limited to max_bytes (0 disables it), so switching back to a LoRA combination that was
+    used before doesn't calculate the patched weights again.
+
+    Entries are keyed by the base model, the weight key, dtype and device and the patches applied to it. Patches
+    are identified by their strengths and the identity of their tensors, every entry keeps a reference to the
+    patches it was calculated from so those identities stay valid as long as the entry exists.
+    """
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def patches_key(patches):
+        return tuple((p[0], id(p[1]), p[2], p[3], id(p[4])) for p in patches)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, weight, patches):
+        size = weight.nbytes
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (weight, size, patches)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+patched_weight_cache = PatchedWeightCache()
 
 def string_to_seed(data):
     crc = 0xFFFFFFFF
@@ -111,6 +185,13 @@ class LowVramPatch:
 
         return comfy.lora.calculate_weight(self.patches[self.key], weight, self.key, intermediate_dtype=intermediate_dtype)
 
+class LoraForwardPatch:
+    def __init__(self, key, patches):
+        self.key = key
+        self.patches = patches
+    def __call__(self, module, input):
+        return comfy.lora.apply_unmerged_lora(module, input, self.patches[self.key])
+
 def get_key_weight(model, key):
     set_func = None
     convert_func = None
@@ -493,26 +574,56 @@ class ModelPatcher:
                         sd.pop(k)
             return sd
 
-    def patch_weight_to_device(self, key, device_to=None, inplace_update=False):
-        if key not in self.patches:
-            return
-
-        weight, set_func, convert_func = get_key_weight(self.model, key)
-        inplace_update = self.weight_inplace_update or inplace_update
-
+    def backup_weight(self, key, inplace_update=False):
         if key not in self.backup:
+            weight, _, _ = get_key_weight(self.model, key)
             self.backup[key] = collections.namedtuple('Dimension', ['weight', 'inplace_update'])(weight.to(device=self.offload_device, copy=inplace_update), inplace_update)
 
-        if device_to is not None:
-            temp_weight = comfy.model_management.cast_to_device(weight, device_to, torch.float32, copy=True)
-        else:
-            temp_weight = weight.to(torch.float32, copy=True)
-        if convert_func is not None:
-            temp_weight = convert_func(temp_weight, inplace=True)
+    def calculate_patched_weight(self, key, device_to=None):
+        """Calculates the patched weight for key without modifying the model, safe to call from worker threads."""
+        return self.calculate_patched_weights([key], device_to)[0]
+
+    def calculate_patched_weights(self, keys, device_to=None):
+        """
+        Patched weights for keys, calculated without modifying the model and safe to call from worker threads.
+        Plain loras are merged in batches by comfy.lora.calculate_weights.
+        """
+        out = [None] * len(keys)
+        pending = []
+        for i, key in enumerate(keys):
+            weight, set_func, convert_func = get_key_weight(self.model, key)
+            cache_key = None
+            if patched_weight_cache.max_bytes > 0 and set_func is None:
+                if not hasattr(self.model, "patched_weight_cache_id"):
+                    self.model.patched_weight_cache_id = uuid.uuid4()
+                device = weight.device if device_to is None else torch.device(device_to)
+                cache_key = (self.model.patched_weight_cache_id, key, weight.dtype, device, PatchedWeightCache.patches_key(self.patches[key]))
+                cached = patched_weight_cache.get(cache_key)
+                if cached is not None:
+                    # always a copy, the model weight can be updated in place later
+                    out[i] = cached.to(device, copy=True)
+                    continue
 
-        out_weight = comfy.lora.calculate_weight(self.patches[key], temp_weight, key)
+            if device_to is not None:
+                temp_weight = comfy.model_management.cast_to_device(weight, device_to, torch.float32, copy=True)
+            else:
+                temp_weight = weight.to(torch.float32, copy=True)
+            if convert_func is not None:
+                temp_weight = convert_func(temp_weight, inplace=True)
+            pending.append((i, key, weight.dtype, set_func, cache_key, temp_weight))
+
+        patched = comfy.lora.calculate_weights([(x[1], self.patches[x[1]], x[5]) for x in pending])
+        for (i, key, dtype, set_func, cache_key, _), out_weight in zip(pending, patched):
+            if set_func is None:
+                out_weight = comfy.float.stochastic_rounding(out_weight, dtype, seed=string_to_seed(key))
+            if cache_key is not None:
+                patched_weight_cache.put(cache_key, out_weight.to(self.offload_device, copy=True), self.patches[key])
+            out[i] = out_weight
+        return out
+
+    def set_patched_weight(self, key, out_weight, inplace_update=False):
+        _, set_func, _ = get_key_weight(self.model, key)
         if set_func is None:
-            out_weight = comfy.float.stochastic_rounding(out_weight, weight.dtype, seed=string_to_seed(key))
             if inplace_update:
                 comfy.utils.copy_to_param(self.model, key, out_weight)
             else:
@@ -520,6 +631,93 @@ class ModelPatcher:
         else:
             set_func(out_weight, inplace_update=inplace_update, seed=string_to_seed(key))
 
+    def patch_weight_to_device(self, key, device_to=None, inplace_update=False):
+        if key not in self.patches:
+            return
+
+        inplace_update = self.weight_inplace_update or inplace_update
+        self.backup_weight(key, inplace_update)
+        out_weight = self.calculate_patched_weight(key, device_to)
+        self.set_patched_weight(key, out_weight, inplace_update)
+
+    def _patch_batches(self, keys):
+        """Splits keys in batches of up to PATCH_BATCH_BYTES of float32 weights, keys are kept in order."""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for key in keys:
+            weight, _, _ = get_key_weight(self.model, key)
+            size = weight.numel() * 4
+            if len(batch) > 0 and batch_bytes + size > PATCH_BATCH_BYTES:
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(key)
+            batch_bytes += size
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    def patch_weights_to_device(self, keys, device_to=None):
+        """
+        Same as calling patch_weight_to_device for every key, with the weights patched in batches so loras can be
+        merged with batched matmuls. When the patches are calculated on the cpu, worker threads calculate the
+        batches while this thread installs the finished weights in order, with at most PATCH_PIPELINE_DEPTH batches
+        per worker in flight to bound the memory used by the temporary copies.
+        """
+        keys = [k for k in keys if k in self.patches]
+        inplace_update = self.weight_inplace_update
+        batches = self._patch_batches(keys)
+        executor = None
+        if len(batches) > 1 and self._patch_on_cpu(keys[0], device_to):
+            executor = get_patch_executor()
+
+        if executor is None:
+            for batch in batches:
+                for key in batch:
+                    self.backup_weight(key, inplace_update)
+                for key, out_weight in zip(batch, self.calculate_patched_weights(batch, device_to)):
+                    self.set_patched_weight(key, out_weight, inplace_update)
+            return
+
+        in_flight = collections.deque()
+        max_in_flight = PATCH_WORKERS * PATCH_PIPELINE_DEPTH
+        try:
+            for batch in batches:
+                for key in batch:
+                    self.backup_weight(key, inplace_update)
+                in_flight.append((batch, executor.submit(self.calculate_patched_weights, batch, device_to)))
+                while len(in_flight) >= max_in_flight:
+                    done_batch, future = in_flight.popleft()
+                    for key, out_weight in zip(done_batch, future.result()):
+                        self.set_patched_weight(key, out_weight, inplace_update)
+            while len(in_flight) > 0:
+                done_batch, future = in_flight.popleft()
+                for key, out_weight in zip(done_batch, future.result()):
+                    self.set_patched_weight(key, out_weight, inplace_update)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _patch_on_cpu(self, key, device_to):
+        if device_to is not None:
+            return torch.device(device_to).type == "cpu"
+        weight, _, _ = get_key_weight(self.model, key)
+        return weight.device.type == "cpu"
+
+    def unmerged_lora_keys(self, force_patch_weights=False):
+        """Weight keys whose patches are applied at forward time as lora side branches instead of being merged."""
+        if not args.unmerged_lora or force_patch_weights:
+            return set()
+        out = set()
+        for key, patches in self.patches.items():
+            if not key.endswith(".weight"):
+                continue
+            module = comfy.utils.get_attr(self.model, key[:-len(".weight")])
+            if hasattr(module, "comfy_cast_weights") and comfy.lora.unmerged_lora_supported(module, patches):
+                out.add(key)
+        return out
+
     def _load_list(self):
         loading = []
         for n, m in self.model.named_modules():
@@ -542,6 +740,7 @@ class ModelPatcher:
             patch_counter = 0
             lowvram_counter = 0
             loading = self._load_list()
+            unmerged_keys = self.unmerged_lora_keys(force_patch_weights)
 
             load_completely = []
             loading.sort(reverse=True)
@@ -567,6 +766,10 @@ class ModelPatcher:
                     if weight_key in self.patches:
                         if force_patch_weights:
                             self.patch_weight_to_device(weight_key)
+                        elif weight_key in unmerged_keys:
+                            # Nothing to add when all the patches have strength 0, the weight is used as is
+                            if comfy.lora.has_nonzero_strength(self.patches[weight_key]):
+                                m.lora_branch = LoraForwardPatch(weight_key, self.patches)
                         else:
                             m.weight_function = LowVramPatch(weight_key, self.patches)
                             patch_counter += 1
@@ -589,6 +792,8 @@ class ModelPatcher:
                         load_completely.append((module_mem, n, m, params))
 
             load_completely.sort(reverse=True)
+            patch_keys = []
+            patched_modules = []
             for x in load_completely:
                 n = x[1]
                 m = x[2]
@@ -598,8 +803,16 @@ class ModelPatcher:
                         continue
 
                 for param in params:
-                    self.patch_weight_to_device("{}.{}".format(n, param), device_to=device_to)
+                    key = "{}.{}".format(n, param)
+                    if key in unmerged_keys:
+                        if comfy.lora.has_nonzero_strength(self.patches[key]):
+                            m.lora_branch = LoraForwardPatch(key, self.patches)
+                    else:
+                        patch_keys.append(key)
+                patched_modules.append((n, m))
 
+            self.patch_weights_to_device(patch_keys, device_to=device_to)
+            for n, m in patched_modules:
                 logging.debug("lowvram: loaded module regularly {} {}".format(n, m))
                 m.comfy_patched_weights = True
 
@@ -674,6 +887,8 @@ class ModelPatcher:
             for m in self.model.modules():
                 if hasattr(m, "comfy_patched_weights"):
                     del m.comfy_patched_weights
+                if getattr(m, "lora_branch", None) is not None:
+                    m.lora_branch = None
 
         keys = list(self.object_patches_backup.keys())
         for k in keys:
@@ -717,7 +932,7 @@ class ModelPatcher:
                     if move_weight:
                         m.to(device_to)
                         if lowvram_possible:
-                            if weight_key in self.patches:
+                            if weight_key in self.patches and m.lora_branch is None:
                                 m.weight_function = LowVramPatch(weight_key, self.patches)
                                 patch_counter += 1
                             if bias_key in self.patches:
@@ -53,6 +53,7 @@ class CastWeightBiasOp:
     comfy_cast_weights = False
     weight_function = None
     bias_function = None
+    lora_branch = None
 
 class disable_weight_init:
     class Linear(torch.nn.Linear, CastWeightBiasOp):
@@ -65,9 +66,12 @@ class disable_weight_init:
 
         def forward(self, *args, **kwargs):
             if self.comfy_cast_weights:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                out = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                out = super().forward(*args, **kwargs)
+            if self.lora_branch is not None:
+                out = out + self.lora_branch(self, args[0])
+            return out
 
     class Conv1d(torch.nn.Conv1d, CastWeightBiasOp):
         def reset_parameters(self):
@@ -93,9 +97,12 @@ class disable_weight_init:
 
         def forward(self, *args, **kwargs):
             if self.comfy_cast_weights:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                out = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                out = super().forward(*args, **kwargs)
+            if self.lora_branch is not None:
+                out = out + self.lora_branch(self, args[0])
+            return out
 
     class Conv3d(torch.nn.Conv3d, CastWeightBiasOp):
         def reset_parameters(self):
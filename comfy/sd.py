@@ -14,6 +14,7 @@ import comfy.ldm.lightricks.vae.causal_video_autoencoder
 import yaml
 
 import comfy.utils
+import comfy.converted_model_cache
 
 from . import clip_vision
 from . import gligen
@@ -708,7 +709,7 @@ def load_checkpoint(config_path=None, ckpt_path=None, output_vae=True, output_cl
     return (model, clip, vae)
 
 def load_checkpoint_guess_config(ckpt_path, output_vae=True, output_clip=True, output_clipvision=False, embedding_directory=None, output_model=True, model_options={}, te_model_options={}):
-    sd = comfy.utils.load_torch_file(ckpt_path)
+    sd = comfy.utils.load_torch_file(ckpt_path, lazy=True)
     out = load_state_dict_guess_config(sd, output_vae, output_clip, output_clipvision, embedding_directory, output_model, model_options, te_model_options=te_model_options)
     if out is None:
         raise RuntimeError("ERROR: Could not detect model type of: {}".format(ckpt_path))
@@ -790,7 +791,51 @@ def load_state_dict_guess_config(sd, output_vae=True, output_clip=True, output_c
     return (model_patcher, clip, vae, clipvision)
 
 
-def load_diffusion_model_state_dict(sd, model_options={}): #load unet in diffusers or regular format
+def detect_model_from_header(safetensors_path):
+    """
+    Identifies the model in a safetensors file using only the key names, shapes and dtypes from its header,
+    no tensor data is read. Returns None when the header can't be read.
+
+    The model type (eps, v prediction, ...) is reported as None when it depends on the weight values.
+    """
+    sd = comfy.utils.safetensors_header_state_dict(safetensors_path)
+    if sd is None:
+        return None
+
+    diffusion_model_prefix = model_detection.unet_prefix_from_state_dict(sd)
+    model_config = model_detection.model_config_from_unet(sd, diffusion_model_prefix)
+    if model_config is None and diffusion_model_prefix != "":
+        diffusion_model_prefix = ""
+        model_config = model_detection.model_config_from_unet(sd, diffusion_model_prefix)
+
+    te_model = detect_te_model(sd)
+    weight_dtype = comfy.utils.weight_dtype(sd, diffusion_model_prefix if model_config is not None else "")
+    out = {
+        "model": None,
+        "model_type": None,
+        "unet_config": None,
+        "diffusion_model_prefix": None,
+        "clip": None,
+        "text_encoder": te_model.name if te_model is not None else None,
+        "weight_dtype": str(weight_dtype).replace("torch.", "") if weight_dtype is not None else None,
+        "parameters": comfy.utils.calculate_parameters(sd, diffusion_model_prefix if model_config is not None else ""),
+    }
+
+    if model_config is not None:
+        out["model"] = model_config.__class__.__name__
+        out["unet_config"] = {k: v for k, v in model_config.unet_config.items() if isinstance(v, (str, int, float, bool, list, tuple, dict, type(None)))}
+        out["diffusion_model_prefix"] = diffusion_model_prefix
+        try:
+            out["model_type"] = model_config.model_type(sd, diffusion_model_prefix).name
+        except RuntimeError: #needs the tensor values
+            pass
+        clip_target = model_config.clip_target(state_dict=sd)
+        if clip_target is not None:
+            out["clip"] = clip_target.clip.__name__
+    return out
+
+
+def load_diffusion_model_state_dict(sd, model_options={}, converted_cache_key=None, converted_cache_dtypes=None): #load unet in diffusers or regular format
     dtype = model_options.get("dtype", None)
 
     #Allow loading unets from checkpoint files
@@ -801,6 +846,9 @@ def load_diffusion_model_state_dict(sd, model_options={}): #load unet in diffuse
 
     parameters = comfy.utils.calculate_parameters(sd)
     weight_dtype = comfy.utils.weight_dtype(sd)
+    if converted_cache_dtypes is not None:
+        # The weights of a cached model were cast, pick the dtypes like the source file would
+        weight_dtype = comfy.converted_model_cache.dtype_from_name(converted_cache_dtypes["weight_dtype"])
 
     load_device = model_management.get_torch_device()
     model_config = model_detection.model_config_from_unet(sd, "")
@@ -838,6 +886,9 @@ def load_diffusion_model_state_dict(sd, model_options={}): #load unet in diffuse
         unet_dtype = dtype
 
     manual_cast_dtype = model_management.unet_manual_cast(unet_dtype, load_device, model_config.supported_inference_dtypes)
+    if converted_cache_dtypes is not None and (converted_cache_dtypes["unet_dtype"], converted_cache_dtypes["manual_cast_dtype"]) != (str(unet_dtype), str(manual_cast_dtype)):
+        logging.info("Cached converted model was stored for unet dtype {} and manual cast dtype {}, not {} and {}".format(converted_cache_dtypes["unet_dtype"], converted_cache_dtypes["manual_cast_dtype"], unet_dtype, manual_cast_dtype))
+        return None
     model_config.set_inference_dtype(unet_dtype, manual_cast_dtype)
     model_config.custom_operations = model_options.get("custom_operations", model_config.custom_operations)
     if model_options.get("fp8_optimizations", False):
@@ -845,6 +896,11 @@ def load_diffusion_model_state_dict(sd, model_options={}): #load unet in diffuse
 
     model = model_config.get_model(new_sd, "")
     model = model.to(offload_device)
+    if converted_cache_key is not None and model_config.scaled_fp8 is None:
+        target_dtypes = comfy.converted_model_cache.target_dtypes(model)
+        if new_sd is not sd or any(w.is_floating_point() and w.dtype.itemsize > target_dtypes.get(k, w.dtype).itemsize for k, w in new_sd.items()):
+            dtypes = {"weight_dtype": weight_dtype, "unet_dtype": unet_dtype, "manual_cast_dtype": manual_cast_dtype}
+            comfy.converted_model_cache.cache.put(converted_cache_key, new_sd, target_dtypes, dtypes)
     model.load_model_weights(new_sd, "")
     left_over = sd.keys()
     if len(left_over) > 0:
@@ -853,8 +909,17 @@ def load_diffusion_model_state_dict(sd, model_options={}): #load unet in diffuse
 
 
 def load_diffusion_model(unet_path, model_options={}):
-    sd = comfy.utils.load_torch_file(unet_path)
-    model = load_diffusion_model_state_dict(sd, model_options=model_options)
+    cache = comfy.converted_model_cache.cache
+    cache_key = cache.key(unet_path, model_options) if cache is not None else None
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            model = load_diffusion_model_state_dict(cached[0], model_options=model_options, converted_cache_dtypes=cached[1])
+            if model is not None:
+                return model
+
+    sd = comfy.utils.load_torch_file(unet_path, lazy=True)
+    model = load_diffusion_model_state_dict(sd, model_options=model_options, converted_cache_key=cache_key)
     if model is None:
         logging.error("ERROR UNSUPPORTED UNET {}".format(unet_path))
         raise RuntimeError("ERROR: Could not detect model type of: {}".format(unet_path))
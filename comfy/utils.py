@@ -20,18 +20,150 @@
 import torch
 import math
 import struct
+import json
 import comfy.checkpoint_pickle
 import safetensors.torch
 import numpy as np
 from PIL import Image
 import logging
 import itertools
+import collections
+import os
+import threading
+from collections.abc import MutableMapping
+
+_NOT_LOADED = object()
+
+class SafetensorsStateDict(MutableMapping):
+    """
+    State dict backed by a safetensors file opened with safe_open, tensors are only read from the (memory mapped)
+    file when their key is accessed and keys that are never used are never loaded.
+
+    Behaves like a regular dict for the state dict helpers: values can be popped, replaced or added and a loaded
+    tensor is kept until it is popped or deleted, so handing the popped tensors to load_state_dict copies them
+    straight into the model parameters (casting to the parameter dtype) without a full copy of the file in RAM.
+    """
+    def __init__(self, path, device="cpu"):
+        self.file = safetensors.safe_open(path, framework="pt", device=device)
+        self.entries = dict.fromkeys(self.file.keys(), _NOT_LOADED)
+
+    def __getitem__(self, key):
+        value = self.entries[key]
+        if value is _NOT_LOADED:
+            value = self.file.get_tensor(key)
+            self.entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def metadata(self):
+        return self.file.metadata()
+
+    def copy(self):
+        out = self.__class__.__new__(self.__class__)
+        out.file = self.file
+        out.entries = self.entries.copy()
+        return out
 
-def load_torch_file(ckpt, safe_load=False, device=None):
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, list(self.entries.keys()))
+
+class StateDictCache:
+    """
+    LRU of loaded state dicts shared by everything that goes through load_torch_file, limited to max_bytes
+    (the size of the files on disk, 0 disables it). Entries are keyed by the path, mtime and size of the file
+    so a changed file is loaded again.
+
+    Callers get a shallow copy: popping or replacing keys, like the loading code does, leaves the cached state
+    dict untouched while the tensors themselves are shared.
+    """
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0].copy()
+
+    def put(self, key, sd, size):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (sd.copy(), size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total > 0 else 0.0
+
+state_dict_cache = StateDictCache()
+
+def load_torch_file(ckpt, safe_load=False, device=None, lazy=False):
     if device is None:
         device = torch.device("cpu")
+
+    cache_key = None
+    if state_dict_cache.max_bytes > 0:
+        try:
+            st = os.stat(ckpt)
+            cache_key = (os.path.abspath(ckpt), st.st_mtime_ns, st.st_size, safe_load, str(device), lazy)
+        except OSError:
+            pass
+        else:
+            sd = state_dict_cache.get(cache_key)
+            if sd is not None:
+                return sd
+
+    sd = _load_torch_file(ckpt, safe_load=safe_load, device=device, lazy=lazy)
+    if cache_key is not None and isinstance(sd, (dict, SafetensorsStateDict)):
+        state_dict_cache.put(cache_key, sd, cache_key[2])
+    return sd
+
+def _load_torch_file(ckpt, safe_load, device, lazy):
     if ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft"):
-        sd = safetensors.torch.load_file(ckpt, device=device.type)
+        if lazy:
+            sd = SafetensorsStateDict(ckpt, device=device.type)
+        else:
+            sd = safetensors.torch.load_file(ckpt, device=device.type)
     else:
         if safe_load:
             if not 'weights_only' in torch.load.__code__.co_varnames:
@@ -595,6 +727,36 @@ def safetensors_header(safetensors_path, max_size=100*1024*1024):
             return None
         return f.read(length_of_header)
 
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+    "F8_E4M3": getattr(torch, "float8_e4m3fn", torch.uint8),
+    "F8_E5M2": getattr(torch, "float8_e5m2", torch.uint8),
+}
+
+def safetensors_header_state_dict(safetensors_path, max_size=100*1024*1024):
+    """
+    State dict of meta tensors with the names, shapes and dtypes from the header of a safetensors file, for
+    code that only looks at those (like model detection) without reading any tensor data.
+    """
+    header = safetensors_header(safetensors_path, max_size=max_size)
+    if header is None:
+        return None
+    sd = {}
+    for k, v in json.loads(header).items():
+        if k == "__metadata__":
+            continue
+        sd[k] = torch.empty(v["shape"], dtype=SAFETENSORS_DTYPES.get(v["dtype"], torch.uint8), device="meta")
+    return sd
+
 def set_attr(obj, attr, value):
     attrs = attr.split(".")
     for name in attrs[:-1]:
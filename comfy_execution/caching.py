@@ -5,6 +5,9 @@ from comfy_execution.graph import DynamicPrompt
 import nodes
 
 from comfy_execution.graph_utils import is_link
+from comfy_execution import metrics
+
+CACHE_LOOKUPS = metrics.get_or_create(metrics.Counter, "comfy_cache_lookups_total", "Node cache lookups by cache and result.", ["cache", "result"])
 
 NODE_CLASS_CONTAINS_UNIQUE_ID: Dict[str, bool] = {}
 
@@ -149,8 +152,30 @@ class BasicCache:
         self.cache_key_set: CacheKeySet
         self.cache = {}
         self.subcaches = {}
+        self._hit_counter = None
+        self._miss_counter = None
+        self._recorded_lookups = set()
+
+    def set_metrics_name(self, name):
+        self._hit_counter = CACHE_LOOKUPS.labels(name, "hit")
+        self._miss_counter = CACHE_LOOKUPS.labels(name, "miss")
+
+    def record_lookup(self, node_id, hit):
+        """
+        Counts the lookup that decided whether the node runs, get() is also used for prechecks and to read inputs so
+        it isn't counted there. Only the first lookup of a node per prompt is counted, nodes waiting on lazy inputs
+        or subgraphs go through execute() more than once.
+        """
+        if self._hit_counter is None or node_id in self._recorded_lookups:
+            return
+        self._recorded_lookups.add(node_id)
+        if hit:
+            self._hit_counter.inc()
+        else:
+            self._miss_counter.inc()
 
     def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+        self._recorded_lookups = set()
         self.dynprompt = dynprompt
         self.cache_key_set = self.key_class(dynprompt, node_ids, is_changed_cache)
         self.is_changed_cache = is_changed_cache
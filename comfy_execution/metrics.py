@@ -0,0 +1,265 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Exposes counters, gauges and histograms in the Prometheus text exposition format.
+# Recording a sample is a dict lookup and an add under a lock so it is cheap enough to
+# call from the execution hot path. Values that are expensive to compute (device memory,
+# socket counts) should be gauges backed by a function, which is only called on scrape.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join("{}=\"{}\"".format(k, _escape_label(v)) for k, v in labels.items()) + "}"
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if registry is None:
+            registry = REGISTRY
+        registry.register(self)
+
+    def labels(self, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+        labelvalues = tuple(str(v) for v in labelvalues)
+        child = self._children.get(labelvalues, None)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def _default_child(self):
+        if len(self.labelnames) > 0:
+            raise ValueError(f"{self.name} has labels {self.labelnames}, use labels() first")
+        return self.labels()
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def samples(self) -> Iterable[Sample]:
+        for labelvalues, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            for suffix, extra_labels, value in child.samples():
+                yield (self.name + suffix, {**labels, **extra_labels}, value)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts.")
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, function: Callable[[], float]):
+        """For totals that are already tracked elsewhere and only need to be read on scrape."""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            yield ("", {}, float(self.function()))
+        else:
+            yield ("", {}, self.value)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default_child().inc(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default_child().set_function(function)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            yield ("", {}, float(self.function()))
+        else:
+            yield ("", {}, self.value)
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default_child().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default_child().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default_child().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default_child().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield ("_bucket", {"le": _format_value(bound)}, cumulative)
+        cumulative += counts[-1]
+        yield ("_bucket", {"le": "+Inf"}, cumulative)
+        yield ("_sum", {}, total)
+        yield ("_count", {}, cumulative)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default_child().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def unregister(self, metric: Metric):
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name, None)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        Adds a function that is called right before the metrics are rendered.
+        Use it to refresh gauges that are too expensive to keep up to date on every change.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def generate_latest(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+
+        for collector in collectors:
+            collector()
+
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")))
+            lines.append("# TYPE {} {}".format(metric.name, metric.type_name))
+            for name, labels, value in metric.samples():
+                lines.append("{}{} {}".format(name, _format_labels(labels), _format_value(value)))
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def generate_latest(registry: Optional[Registry] = None) -> str:
+    if registry is None:
+        registry = REGISTRY
+    return registry.generate_latest()
+
+
+def get_or_create(metric_class, name: str, documentation: str, *args, **kwargs):
+    """Returns the already registered metric with this name, so modules that get reloaded don't raise on a duplicate."""
+    registry = kwargs.get("registry", None) or REGISTRY
+    existing = registry.get(name)
+    if existing is not None:
+        return existing
+    return metric_class(name, documentation, *args, **kwargs)
@@ -0,0 +1,194 @@
+import collections
+import heapq
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+import folder_paths
+
+# Model file inputs of the loader nodes by class type, input name to model folder. Custom nodes can add theirs.
+LOADER_INPUTS = {
+    "CheckpointLoaderSimple": {"ckpt_name": "checkpoints"},
+    "CheckpointLoader": {"ckpt_name": "checkpoints"},
+    "unCLIPCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "ImageOnlyCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "UNETLoader": {"unet_name": "diffusion_models"},
+    "LoraLoader": {"lora_name": "loras"},
+    "LoraLoaderModelOnly": {"lora_name": "loras"},
+    "VAELoader": {"vae_name": "vae"},
+    "CLIPLoader": {"clip_name": "text_encoders"},
+    "DualCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders"},
+    "TripleCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders", "clip_name3": "text_encoders"},
+    "ControlNetLoader": {"control_net_name": "controlnet"},
+    "DiffControlNetLoader": {"control_net_name": "controlnet"},
+    "CLIPVisionLoader": {"clip_name": "clip_vision"},
+    "StyleModelLoader": {"style_model_name": "style_models"},
+    "GLIGENLoader": {"gligen_name": "gligen"},
+    "UpscaleModelLoader": {"model_name": "upscale_models"},
+}
+
+READ_CHUNK_SIZE = 16 * 1024 * 1024
+# Never use more than this fraction of the available RAM for prefetched files
+MAX_AVAILABLE_RAM_FRACTION = 0.5
+
+
+def prompt_model_files(prompt):
+    """Full paths of the model files the loader nodes of a prompt will load, in node order."""
+    out = []
+    for node in prompt.values():
+        inputs = LOADER_INPUTS.get(node.get("class_type", None), None)
+        if inputs is None:
+            continue
+        for input_name, folder_name in inputs.items():
+            value = node.get("inputs", {}).get(input_name, None)
+            if not isinstance(value, str):  # linked input
+                continue
+            path = folder_paths.get_full_path(folder_name, value)
+            if path is not None and path not in out:
+                out.append(path)
+    return out
+
+
+class ModelPrefetcher:
+    """
+    Reads the model files of the next queued prompts into the page cache on a background thread while the current
+    prompt runs, so the loader nodes of the next prompts load them from memory instead of disk.
+
+    The files read recently are remembered (up to max_bytes of them) and not read again, older ones might have been
+    evicted from the page cache by then and are read again when queued.
+
+    Reading competes with the running prompt for the disk, so nothing is read until the loader nodes of the running
+    prompt are done (executed or cached, or the prompt finished) and a read stops when the next prompt starts.
+    """
+    def __init__(self, prompt_queue, lookahead=2, max_bytes=8 * 1024 * 1024 * 1024):
+        self.prompt_queue = prompt_queue
+        self.lookahead = lookahead
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Loader node ids of the running prompt that haven't run yet
+        self.pending_loaders = set()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.prefetched = collections.OrderedDict()
+        self.stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+        self.thread = threading.Thread(target=self._run, daemon=True, name="model-prefetch")
+        self.thread.start()
+
+    def wake(self):
+        self.wake_event.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def prompt_started(self, prompt):
+        with self.lock:
+            self.pending_loaders = {k for k, v in prompt.items() if v.get("class_type", None) in LOADER_INPUTS}
+        if len(self.pending_loaders) == 0:
+            self.wake()
+
+    def node_done(self, node_id):
+        with self.lock:
+            if node_id not in self.pending_loaders:
+                return
+            self.pending_loaders.discard(node_id)
+            done = len(self.pending_loaders) == 0
+        if done:
+            self.wake()
+
+    def prompt_finished(self):
+        with self.lock:
+            self.pending_loaders = set()
+        self.wake()
+
+    def loading(self):
+        """True while the running prompt can still be loading model files."""
+        return len(self.pending_loaders) > 0
+
+    def interrupted(self):
+        return self.stop_event.is_set() or self.loading()
+
+    def upcoming_files(self):
+        with self.prompt_queue.mutex:
+            upcoming = heapq.nsmallest(self.lookahead, self.prompt_queue.queue)
+        out = []
+        for item in upcoming:
+            for path in prompt_model_files(item[2]):
+                if path not in out:
+                    out.append(path)
+        return out
+
+    def plan(self, paths):
+        """The files to read, in queue order, that fit in the budget and weren't read recently."""
+        budget = min(self.max_bytes, int(psutil.virtual_memory().available * MAX_AVAILABLE_RAM_FRACTION))
+        out = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size > budget:
+                continue
+            budget -= st.st_size
+            if self.prefetched.get(path, None) == (st.st_mtime_ns, st.st_size):
+                self.prefetched.move_to_end(path)
+                continue
+            out.append((path, st))
+        return out
+
+    def _remember(self, path, st):
+        self.prefetched[path] = (st.st_mtime_ns, st.st_size)
+        self.prefetched.move_to_end(path)
+        total = sum(x[1] for x in self.prefetched.values())
+        while total > self.max_bytes and len(self.prefetched) > 1:
+            total -= self.prefetched.popitem(last=False)[1][1]
+
+    def read_file(self, path):
+        buffer = bytearray(READ_CHUNK_SIZE)
+        read = 0
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while not self.interrupted():
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                read += n
+        return read
+
+    def prefetch(self):
+        for path, st in self.plan(self.upcoming_files()):
+            if self.interrupted():
+                return
+            start = time.perf_counter()
+            try:
+                read = self.read_file(path)
+            except OSError as e:
+                logging.debug("Unable to prefetch model file {}: {}".format(path, e))
+                continue
+            if self.interrupted():
+                # Partially read, prefetched again when the loaders of the running prompt are done
+                return
+            elapsed = time.perf_counter() - start
+            self.stats["files"] += 1
+            self.stats["bytes"] += read
+            self.stats["seconds"] += elapsed
+            self._remember(path, st)
+            logging.debug("Prefetched model file {} ({:.1f} MB in {:.2f}s)".format(path, read / (1024 * 1024), elapsed))
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.wake_event.wait()
+            self.wake_event.clear()
+            if self.stop_event.is_set():
+                return
+            if self.loading():
+                # Woken again by node_done or prompt_finished
+                continue
+            try:
+                self.prefetch()
+            except Exception as e:
+                logging.warning("Model prefetch failed: {}".format(e))
@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import psutil
+import torch
+
+import comfy.model_management
+
+
+def output_size_bytes(value, _depth=0) -> int:
+    """Bytes held by the tensors in a node output. Only walks plain containers so models and other objects are not counted."""
+    if _depth > 8:
+        return 0
+    if isinstance(value, torch.Tensor):
+        return value.nelement() * value.element_size()
+    if isinstance(value, dict):
+        return sum(output_size_bytes(v, _depth + 1) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(output_size_bytes(v, _depth + 1) for v in value)
+    return 0
+
+
+class PromptProfiler:
+    """Collects per node timings and memory usage for one prompt execution."""
+    def __init__(self):
+        self.nodes: Dict[str, dict] = {}
+        self.device = comfy.model_management.get_torch_device()
+        self.process = psutil.Process()
+
+    def _entry(self, node_id, class_type):
+        entry = self.nodes.get(node_id, None)
+        if entry is None:
+            entry = {
+                "class_type": class_type,
+                "cached": False,
+                "executions": 0,
+                "wall_time": 0.0,
+                "model_load_time": 0.0,
+                "peak_memory_allocated": None,
+                "ram_rss": None,
+                "output_bytes": 0,
+            }
+            self.nodes[node_id] = entry
+        return entry
+
+    def node_cached(self, node_id, class_type):
+        entry = self._entry(node_id, class_type)
+        entry["cached"] = True
+        return entry
+
+    def start_node(self):
+        comfy.model_management.reset_peak_memory_stats(self.device)
+        return (time.perf_counter(), comfy.model_management.model_load_stats["load_seconds"])
+
+    def end_node(self, node_id, class_type, start, output_data) -> dict:
+        start_time, load_seconds = start
+        entry = self._entry(node_id, class_type)
+        entry["executions"] += 1
+        entry["wall_time"] += time.perf_counter() - start_time
+        entry["model_load_time"] += comfy.model_management.model_load_stats["load_seconds"] - load_seconds
+        peak = comfy.model_management.get_peak_memory_allocated(self.device)
+        if peak is not None:
+            entry["peak_memory_allocated"] = max(peak, entry["peak_memory_allocated"] or 0)
+        entry["ram_rss"] = self.process.memory_info().rss
+        entry["output_bytes"] = output_size_bytes(output_data)
+        return entry
+
+    def as_dict(self):
+        return {
+            "nodes": self.nodes,
+            "total_wall_time": sum(x["wall_time"] for x in self.nodes.values()),
+            "total_model_load_time": sum(x["model_load_time"] for x in self.nodes.values()),
+        }
+
+
+class ProfileSummary:
+    """Aggregates node profiles per class_type over every prompt executed since startup (or the last clear)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.classes: Dict[str, dict] = {}
+        self.prompts = 0
+
+    def add(self, profiler: PromptProfiler):
+        with self.lock:
+            self.prompts += 1
+            for entry in profiler.nodes.values():
+                summary = self.classes.get(entry["class_type"], None)
+                if summary is None:
+                    summary = {
+                        "count": 0,
+                        "cached": 0,
+                        "total_wall_time": 0.0,
+                        "max_wall_time": 0.0,
+                        "total_model_load_time": 0.0,
+                        "total_output_bytes": 0,
+                        "max_peak_memory_allocated": None,
+                    }
+                    self.classes[entry["class_type"]] = summary
+                if entry["cached"] and entry["executions"] == 0:
+                    summary["cached"] += 1
+                    continue
+                summary["count"] += 1
+                summary["total_wall_time"] += entry["wall_time"]
+                summary["max_wall_time"] = max(summary["max_wall_time"], entry["wall_time"])
+                summary["total_model_load_time"] += entry["model_load_time"]
+                summary["total_output_bytes"] += entry["output_bytes"]
+                if entry["peak_memory_allocated"] is not None:
+                    summary["max_peak_memory_allocated"] = max(summary["max_peak_memory_allocated"] or 0, entry["peak_memory_allocated"])
+
+    def get(self, class_type: Optional[str] = None):
+        with self.lock:
+            out = {}
+            for name, summary in self.classes.items():
+                if class_type is not None and name != class_type:
+                    continue
+                total = summary["count"] + summary["cached"]
+                out[name] = {
+                    **summary,
+                    "mean_wall_time": summary["total_wall_time"] / summary["count"] if summary["count"] > 0 else 0.0,
+                    "cache_hit_rate": summary["cached"] / total if total > 0 else 0.0,
+                }
+            return {"prompts": self.prompts, "classes": out}
+
+    def clear(self):
+        with self.lock:
+            self.classes = {}
+            self.prompts = 0
+
+
+summary = ProfileSummary()
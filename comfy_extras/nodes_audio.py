@@ -153,8 +153,7 @@ class SaveAudio:
                     metadata[x] = json.dumps(extra_pnginfo[x])
 
         for (batch_number, waveform) in enumerate(audio["waveform"].cpu()):
-            filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.flac"
+            file, counter = folder_paths.claim_save_file(full_output_folder, filename, counter, "flac", batch_number)
 
             buff = io.BytesIO()
             torchaudio.save(buff, waveform, audio["sample_rate"], format="FLAC")
@@ -189,8 +188,7 @@ class PreviewAudio(SaveAudio):
 class LoadAudio:
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = folder_paths.filter_files_content_types(os.listdir(input_dir), ["audio", "video"])
+        files = folder_paths.get_input_file_list(["audio", "video"])
         return {"required": {"audio": (sorted(files), {"audio_upload": True})}}
 
     CATEGORY = "audio"
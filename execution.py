@@ -17,8 +17,17 @@ from comfy_execution.graph import get_input_info, ExecutionList, DynamicPrompt,
 from comfy_execution.graph_utils import is_link, GraphBuilder
 from comfy_execution.caching import HierarchicalCache, LRUCache, CacheKeySetInputSignature, CacheKeySetID
 from comfy_execution.validation import validate_node_input
+from comfy_execution import metrics
+from comfy_execution.profiler import PromptProfiler
+import comfy_execution.profiler
 from comfy.cli_args import args
 
+NODE_EXECUTION_SECONDS = metrics.get_or_create(metrics.Histogram, "comfy_node_execution_seconds", "Time spent running a node's function, by node class.", ["class_type"])
+PROMPT_EXECUTION_SECONDS = metrics.get_or_create(metrics.Histogram, "comfy_prompt_execution_seconds", "Time spent executing a prompt, by final status.", ["status"])
+QUEUE_WAIT_SECONDS = metrics.get_or_create(metrics.Histogram, "comfy_queue_wait_seconds", "Time a prompt spent in the queue before it started executing.")
+QUEUE_PENDING = metrics.get_or_create(metrics.Gauge, "comfy_queue_pending", "Number of prompts waiting in the queue.")
+QUEUE_RUNNING = metrics.get_or_create(metrics.Gauge, "comfy_queue_running", "Number of prompts currently executing.")
+
 class ExecutionResult(Enum):
     SUCCESS = 0
     FAILURE = 1
@@ -67,6 +76,8 @@ class CacheSet:
         else:
             self.init_lru_cache(lru_size)
         self.all = [self.outputs, self.ui, self.objects]
+        self.outputs.set_metrics_name("outputs")
+        self.objects.set_metrics_name("objects")
 
     # Useful for those with ample RAM/VRAM -- allows experimenting without
     # blowing away the cache every time
@@ -242,7 +253,7 @@ def format_value(x):
     else:
         return str(x)
 
-def execute(server, dynprompt, caches, current_item, extra_data, executed, prompt_id, execution_list, pending_subgraph_results):
+def execute(server, dynprompt, caches, current_item, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, profiler=None):
     unique_id = current_item
     real_node_id = dynprompt.get_real_node_id(unique_id)
     display_node_id = dynprompt.get_display_node_id(unique_id)
@@ -250,7 +261,11 @@ def execute(server, dynprompt, caches, current_item, extra_data, executed, promp
     inputs = dynprompt.get_node(unique_id)['inputs']
     class_type = dynprompt.get_node(unique_id)['class_type']
     class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
-    if caches.outputs.get(unique_id) is not None:
+    cached = caches.outputs.get(unique_id) is not None
+    caches.outputs.record_lookup(unique_id, cached)
+    if cached:
+        if profiler is not None:
+            profiler.node_cached(unique_id, class_type)
         if server.client_id is not None:
             cached_output = caches.ui.get(unique_id) or {}
             server.send_sync("executed", { "node": unique_id, "display_node": display_node_id, "output": cached_output.get("output",None), "prompt_id": prompt_id }, server.client_id)
@@ -286,6 +301,7 @@ def execute(server, dynprompt, caches, current_item, extra_data, executed, promp
                 server.send_sync("executing", { "node": unique_id, "display_node": display_node_id, "prompt_id": prompt_id }, server.client_id)
 
             obj = caches.objects.get(unique_id)
+            caches.objects.record_lookup(unique_id, obj is not None)
             if obj is None:
                 obj = class_def()
                 caches.objects.set(unique_id, obj)
@@ -321,7 +337,15 @@ def execute(server, dynprompt, caches, current_item, extra_data, executed, promp
                     return block
             def pre_execute_cb(call_index):
                 GraphBuilder.set_default_prefix(unique_id, call_index, 0)
+            if profiler is not None:
+                profile_start = profiler.start_node()
+            execution_start_time = time.perf_counter()
             output_data, output_ui, has_subgraph = get_output_data(obj, input_data_all, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb)
+            NODE_EXECUTION_SECONDS.labels(class_type).observe(time.perf_counter() - execution_start_time)
+            if profiler is not None:
+                node_profile = profiler.end_node(unique_id, class_type, profile_start, output_data)
+                if extra_data.get("profile", False) and server.client_id is not None:
+                    server.send_sync("execution_profile", { "node": unique_id, "display_node": display_node_id, "prompt_id": prompt_id, "profile": dict(node_profile) }, server.client_id)
         if len(output_ui) > 0:
             caches.ui.set(unique_id, {
                 "meta": {
@@ -481,12 +505,19 @@ class PromptExecutor:
                 if self.caches.outputs.get(node_id) is not None:
                     cached_nodes.append(node_id)
 
+            # Model prefetching for the next prompts waits for the loaders of this one
+            prefetcher = getattr(getattr(self.server, "prompt_queue", None), "prefetcher", None)
+            if prefetcher is not None:
+                for node_id in cached_nodes:
+                    prefetcher.node_done(node_id)
+
             comfy.model_management.cleanup_models_gc()
             self.add_message("execution_cached",
                           { "nodes": cached_nodes, "prompt_id": prompt_id},
                           broadcast=False)
             pending_subgraph_results = {}
             executed = set()
+            profiler = PromptProfiler()
             execution_list = ExecutionList(dynamic_prompt, self.caches.outputs)
             current_outputs = self.caches.outputs.all_node_ids()
             for node_id in list(execute_outputs):
@@ -498,7 +529,7 @@ class PromptExecutor:
                     self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
                     break
 
-                result, error, ex = execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results)
+                result, error, ex = execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, profiler=profiler)
                 self.success = result != ExecutionResult.FAILURE
                 if result == ExecutionResult.FAILURE:
                     self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
@@ -507,6 +538,8 @@ class PromptExecutor:
                     execution_list.unstage_node_execution()
                 else: # result == ExecutionResult.SUCCESS:
                     execution_list.complete_node_execution()
+                    if prefetcher is not None:
+                        prefetcher.node_done(node_id)
             else:
                 # Only execute when the while-loop ends without break
                 self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
@@ -522,7 +555,9 @@ class PromptExecutor:
             self.history_result = {
                 "outputs": ui_outputs,
                 "meta": meta_outputs,
+                "profile": profiler.as_dict(),
             }
+            comfy_execution.profiler.summary.add(profiler)
             self.server.last_node_id = None
             if comfy.model_management.DISABLE_SMART_MEMORY:
                 comfy.model_management.unload_all_models()
@@ -875,13 +910,20 @@ class PromptQueue:
         self.currently_running = {}
         self.history = {}
         self.flags = {}
+        self.queued_at = {}
+        self.prefetcher = None
         server.prompt_queue = self
+        QUEUE_PENDING.set_function(lambda: len(self.queue))
+        QUEUE_RUNNING.set_function(lambda: len(self.currently_running))
 
     def put(self, item):
         with self.mutex:
+            self.queued_at[item[1]] = time.perf_counter()
             heapq.heappush(self.queue, item)
             self.server.queue_updated()
             self.not_empty.notify()
+            if self.prefetcher is not None:
+                self.prefetcher.wake()
 
     def get(self, timeout=None):
         with self.not_empty:
@@ -890,10 +932,15 @@ class PromptQueue:
                 if timeout is not None and len(self.queue) == 0:
                     return None
             item = heapq.heappop(self.queue)
+            queued_at = self.queued_at.pop(item[1], None)
+            if queued_at is not None:
+                QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
             i = self.task_counter
             self.currently_running[i] = copy.deepcopy(item)
             self.task_counter += 1
             self.server.queue_updated()
+            if self.prefetcher is not None:
+                self.prefetcher.prompt_started(item[2])
             return (item, i)
 
     class ExecutionStatus(NamedTuple):
@@ -919,6 +966,8 @@ class PromptQueue:
             }
             self.history[prompt[1]].update(history_result)
             self.server.queue_updated()
+            if self.prefetcher is not None:
+                self.prefetcher.prompt_finished()
 
     def get_current_queue(self):
         with self.mutex:
@@ -934,6 +983,7 @@ class PromptQueue:
     def wipe_queue(self):
         with self.mutex:
             self.queue = []
+            self.queued_at = {}
             self.server.queue_updated()
 
     def delete_queue_item(self, function):
@@ -943,6 +993,7 @@ class PromptQueue:
                     if len(self.queue) == 1:
                         self.wipe_queue()
                     else:
+                        self.queued_at.pop(self.queue[x][1], None)
                         self.queue.pop(x)
                         heapq.heapify(self.queue)
                     self.server.queue_updated()
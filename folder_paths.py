@@ -4,8 +4,12 @@ import os
 import time
 import mimetypes
 import logging
+import threading
 from typing import Set, List, Dict, Tuple, Literal
 from collections.abc import Collection
+from concurrent.futures import ThreadPoolExecutor
+
+from app.model_file_index import ModelFileIndex
 
 supported_pt_extensions: set[str] = {'.ckpt', '.pt', '.bin', '.pth', '.safetensors', '.pkl', '.sft'}
 
@@ -46,6 +50,12 @@ user_directory = os.path.join(os.path.dirname(os.path.realpath(__file__)), "user
 
 filename_list_cache: dict[str, tuple[list[str], dict[str, float], float]] = {}
 
+# (folder_name, filename) -> (file list version, folder paths, resolved path or None, time resolved)
+full_path_cache: dict[tuple[str, str], tuple[object, tuple[str, ...], str | None, float]] = {}
+full_path_cache_stats = {"hits": 0, "misses": 0}
+FULL_PATH_CACHE_MAX_ENTRIES = 4096
+FULL_PATH_CACHE_MISS_TTL = 2.0
+
 class CacheHelper:
     """
     Helper class for managing file list cache data.
@@ -76,6 +86,118 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+def parse_save_counter(prefix: str, file: str) -> int | None:
+    """Counter of an output file named {prefix}_{counter}_..., None if the file doesn't belong to prefix."""
+    if len(file) <= len(prefix) or file[len(prefix)] != "_" or os.path.normcase(file[:len(prefix)]) != os.path.normcase(prefix):
+        return None
+    try:
+        return int(file[len(prefix) + 1:].split('_')[0])
+    except ValueError:
+        return 0
+
+# A folder listed this close to its last modification could hide a later write with the same mtime
+SAVE_COUNTER_RACY_WINDOW_NS = 2_000_000_000
+
+class SaveCounterFolder:
+    """Next counters of an output folder, computed from a listing and advanced by the files claim_save_file creates."""
+    def __init__(self, mtime_ns: int, listed_ns: int):
+        self.mtime_ns = mtime_ns
+        self.listed_ns = listed_ns
+        # Listed long enough after the last change that no write can hide behind an unchanged mtime
+        self.trusted = listed_ns - mtime_ns >= SAVE_COUNTER_RACY_WINDOW_NS
+        self.claimed = False
+        # normcased prefix -> next counter
+        self.counters: dict[str, int] = {}
+
+    def usable(self, now_ns: int) -> bool:
+        # Counters advanced by claim_save_file since a racy listing are used until the window has passed, the files
+        # are created exclusively so a file the listing missed is skipped over instead of overwritten
+        return self.trusted or (self.claimed and now_ns - self.listed_ns < SAVE_COUNTER_RACY_WINDOW_NS)
+
+class SaveCounterIndex:
+    """
+    Next output file counter per (folder, filename prefix) so get_save_image_path doesn't list the output folder
+    on every save. Counters stay valid as long as the folder mtime only changes through files created with
+    claim_save_file, anything else written to the folder makes it get listed again.
+
+    Like the input file list, a listing made within SAVE_COUNTER_RACY_WINDOW_NS of the folder mtime isn't trusted
+    since a write in the same mtime tick (filesystems with a coarse resolution) wouldn't change it. Such a folder is
+    listed again on the next call, unless claim_save_file advanced its counters since, then only once the window has
+    passed so a burst of saves lists it about once per window.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # normcased folder -> counters
+        self.folders: dict[str, SaveCounterFolder] = {}
+
+    @staticmethod
+    def _key(folder: str) -> str:
+        return os.path.normcase(os.path.abspath(folder))
+
+    def get_next_counter(self, full_output_folder: str, filename: str) -> int:
+        key = self._key(full_output_folder)
+        prefix = os.path.normcase(filename)
+        try:
+            mtime_ns = os.stat(full_output_folder).st_mtime_ns
+        except FileNotFoundError:
+            os.makedirs(full_output_folder, exist_ok=True)
+            mtime_ns = os.stat(full_output_folder).st_mtime_ns
+
+        listed_ns = time.time_ns()
+        with self.lock:
+            entry = self.folders.get(key, None)
+            if entry is not None and entry.mtime_ns == mtime_ns and prefix in entry.counters and entry.usable(listed_ns):
+                return entry.counters[prefix]
+
+        counters = [parse_save_counter(filename, x) for x in os.listdir(full_output_folder)]
+        counter = max((x for x in counters if x is not None), default=0) + 1
+        with self.lock:
+            entry = self.folders.get(key, None)
+            if entry is None or entry.mtime_ns != mtime_ns or not entry.usable(listed_ns):
+                entry = SaveCounterFolder(mtime_ns, listed_ns)
+                self.folders[key] = entry
+            entry.counters[prefix] = counter
+        return counter
+
+    def create_file(self, full_output_folder: str, file: str, filename: str, counter: int):
+        """Creates file exclusively, raising FileExistsError if it exists, and advances the counters it affects."""
+        key = self._key(full_output_folder)
+        mtime_before = os.stat(full_output_folder).st_mtime_ns
+        os.close(os.open(os.path.join(full_output_folder, file), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+        mtime_after = os.stat(full_output_folder).st_mtime_ns
+
+        with self.lock:
+            entry = self.folders.get(key, None)
+            if entry is None or entry.mtime_ns != mtime_before:
+                # Something else changed the folder since it was listed, list it again next time
+                self.folders.pop(key, None)
+                return
+            counters = entry.counters
+            prefix = os.path.normcase(filename)
+            if prefix in counters:
+                counters[prefix] = max(counters[prefix], counter + 1)
+            for prefix in counters:
+                used = parse_save_counter(prefix, os.path.normcase(file))
+                if used is not None:
+                    counters[prefix] = max(counters[prefix], used + 1)
+            # The folder only changed through this file
+            entry.mtime_ns = mtime_after
+            entry.claimed = True
+
+save_counter_index = SaveCounterIndex()
+
+SCAN_WORKERS = 8
+_root_scan_executor: ThreadPoolExecutor | None = None
+_subtree_scan_executor: ThreadPoolExecutor | None = None
+_scan_executor_lock = threading.Lock()
+
+# Set by enable_model_file_index, when active file lists and lookups are served from the watched index
+model_file_index: ModelFileIndex | None = None
+
+def enable_model_file_index(mode: str = "auto", poll_interval: float = 5.0) -> None:
+    global model_file_index
+    model_file_index = ModelFileIndex(mode, poll_interval)
+
 extension_mimetypes_cache = {
     "webp" : "image",
 }
@@ -156,6 +278,60 @@ def filter_files_content_types(files: List[str], content_types: Literal["image",
             result.append(file)
     return result
 
+class InputFileList:
+    """Listing of the input directory, the content type filtered lists are computed once per listing."""
+    def __init__(self, directory: str, version: object, listed_ns: int, files: list[str]):
+        self.directory = directory
+        self.version = version
+        self.listed_ns = listed_ns
+        self.files = files
+        self.filtered: dict[tuple[str, ...], list[str]] = {}
+
+    def get(self, content_types: Collection[str] | None) -> list[str]:
+        if content_types is None:
+            return self.files
+        key = tuple(sorted(content_types))
+        out = self.filtered.get(key, None)
+        if out is None:
+            out = filter_files_content_types(self.files, content_types)
+            self.filtered[key] = out
+        return out
+
+input_file_list_cache: InputFileList | None = None
+# A directory modified this close to when it was listed could hide a later change with the same mtime
+INPUT_LIST_RACY_WINDOW_NS = 2_000_000_000
+
+def get_input_file_list(content_types: Collection[str] | None = None) -> list[str]:
+    """
+    Sorted names of the files in the input directory (not recursive), optionally filtered by content type
+    ("image", "video", "audio"). The listing is cached and validated with the mtime of the directory, or through
+    the model file index when --watch-model-folders is active.
+    """
+    global input_file_list_cache
+    input_dir = get_input_directory()
+    index = None
+    if model_file_index is not None:
+        index = model_file_index.get_index(input_dir)
+        version = index.version
+    else:
+        try:
+            version = os.stat(input_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+
+    cached = input_file_list_cache
+    if cached is None or cached.directory != input_dir or cached.version != version or \
+            (index is None and cached.listed_ns - version < INPUT_LIST_RACY_WINDOW_NS):
+        listed_ns = time.time_ns()
+        if index is not None:
+            files = index.files_in("")
+        else:
+            with os.scandir(input_dir) as it:
+                files = [x.name for x in it if x.is_file()]
+        cached = InputFileList(input_dir, version, listed_ns, sorted(files))
+        input_file_list_cache = cached
+    return list(cached.get(content_types))
+
 # determine base_dir rely on annotation if name is 'filename.ext [annotation]' format
 # otherwise use default_path as base_dir
 def annotated_filepath(name: str) -> tuple[str, str | None]:
@@ -211,7 +387,63 @@ def get_folder_paths(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
     return folder_names_and_paths[folder_name][0][:]
 
-def recursive_search(directory: str, excluded_dir_names: list[str] | None=None) -> tuple[list[str], dict[str, float]]:
+def get_scan_executors() -> tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+    """
+    Thread pools used to scan model folders, one for the folder roots and one for the subdirectories of a root.
+    Root scans wait on subdirectory scans so they can't share a pool without risking a deadlock.
+    """
+    global _root_scan_executor, _subtree_scan_executor
+    with _scan_executor_lock:
+        if _root_scan_executor is None:
+            _root_scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="folder_paths_root_scan")
+            _subtree_scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="folder_paths_subtree_scan")
+    return _root_scan_executor, _subtree_scan_executor
+
+def _scan_directory(directory: str, relative_dir: str, excluded_dir_names: Collection[str], result: list[str], dirs: dict[str, float]) -> list[str]:
+    """Lists one directory into result and dirs and returns its subdirectories, relative to directory."""
+    path = os.path.join(directory, relative_dir) if relative_dir else directory
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        logging.debug(f"Unable to list {path}. Skipping this path.")
+        return []
+
+    subdirs = []
+    for entry in entries:
+        relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            result.append(relative_path)
+            continue
+        if entry.name in excluded_dir_names:
+            continue
+        try:
+            dirs[entry.path] = os.path.getmtime(entry.path)
+        except FileNotFoundError:
+            logging.warning(f"Warning: Unable to access {entry.path}. Skipping this path.")
+            continue
+        subdirs.append(relative_path)
+    return subdirs
+
+def _walk(directory: str, relative_dir: str, excluded_dir_names: Collection[str]) -> tuple[list[str], dict[str, float]]:
+    result = []
+    dirs = {}
+    pending = [relative_dir]
+    while pending:
+        subdirs = _scan_directory(directory, pending.pop(), excluded_dir_names, result, dirs)
+        pending.extend(reversed(subdirs))
+    return result, dirs
+
+def recursive_search(directory: str, excluded_dir_names: list[str] | None=None, executor: ThreadPoolExecutor | None=None) -> tuple[list[str], dict[str, float]]:
+    """
+    Returns the paths of all files below directory relative to it and the mtimes of every directory, following
+    symlinks. With an executor the subdirectories of directory are walked concurrently, the results are merged
+    in the same order as a sequential walk would produce.
+    """
     if not os.path.isdir(directory):
         return [], {}
 
@@ -228,28 +460,18 @@ def recursive_search(directory: str, excluded_dir_names: list[str] | None=None)
         logging.warning(f"Warning: Unable to access {directory}. Skipping this path.")
 
     logging.debug("recursive file list on directory {}".format(directory))
-    dirpath: str
-    subdirs: list[str]
-    filenames: list[str]
-
-    for dirpath, subdirs, filenames in os.walk(directory, followlinks=True, topdown=True):
-        subdirs[:] = [d for d in subdirs if d not in excluded_dir_names]
-        for file_name in filenames:
-            try:
-                relative_path = os.path.relpath(os.path.join(dirpath, file_name), directory)
-                result.append(relative_path)
-            except:
-                logging.warning(f"Warning: Unable to access {file_name}. Skipping this file.")
-                continue
+    start = time.perf_counter()
 
-        for d in subdirs:
-            path: str = os.path.join(dirpath, d)
-            try:
-                dirs[path] = os.path.getmtime(path)
-            except FileNotFoundError:
-                logging.warning(f"Warning: Unable to access {path}. Skipping this path.")
-                continue
-    logging.debug("found {} files".format(len(result)))
+    subdirs = _scan_directory(directory, "", excluded_dir_names, result, dirs)
+    if executor is None or len(subdirs) < 2:
+        walks = [_walk(directory, x, excluded_dir_names) for x in subdirs]
+    else:
+        walks = list(executor.map(lambda x: _walk(directory, x, excluded_dir_names), subdirs))
+    for files, subdir_mtimes in walks:
+        result.extend(files)
+        dirs.update(subdir_mtimes)
+
+    logging.debug("found {} files in {} in {:.3f}s".format(len(result), directory, time.perf_counter() - start))
     return result, dirs
 
 def filter_files_extensions(files: Collection[str], extensions: Collection[str]) -> list[str]:
@@ -257,14 +479,23 @@ def filter_files_extensions(files: Collection[str], extensions: Collection[str])
 
 
 
-def get_full_path(folder_name: str, filename: str) -> str | None:
-    global folder_names_and_paths
+def get_filename_list_version(folder_name: str) -> object | None:
+    """Value that changes whenever the cached file list of the folder is rebuilt, None if it isn't cached."""
     folder_name = map_legacy(folder_name)
-    if folder_name not in folder_names_and_paths:
+    if model_file_index is not None:
+        return model_file_index.get_version(folder_names_and_paths[folder_name][0])
+    out = filename_list_cache.get(folder_name, None)
+    if out is None:
         return None
-    folders = folder_names_and_paths[folder_name]
-    filename = os.path.relpath(os.path.join("/", filename), "/")
-    for x in folders[0]:
+    return out[2]
+
+def resolve_full_path(folders: list[str], filename: str) -> str | None:
+    if model_file_index is not None:
+        full_path = model_file_index.get_full_path(folders, filename)
+        if full_path is not None:
+            return full_path
+        # Not indexed, could be a path only matching on a case insensitive filesystem
+    for x in folders:
         full_path = os.path.join(x, filename)
         if os.path.isfile(full_path):
             return full_path
@@ -273,6 +504,36 @@ def get_full_path(folder_name: str, filename: str) -> str | None:
 
     return None
 
+def get_full_path(folder_name: str, filename: str) -> str | None:
+    global folder_names_and_paths
+    folder_name = map_legacy(folder_name)
+    if folder_name not in folder_names_and_paths:
+        return None
+    folders = folder_names_and_paths[folder_name]
+    filename = os.path.relpath(os.path.join("/", filename), "/")
+
+    # Results are reused until the file list of the folder is rebuilt or its paths change. Misses also expire
+    # after a short time so a file that was just downloaded is found even if nothing listed the folder since, and
+    # hits are checked with a stat so a model that was moved or deleted is resolved again.
+    key = (folder_name, filename)
+    version = get_filename_list_version(folder_name)
+    paths = tuple(folders[0])
+    if version is not None:
+        cached = full_path_cache.get(key, None)
+        if cached is not None and cached[0] == version and cached[1] == paths:
+            if (cached[2] is not None and os.path.isfile(cached[2])) or \
+                    (cached[2] is None and time.perf_counter() - cached[3] < FULL_PATH_CACHE_MISS_TTL):
+                full_path_cache_stats["hits"] += 1
+                return cached[2]
+
+    full_path_cache_stats["misses"] += 1
+    full_path = resolve_full_path(folders[0], filename)
+    if version is not None:
+        if len(full_path_cache) >= FULL_PATH_CACHE_MAX_ENTRIES:
+            full_path_cache.clear()
+        full_path_cache[key] = (version, paths, full_path, time.perf_counter())
+    return full_path
+
 
 def get_full_path_or_raise(folder_name: str, filename: str) -> str:
     full_path = get_full_path(folder_name, filename)
@@ -287,8 +548,17 @@ def get_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float], f
     output_list = set()
     folders = folder_names_and_paths[folder_name]
     output_folders = {}
-    for x in folders[0]:
-        files, folders_all = recursive_search(x, excluded_dir_names=[".git"])
+    root_executor, subtree_executor = get_scan_executors()
+
+    def search(x):
+        return recursive_search(x, excluded_dir_names=[".git"], executor=subtree_executor)
+
+    # Roots are scanned concurrently, map keeps their order so merging stays deterministic
+    if len(folders[0]) > 1:
+        results = list(root_executor.map(search, folders[0]))
+    else:
+        results = [search(x) for x in folders[0]]
+    for files, folders_all in results:
         output_list.update(filter_files_extensions(files, folders[1]))
         output_folders = {**output_folders, **folders_all}
 
@@ -322,6 +592,9 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
 
 def get_filename_list(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
+    if model_file_index is not None:
+        folders = folder_names_and_paths[folder_name]
+        return list(model_file_index.get_filename_list(folders[0], folders[1]))
     out = cached_filename_list_(folder_name)
     if out is None:
         out = get_filename_list_(folder_name)
@@ -331,15 +604,6 @@ def get_filename_list(folder_name: str) -> list[str]:
     return list(out[0])
 
 def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
-    def map_filename(filename: str) -> tuple[int, str]:
-        prefix_len = len(os.path.basename(filename_prefix))
-        prefix = filename[:prefix_len + 1]
-        try:
-            digits = int(filename[prefix_len + 1:].split('_')[0])
-        except:
-            digits = 0
-        return digits, prefix
-
     def compute_vars(input: str, image_width: int, image_height: int) -> str:
         input = input.replace("%width%", str(image_width))
         input = input.replace("%height%", str(image_height))
@@ -368,11 +632,20 @@ def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, im
         logging.error(err)
         raise Exception(err)
 
-    try:
-        counter = max(filter(lambda a: os.path.normcase(a[1][:-1]) == os.path.normcase(filename) and a[1][-1] == "_", map(map_filename, os.listdir(full_output_folder))))[0] + 1
-    except ValueError:
-        counter = 1
-    except FileNotFoundError:
-        os.makedirs(full_output_folder, exist_ok=True)
-        counter = 1
+    counter = save_counter_index.get_next_counter(full_output_folder, filename)
     return full_output_folder, filename, counter, subfolder, filename_prefix
+
+def claim_save_file(full_output_folder: str, filename: str, counter: int, extension: str, batch_number: int = 0) -> tuple[str, int]:
+    """
+    Creates the empty output file f"{filename}_{counter:05}_.{extension}" (with %batch_num% replaced) with O_EXCL
+    so concurrent writers never overwrite each other's files, moving on to the next counter while the name is taken.
+    Returns the file name and the counter that was used, the next file should use counter + 1.
+    """
+    name = filename.replace("%batch_num%", str(batch_number))
+    while True:
+        file = f"{name}_{counter:05}_.{extension}"
+        try:
+            save_counter_index.create_file(full_output_folder, file, filename, counter)
+            return file, counter
+        except FileExistsError:
+            counter += 1
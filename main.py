@@ -7,6 +7,9 @@ import folder_paths
 import time
 from comfy.cli_args import args
 from app.logger import setup_logger
+from app import custom_node_cache
+from app import startup_profiler
+from concurrent.futures import ThreadPoolExecutor
 
 if __name__ == "__main__":
     #NOTE: These do not do anything on core ComfyUI which should already have no communication with the internet, they are for custom nodes.
@@ -14,6 +17,9 @@ if __name__ == "__main__":
     os.environ['DO_NOT_TRACK'] = '1'
 
 
+if args.profile_startup is not None:
+    startup_profiler.enable()
+
 setup_logger(log_level=args.verbose)
 
 
@@ -32,10 +38,15 @@ def execute_prestartup_script():
     if args.disable_all_custom_nodes:
         return
 
+    def timed_execute_script(script_path, module_path):
+        time_before = time.perf_counter()
+        success = execute_script(script_path)
+        return (time.perf_counter() - time_before, module_path, success)
+
     node_paths = folder_paths.get_folder_paths("custom_nodes")
+    scripts = []
     for custom_node_path in node_paths:
         possible_modules = os.listdir(custom_node_path)
-        node_prestartup_times = []
 
         for possible_module in possible_modules:
             module_path = os.path.join(custom_node_path, possible_module)
@@ -44,9 +55,18 @@ def execute_prestartup_script():
 
             script_path = os.path.join(module_path, "prestartup_script.py")
             if os.path.exists(script_path):
-                time_before = time.perf_counter()
-                success = execute_script(script_path)
-                node_prestartup_times.append((time.perf_counter() - time_before, module_path, success))
+                scripts.append((script_path, module_path))
+
+    # The scripts of packs that declare it safe run on worker threads while the others run in order on this one
+    node_prestartup_times = []
+    parallel = [x for x in scripts if custom_node_cache.declares_parallel_import(x[1])]
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="prestartup") as executor:
+        futures = [executor.submit(timed_execute_script, *x) for x in parallel]
+        for x in scripts:
+            if x not in parallel:
+                node_prestartup_times.append(timed_execute_script(*x))
+        node_prestartup_times.extend(f.result() for f in futures)
+
     if len(node_prestartup_times) > 0:
         print("\nPrestartup times for custom nodes:")
         for n in sorted(node_prestartup_times):
@@ -57,10 +77,12 @@ def execute_prestartup_script():
             print("{:6.1f} seconds{}:".format(n[0], import_message), n[1])
         print()
 
-execute_prestartup_script()
+with startup_profiler.phase("prestartup"):
+    execute_prestartup_script()
 
 
 # Main code
+startup_profiler.start_phase("imports")
 import asyncio
 import itertools
 import shutil
@@ -92,12 +114,20 @@ if args.windows_standalone_build:
         pass
 
 import comfy.utils
+import comfy.converted_model_cache
+import comfy.model_patcher
+import comfy_execution.prefetch
 
 import execution
 import server
 from server import BinaryEventTypes
 import nodes
 import comfy.model_management
+startup_profiler.end_phase("imports")
+
+def finish_startup_profile():
+    if args.profile_startup is not None:
+        startup_profiler.finish(args.profile_startup or os.path.join(folder_paths.get_user_directory(), "startup_profile.json"), args.profile_startup_flamegraph)
 
 def cuda_malloc_warning():
     device = comfy.model_management.get_torch_device()
@@ -141,6 +171,7 @@ def prompt_worker(q, server):
 
             current_time = time.perf_counter()
             execution_time = current_time - execution_start_time
+            execution.PROMPT_EXECUTION_SECONDS.labels('success' if e.success else 'error').observe(execution_time)
             logging.info("Prompt executed in {:.2f} seconds".format(execution_time))
 
         flags = q.get_flags()
@@ -153,6 +184,8 @@ def prompt_worker(q, server):
 
         if free_memory:
             e.reset()
+            comfy.utils.state_dict_cache.clear()
+            comfy.model_patcher.patched_weight_cache.clear()
             need_gc = True
             last_gc_collect = 0
 
@@ -204,8 +237,11 @@ if __name__ == "__main__":
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    server = server.PromptServer(loop)
+    with startup_profiler.phase("server init"):
+        server = server.PromptServer(loop)
     q = execution.PromptQueue(server)
+    if args.prefetch_models > 0:
+        q.prefetcher = comfy_execution.prefetch.ModelPrefetcher(q, lookahead=args.prefetch_models, max_bytes=int(args.prefetch_models_ram * 1024 * 1024 * 1024))
 
     extra_model_paths_config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "extra_model_paths.yaml")
     if os.path.isfile(extra_model_paths_config_path):
@@ -215,7 +251,16 @@ if __name__ == "__main__":
         for config_path in itertools.chain(*args.extra_model_paths_config):
             utils.extra_config.load_extra_path_config(config_path)
 
-    nodes.init_extra_nodes(init_custom_nodes=not args.disable_all_custom_nodes)
+    if args.watch_model_folders is not None:
+        folder_paths.enable_model_file_index(args.watch_model_folders, args.model_folder_poll_interval)
+
+    comfy.utils.state_dict_cache.max_bytes = int(args.state_dict_cache_size * 1024 * 1024 * 1024)
+    comfy.model_patcher.patched_weight_cache.max_bytes = int(args.patched_weight_cache_size * 1024 * 1024 * 1024)
+    if args.converted_model_cache is not None:
+        comfy.converted_model_cache.enable(args.converted_model_cache or os.path.join(folder_paths.models_dir, "converted_cache"), max_bytes=int(args.converted_model_cache_size * 1024 * 1024 * 1024))
+
+    with startup_profiler.phase("node registration"):
+        nodes.init_extra_nodes(init_custom_nodes=not args.disable_all_custom_nodes)
 
     cuda_malloc_warning()
 
@@ -247,6 +292,7 @@ if __name__ == "__main__":
         folder_paths.set_user_directory(user_dir)
 
     if args.quick_test_for_ci:
+        finish_startup_profile()
         exit(0)
 
     os.makedirs(folder_paths.get_temp_directory(), exist_ok=True)
@@ -261,8 +307,16 @@ if __name__ == "__main__":
             webbrowser.open(f"{scheme}://{address}:{port}")
         call_on_start = startup_server
 
+    if args.profile_startup is not None:
+        def profile_on_start(scheme, address, port, call_on_start=call_on_start):
+            finish_startup_profile()
+            if call_on_start is not None:
+                call_on_start(scheme, address, port)
+        call_on_start = profile_on_start
+
     try:
-        loop.run_until_complete(server.setup())
+        with startup_profiler.phase("server setup"):
+            loop.run_until_complete(server.setup())
         loop.run_until_complete(run(server, address=args.listen, port=args.port, verbose=not args.dont_print_server, call_on_start=call_on_start))
     except KeyboardInterrupt:
         logging.info("\nStopped server")
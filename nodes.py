@@ -33,10 +33,14 @@ import comfy.model_management
 from comfy.cli_args import args
 
 import importlib
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import folder_paths
 import latent_preview
 import node_helpers
+from app import node_manifest
+from app import custom_node_cache
 
 def before_node_execution():
     comfy.model_management.throw_exception_if_processing_interrupted()
@@ -460,7 +464,7 @@ class SaveLatent:
                 for x in extra_pnginfo:
                     metadata[x] = json.dumps(extra_pnginfo[x])
 
-        file = f"{filename}_{counter:05}_.latent"
+        file, counter = folder_paths.claim_save_file(full_output_folder, filename, counter, "latent")
 
         results = list()
         results.append({
@@ -482,8 +486,7 @@ class SaveLatent:
 class LoadLatent:
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f)) and f.endswith(".latent")]
+        files = [f for f in folder_paths.get_input_file_list() if f.endswith(".latent")]
         return {"required": {"latent": [sorted(files), ]}, }
 
     CATEGORY = "_for_testing"
@@ -1543,8 +1546,7 @@ class SaveImage:
                     for x in extra_pnginfo:
                         metadata.add_text(x, json.dumps(extra_pnginfo[x]))
 
-            filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
+            file, counter = folder_paths.claim_save_file(full_output_folder, filename, counter, "png", batch_number)
             img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
             results.append({
                 "filename": file,
@@ -1572,8 +1574,7 @@ class PreviewImage(SaveImage):
 class LoadImage:
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
+        files = folder_paths.get_input_file_list()
         return {"required":
                     {"image": (sorted(files), {"image_upload": True})},
                 }
@@ -1645,8 +1646,7 @@ class LoadImageMask:
     _color_channels = ["alpha", "red", "green", "blue"]
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
+        files = folder_paths.get_input_file_list()
         return {"required":
                     {"image": (sorted(files), {"image_upload": True}),
                      "channel": (s._color_channels, ), }
@@ -1858,7 +1858,7 @@ class ImagePadForOutpaint:
         return (new_image, mask)
 
 
-NODE_CLASS_MAPPINGS = {
+NODE_CLASS_MAPPINGS = node_manifest.NodeClassMappings({
     "KSampler": KSampler,
     "CheckpointLoaderSimple": CheckpointLoaderSimple,
     "CLIPTextEncode": CLIPTextEncode,
@@ -1925,7 +1925,7 @@ NODE_CLASS_MAPPINGS = {
     "ConditioningZeroOut": ConditioningZeroOut,
     "ConditioningSetTimestepRange": ConditioningSetTimestepRange,
     "LoraLoaderModelOnly": LoraLoaderModelOnly,
-}
+})
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     # Sampling
@@ -2018,23 +2018,40 @@ def get_module_name(module_path: str) -> str:
     return base_path
 
 
-def load_custom_node(module_path: str, ignore=set(), module_parent="custom_nodes") -> bool:
-    module_name = os.path.basename(module_path)
+def custom_node_module_name(module_path: str) -> str:
+    """The name a custom node module is registered under in sys.modules and EXTENSION_WEB_DIRS."""
     if os.path.isfile(module_path):
-        sp = os.path.splitext(module_path)
-        module_name = sp[0]
+        return os.path.splitext(module_path)[0]
+    return os.path.basename(module_path)
+
+
+def import_custom_node_module(module_path: str):
+    """Executes the module of a custom node, returns its name, the module and its directory."""
+    module_name = custom_node_module_name(module_path)
+    if os.path.isfile(module_path):
+        module_spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module_dir = os.path.split(module_path)[0]
+    else:
+        module_spec = importlib.util.spec_from_file_location(module_name, os.path.join(module_path, "__init__.py"))
+        module_dir = module_path
+
+    module = importlib.util.module_from_spec(module_spec)
+    sys.modules[module_name] = module
+    module_spec.loader.exec_module(module)
+    return module_name, module, module_dir
+
+
+def load_custom_node(module_path: str, ignore=set(), module_parent="custom_nodes", loaded_nodes: dict | None = None, preloaded: Future | None = None) -> bool:
+    """
+    Imports a custom node module and registers its nodes and web directory. preloaded is the future of an
+    import_custom_node_module call that was already started on another thread.
+    """
     try:
         logging.debug("Trying to load custom node {}".format(module_path))
-        if os.path.isfile(module_path):
-            module_spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module_dir = os.path.split(module_path)[0]
+        if preloaded is not None:
+            module_name, module, module_dir = preloaded.result()
         else:
-            module_spec = importlib.util.spec_from_file_location(module_name, os.path.join(module_path, "__init__.py"))
-            module_dir = module_path
-
-        module = importlib.util.module_from_spec(module_spec)
-        sys.modules[module_name] = module
-        module_spec.loader.exec_module(module)
+            module_name, module, module_dir = import_custom_node_module(module_path)
 
         if hasattr(module, "WEB_DIRECTORY") and getattr(module, "WEB_DIRECTORY") is not None:
             web_dir = os.path.abspath(os.path.join(module_dir, getattr(module, "WEB_DIRECTORY")))
@@ -2048,6 +2065,11 @@ def load_custom_node(module_path: str, ignore=set(), module_parent="custom_nodes
                     node_cls.RELATIVE_PYTHON_MODULE = "{}.{}".format(module_parent, get_module_name(module_path))
             if hasattr(module, "NODE_DISPLAY_NAME_MAPPINGS") and getattr(module, "NODE_DISPLAY_NAME_MAPPINGS") is not None:
                 NODE_DISPLAY_NAME_MAPPINGS.update(module.NODE_DISPLAY_NAME_MAPPINGS)
+            if loaded_nodes is not None:
+                display_names = getattr(module, "NODE_DISPLAY_NAME_MAPPINGS", None) or {}
+                for name, node_cls in module.NODE_CLASS_MAPPINGS.items():
+                    if name not in ignore:
+                        loaded_nodes[name] = {"display_name": display_names.get(name, None), "category": getattr(node_cls, "CATEGORY", None)}
             return True
         else:
             logging.warning(f"Skip {module_path} module for custom nodes due to the lack of NODE_CLASS_MAPPINGS.")
@@ -2067,9 +2089,9 @@ def init_external_custom_nodes():
     Returns:
         None
     """
-    base_node_names = set(NODE_CLASS_MAPPINGS.keys())
+    base_node_names = set(NODE_CLASS_MAPPINGS)
     node_paths = folder_paths.get_folder_paths("custom_nodes")
-    node_import_times = []
+    module_paths = []
     for custom_node_path in node_paths:
         possible_modules = os.listdir(os.path.realpath(custom_node_path))
         if "__pycache__" in possible_modules:
@@ -2079,9 +2101,59 @@ def init_external_custom_nodes():
             module_path = os.path.join(custom_node_path, possible_module)
             if os.path.isfile(module_path) and os.path.splitext(module_path)[1] != ".py": continue
             if module_path.endswith(".disabled"): continue
-            time_before = time.perf_counter()
-            success = load_custom_node(module_path, base_node_names, module_parent="custom_nodes")
-            node_import_times.append((time.perf_counter() - time_before, module_path, success))
+            module_paths.append(module_path)
+
+    # Packs that declare it safe are imported on worker threads while the others are imported in order, their nodes
+    # are still registered in the original order.
+    parallel_import = [x for x in module_paths if custom_node_cache.declares_parallel_import(x)]
+    executor = None
+    if args.custom_node_cache is not None or len(parallel_import) > 0:
+        executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="custom_node_import")
+
+    cache = None
+    fingerprints = {}
+    if args.custom_node_cache is not None:
+        cache = custom_node_cache.CustomNodeCache(get_custom_node_cache_path())
+        fingerprints = dict(zip(module_paths, executor.map(custom_node_cache.pack_fingerprint, module_paths)))
+
+    node_import_times = []
+    skipped = set()
+    for module_path in module_paths:
+        entry = cache.get(module_path, fingerprints[module_path]) if cache is not None else None
+        if entry is not None and not entry["success"]:
+            logging.info("Skipping custom node {} that failed to import on a previous startup and didn't change since.".format(module_path))
+            skipped.add(module_path)
+            node_import_times.append((0.0, module_path, False))
+
+    preload_times = {}
+    def timed_import(module_path):
+        time_before = time.perf_counter()
+        try:
+            return import_custom_node_module(module_path)
+        finally:
+            preload_times[module_path] = time.perf_counter() - time_before
+
+    preloaded = {}
+    for module_path in parallel_import:
+        if module_path not in skipped:
+            preloaded[module_path] = executor.submit(timed_import, module_path)
+
+    for module_path in module_paths:
+        if module_path in skipped:
+            continue
+        time_before = time.perf_counter()
+        success = load_custom_node(module_path, base_node_names, module_parent="custom_nodes", preloaded=preloaded.get(module_path, None))
+        import_time = preload_times[module_path] if module_path in preloaded else time.perf_counter() - time_before
+        node_import_times.append((import_time, module_path, success))
+        if cache is not None:
+            cache.record(module_path, fingerprints[module_path], success, import_time)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+    if cache is not None:
+        cache.save()
+        if len(skipped) > 0:
+            logging.info("Skipped {} custom nodes, they are retried when they or the python environment change, after {} hours, or when {} is deleted.".format(len(skipped), custom_node_cache.FAILURE_RETRY_SECONDS // 3600, cache.path))
 
     if len(node_import_times) > 0:
         logging.info("\nImport times for custom nodes:")
@@ -2093,6 +2165,13 @@ def init_external_custom_nodes():
             logging.info("{:6.1f} seconds{}: {}".format(n[0], import_message, n[1]))
         logging.info("")
 
+def get_custom_node_cache_path():
+    if args.custom_node_cache:
+        return args.custom_node_cache
+    # The user directory from the command line is only set up after the nodes are loaded
+    user_directory = os.path.abspath(args.user_directory) if args.user_directory else folder_paths.get_user_directory()
+    return os.path.join(user_directory, "custom_node_cache.json")
+
 def init_builtin_extra_nodes():
     """
     Initializes the built-in extra nodes in ComfyUI.
@@ -2153,11 +2232,36 @@ def init_builtin_extra_nodes():
         "nodes_hooks.py",
     ]
 
+    manifest = None
+    if args.lazy_extra_nodes is not None:
+        manifest = node_manifest.NodeManifest(args.lazy_extra_nodes or os.path.join(extras_dir, "node_manifest.json"))
+
     import_failed = []
     for node_file in extras_files:
-        if not load_custom_node(os.path.join(extras_dir, node_file), module_parent="comfy_extras"):
+        module_path = os.path.join(extras_dir, node_file)
+        if manifest is None:
+            if not load_custom_node(module_path, module_parent="comfy_extras"):
+                import_failed.append(node_file)
+            continue
+
+        manifest_nodes = manifest.get(module_path)
+        if manifest_nodes is not None:
+            NODE_CLASS_MAPPINGS.add_lazy(manifest_nodes.keys(), module_path, functools.partial(load_custom_node, module_path, module_parent="comfy_extras"))
+            NODE_DISPLAY_NAME_MAPPINGS.update({k: v["display_name"] for k, v in manifest_nodes.items() if v.get("display_name", None) is not None})
+            continue
+
+        loaded_nodes = {}
+        if load_custom_node(module_path, module_parent="comfy_extras", loaded_nodes=loaded_nodes):
+            manifest.update(module_path, loaded_nodes)
+        else:
             import_failed.append(node_file)
 
+    if manifest is not None:
+        manifest.save()
+        lazy_modules = NODE_CLASS_MAPPINGS.lazy_modules()
+        if len(lazy_modules) > 0:
+            logging.info("Deferred the import of {} comfy_extras node modules until their nodes are used.".format(len(lazy_modules)))
+
     return import_failed
 
 
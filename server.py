@@ -1,6 +1,7 @@
 import os
 import sys
 import asyncio
+import threading
 import traceback
 
 import nodes
@@ -25,12 +26,39 @@ import logging
 import mimetypes
 from comfy.cli_args import args
 import comfy.utils
+import comfy.sd
 import comfy.model_management
+import comfy.model_patcher
 import node_helpers
 from app.frontend_management import FrontendManager
 from app.user_manager import UserManager
+from app import output_archive
+from app import static_files
 from typing import Optional
 from api_server.routes.internal.internal_routes import InternalRoutes
+from app import json_util
+from app import startup_profiler
+from comfy_execution import metrics
+import comfy_execution.profiler
+
+WEBSOCKET_CLIENTS = metrics.get_or_create(metrics.Gauge, "comfy_websocket_clients", "Number of connected websocket clients.")
+DEVICE_MEMORY_TOTAL = metrics.get_or_create(metrics.Gauge, "comfy_device_memory_total_bytes", "Total memory of the device.", ["device"])
+DEVICE_MEMORY_FREE = metrics.get_or_create(metrics.Gauge, "comfy_device_memory_free_bytes", "Free memory of the device, including memory reserved but unused by torch.", ["device"])
+DEVICE_MEMORY_USED = metrics.get_or_create(metrics.Gauge, "comfy_device_memory_used_bytes", "Used memory of the device.", ["device"])
+MODEL_LOADS = metrics.get_or_create(metrics.Counter, "comfy_model_loads_total", "Number of model loads to the compute device.")
+MODEL_LOADED_BYTES = metrics.get_or_create(metrics.Counter, "comfy_model_loaded_bytes_total", "Bytes of model weights moved to the compute device.")
+MODEL_UNLOADS = metrics.get_or_create(metrics.Counter, "comfy_model_unloads_total", "Number of full model unloads from the compute device.")
+MODEL_LOAD_SECONDS = metrics.get_or_create(metrics.Counter, "comfy_model_load_seconds_total", "Time spent in load_models_gpu.")
+MODEL_UNLOADED_BYTES = metrics.get_or_create(metrics.Counter, "comfy_model_unloaded_bytes_total", "Bytes of model weights moved off the compute device, including partial unloads.")
+MODELS_LOADED = metrics.get_or_create(metrics.Gauge, "comfy_models_loaded", "Number of models currently tracked as loaded.")
+FULL_PATH_CACHE_LOOKUPS = metrics.get_or_create(metrics.Counter, "comfy_full_path_cache_lookups_total", "Model path lookups through folder_paths.get_full_path by cache result.", ["result"])
+STATE_DICT_CACHE_LOOKUPS = metrics.get_or_create(metrics.Counter, "comfy_state_dict_cache_lookups_total", "Model file loads through comfy.utils.load_torch_file by state dict cache result.", ["result"])
+STATE_DICT_CACHE_EVICTIONS = metrics.get_or_create(metrics.Counter, "comfy_state_dict_cache_evictions_total", "State dicts evicted from the state dict cache.")
+STATE_DICT_CACHE_BYTES = metrics.get_or_create(metrics.Gauge, "comfy_state_dict_cache_bytes", "Size of the model files held by the state dict cache.")
+PATCHED_WEIGHT_CACHE_LOOKUPS = metrics.get_or_create(metrics.Counter, "comfy_patched_weight_cache_lookups_total", "Patched weight calculations by patched weight cache result.", ["result"])
+PATCHED_WEIGHT_CACHE_BYTES = metrics.get_or_create(metrics.Gauge, "comfy_patched_weight_cache_bytes", "Size of the weights held by the patched weight cache.")
+MODEL_PREFETCH_FILES = metrics.get_or_create(metrics.Counter, "comfy_model_prefetch_files_total", "Model files of queued prompts read ahead into the page cache.")
+MODEL_PREFETCH_BYTES = metrics.get_or_create(metrics.Counter, "comfy_model_prefetch_bytes_total", "Bytes of model files of queued prompts read ahead into the page cache.")
 
 class BinaryEventTypes:
     PREVIEW_IMAGE = 1
@@ -168,11 +196,12 @@ class PromptServer():
         max_upload_size = round(args.max_upload_size * 1024 * 1024)
         self.app = web.Application(client_max_size=max_upload_size, middlewares=middlewares)
         self.sockets = dict()
-        self.web_root = (
-            FrontendManager.init_frontend(args.front_end_version)
-            if args.front_end_root is None
-            else args.front_end_root
-        )
+        with startup_profiler.phase("frontend init"):
+            self.web_root = (
+                FrontendManager.init_frontend(args.front_end_version)
+                if args.front_end_root is None
+                else args.front_end_root
+            )
         logging.info(f"[Prompt Server] web root: {self.web_root}")
         routes = web.RouteTableDef()
         self.routes = routes
@@ -180,6 +209,7 @@ class PromptServer():
         self.client_id = None
 
         self.on_prompt_handlers = []
+        self.setup_metrics()
 
         @routes.get('/ws')
         async def websocket_handler(request):
@@ -219,13 +249,13 @@ class PromptServer():
         @routes.get("/embeddings")
         def get_embeddings(self):
             embeddings = folder_paths.get_filename_list("embeddings")
-            return web.json_response(list(map(lambda a: os.path.splitext(a)[0], embeddings)))
+            return json_util.json_response(list(map(lambda a: os.path.splitext(a)[0], embeddings)))
         
         @routes.get("/models")
         def list_model_types(request):
             model_types = list(folder_paths.folder_names_and_paths.keys())
 
-            return web.json_response(model_types)
+            return json_util.json_response(model_types)
 
         @routes.get("/models/{folder}")
         async def get_models(request):
@@ -233,7 +263,7 @@ class PromptServer():
             if not folder in folder_paths.folder_names_and_paths:
                 return web.Response(status=404)
             files = folder_paths.get_filename_list(folder)
-            return web.json_response(files)
+            return json_util.json_response(files)
 
         @routes.get("/extensions")
         async def get_extensions(request):
@@ -247,7 +277,7 @@ class PromptServer():
                 extensions.extend(list(map(lambda f: "/extensions/" + urllib.parse.quote(
                     name) + "/" + os.path.relpath(f, dir).replace("\\", "/"), files)))
 
-            return web.json_response(extensions)
+            return json_util.json_response(extensions)
 
         def get_dir_by_type(dir_type):
             if dir_type is None:
@@ -321,7 +351,7 @@ class PromptServer():
                         with open(filepath, "wb") as f:
                             f.write(image.file.read())
 
-                return web.json_response({"name" : filename, "subfolder": subfolder, "type": image_upload_type})
+                return json_util.json_response({"name" : filename, "subfolder": subfolder, "type": image_upload_type})
             else:
                 return web.Response(status=400)
 
@@ -483,7 +513,31 @@ class PromptServer():
             dt = json.loads(out)
             if not "__metadata__" in dt:
                 return web.Response(status=404)
-            return web.json_response(dt["__metadata__"])
+            return json_util.json_response(dt["__metadata__"])
+
+        @routes.get("/detect_model/{folder_name}")
+        async def detect_model(request):
+            folder_name = request.match_info.get("folder_name", None)
+            if folder_name is None:
+                return web.Response(status=404)
+            if not "filename" in request.rel_url.query:
+                return web.Response(status=404)
+
+            filename = request.rel_url.query["filename"]
+            if not (filename.endswith(".safetensors") or filename.endswith(".sft")):
+                return web.Response(status=404)
+
+            safetensors_path = folder_paths.get_full_path(folder_name, filename)
+            if safetensors_path is None:
+                return web.Response(status=404)
+            try:
+                out = await asyncio.get_running_loop().run_in_executor(None, comfy.sd.detect_model_from_header, safetensors_path)
+            except Exception as e:
+                logging.warning(f"Error detecting model type of {safetensors_path}: {e}")
+                return web.Response(status=400)
+            if out is None:
+                return web.Response(status=404)
+            return json_util.json_response(out)
 
         @routes.get("/system_stats")
         async def system_stats(request):
@@ -518,11 +572,27 @@ class PromptServer():
                     }
                 ]
             }
-            return web.json_response(system_stats)
+            return json_util.json_response(system_stats)
+
+        @routes.get("/metrics")
+        async def get_metrics(request):
+            return web.Response(body=metrics.generate_latest().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+        @routes.get("/profile")
+        async def get_profile(request):
+            class_type = request.rel_url.query.get("class_type", None)
+            return json_util.json_response(comfy_execution.profiler.summary.get(class_type))
+
+        @routes.post("/profile")
+        async def post_profile(request):
+            json_data = await request.json()
+            if json_data.get("clear", False):
+                comfy_execution.profiler.summary.clear()
+            return web.Response(status=200)
 
         @routes.get("/prompt")
         async def get_prompt(request):
-            return web.json_response(self.get_queue_info())
+            return json_util.json_response(self.get_queue_info())
 
         def node_info(node_class):
             obj_class = nodes.NODE_CLASS_MAPPINGS[node_class]
@@ -564,7 +634,7 @@ class PromptServer():
                     except Exception as e:
                         logging.error(f"[ERROR] An error occurred while retrieving information for the '{x}' node.")
                         logging.error(traceback.format_exc())
-                return web.json_response(out)
+                return json_util.json_response(out)
 
         @routes.get("/object_info/{node_class}")
         async def get_object_info_node(request):
@@ -572,19 +642,37 @@ class PromptServer():
             out = {}
             if (node_class is not None) and (node_class in nodes.NODE_CLASS_MAPPINGS):
                 out[node_class] = node_info(node_class)
-            return web.json_response(out)
+            return json_util.json_response(out)
 
         @routes.get("/history")
         async def get_history(request):
             max_items = request.rel_url.query.get("max_items", None)
             if max_items is not None:
                 max_items = int(max_items)
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items))
+            return json_util.json_response(self.prompt_queue.get_history(max_items=max_items))
 
         @routes.get("/history/{prompt_id}")
         async def get_history(request):
             prompt_id = request.match_info.get("prompt_id", None)
-            return web.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+            return json_util.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+
+        @routes.get(r"/outputs/{prompt_id}.{archive_format:zip|tar}")
+        async def get_outputs_archive(request):
+            prompt_id = request.match_info.get("prompt_id", None)
+            archive_format = request.match_info.get("archive_format", "zip")
+            history = self.prompt_queue.get_history(prompt_id=prompt_id)
+            if prompt_id not in history:
+                return web.Response(status=404)
+
+            files = output_archive.get_output_files(history[prompt_id])
+            if len(files) == 0:
+                return web.Response(status=404)
+
+            compress = request.rel_url.query.get("compress", "false") in ("true", "1")
+            filename = f"{prompt_id}.{archive_format}"
+            if archive_format == "tar" and compress:
+                filename += ".gz"
+            return await output_archive.stream_archive(request, files, archive_format, compress, filename)
 
         @routes.get("/queue")
         async def get_queue(request):
@@ -592,7 +680,7 @@ class PromptServer():
             current_queue = self.prompt_queue.get_current_queue()
             queue_info['queue_running'] = current_queue[0]
             queue_info['queue_pending'] = current_queue[1]
-            return web.json_response(queue_info)
+            return json_util.json_response(queue_info)
 
         @routes.post("/prompt")
         async def post_prompt(request):
@@ -626,12 +714,12 @@ class PromptServer():
                     outputs_to_execute = valid[2]
                     self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute))
                     response = {"prompt_id": prompt_id, "number": number, "node_errors": valid[3]}
-                    return web.json_response(response)
+                    return json_util.json_response(response)
                 else:
                     logging.warning("invalid prompt: {}".format(valid[1]))
-                    return web.json_response({"error": valid[1], "node_errors": valid[3]}, status=400)
+                    return json_util.json_response({"error": valid[1], "node_errors": valid[3]}, status=400)
             else:
-                return web.json_response({"error": "no prompt", "node_errors": []}, status=400)
+                return json_util.json_response({"error": "no prompt", "node_errors": []}, status=400)
 
         @routes.post("/queue")
         async def post_queue(request):
@@ -676,6 +764,52 @@ class PromptServer():
 
             return web.Response(status=200)
 
+    def setup_metrics(self):
+        WEBSOCKET_CLIENTS.set_function(lambda: len(self.sockets))
+
+        stats = comfy.model_management.model_load_stats
+        MODEL_LOADS.set_function(lambda: stats["loads"])
+        MODEL_LOADED_BYTES.set_function(lambda: stats["loaded_bytes"])
+        MODEL_LOAD_SECONDS.set_function(lambda: stats["load_seconds"])
+        MODEL_UNLOADS.set_function(lambda: stats["unloads"])
+        MODEL_UNLOADED_BYTES.set_function(lambda: stats["unloaded_bytes"])
+        MODELS_LOADED.set_function(lambda: len(comfy.model_management.current_loaded_models))
+
+        FULL_PATH_CACHE_LOOKUPS.labels("hit").set_function(lambda: folder_paths.full_path_cache_stats["hits"])
+        FULL_PATH_CACHE_LOOKUPS.labels("miss").set_function(lambda: folder_paths.full_path_cache_stats["misses"])
+
+        state_dict_cache = comfy.utils.state_dict_cache
+        STATE_DICT_CACHE_LOOKUPS.labels("hit").set_function(lambda: state_dict_cache.stats["hits"])
+        STATE_DICT_CACHE_LOOKUPS.labels("miss").set_function(lambda: state_dict_cache.stats["misses"])
+        STATE_DICT_CACHE_EVICTIONS.set_function(lambda: state_dict_cache.stats["evictions"])
+        STATE_DICT_CACHE_BYTES.set_function(lambda: state_dict_cache.size)
+
+        patched_weight_cache = comfy.model_patcher.patched_weight_cache
+        PATCHED_WEIGHT_CACHE_LOOKUPS.labels("hit").set_function(lambda: patched_weight_cache.stats["hits"])
+        PATCHED_WEIGHT_CACHE_LOOKUPS.labels("miss").set_function(lambda: patched_weight_cache.stats["misses"])
+        PATCHED_WEIGHT_CACHE_BYTES.set_function(lambda: patched_weight_cache.size)
+
+        def prefetch_stat(name):
+            prefetcher = getattr(getattr(self, "prompt_queue", None), "prefetcher", None)
+            return prefetcher.stats[name] if prefetcher is not None else 0
+        MODEL_PREFETCH_FILES.set_function(lambda: prefetch_stat("files"))
+        MODEL_PREFETCH_BYTES.set_function(lambda: prefetch_stat("bytes"))
+
+        devices = [comfy.model_management.torch.device("cpu")]
+        torch_device = comfy.model_management.get_torch_device()
+        if torch_device not in devices:
+            devices.append(torch_device)
+
+        for device in devices:
+            def total(device=device):
+                return comfy.model_management.get_total_memory(device)
+            def free(device=device):
+                return comfy.model_management.get_free_memory(device)
+            label = str(device)
+            DEVICE_MEMORY_TOTAL.labels(label).set_function(total)
+            DEVICE_MEMORY_FREE.labels(label).set_function(free)
+            DEVICE_MEMORY_USED.labels(label).set_function(lambda total=total, free=free: total() - free())
+
     async def setup(self):
         timeout = aiohttp.ClientTimeout(total=None) # no timeout
         self.client_session = aiohttp.ClientSession(timeout=timeout)
@@ -699,13 +833,11 @@ class PromptServer():
         self.app.add_routes(self.routes)
 
         for name, dir in nodes.EXTENSION_WEB_DIRS.items():
-            self.app.add_routes([
-                web.static('/extensions/' + urllib.parse.quote(name), dir),
-            ])
+            static_files.StaticFiles(dir).add_routes(self.app.router, '/extensions/' + urllib.parse.quote(name))
 
-        self.app.add_routes([
-            web.static('/', self.web_root),
-        ])
+        frontend_files = static_files.StaticFiles(self.web_root, hashed_assets=True)
+        frontend_files.add_routes(self.app.router, '/')
+        threading.Thread(target=frontend_files.precompress, daemon=True, name="precompress-frontend").start()
 
     def get_queue_info(self):
         prompt_info = {}
@@ -766,14 +898,15 @@ class PromptServer():
             await send_socket_catch_exception(self.sockets[sid].send_bytes, message)
 
     async def send_json(self, event, data, sid=None):
-        message = {"type": event, "data": data}
+        # Encode once, not once per connected socket
+        message = json_util.dumps_str({"type": event, "data": data})
 
         if sid is None:
             sockets = list(self.sockets.values())
             for ws in sockets:
-                await send_socket_catch_exception(ws.send_json, message)
+                await send_socket_catch_exception(ws.send_str, message)
         elif sid in self.sockets:
-            await send_socket_catch_exception(self.sockets[sid].send_json, message)
+            await send_socket_catch_exception(self.sockets[sid].send_str, message)
 
     def send_sync(self, event, data, sid=None):
         self.loop.call_soon_threadsafe(
@@ -0,0 +1,81 @@
+import os
+import time
+
+from app import custom_node_cache
+
+
+def make_pack(root, name, pyproject=None):
+    pack = root / name
+    pack.mkdir()
+    (pack / "__init__.py").write_text("NODE_CLASS_MAPPINGS = {}\n")
+    if pyproject is not None:
+        (pack / "pyproject.toml").write_text(pyproject)
+    return pack
+
+
+def touch(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+
+def test_pack_fingerprint_follows_python_files(tmp_path):
+    pack = make_pack(tmp_path, "pack")
+    (pack / "web").mkdir()
+    (pack / "web" / "ext.js").write_text("")
+    fingerprint = custom_node_cache.pack_fingerprint(str(pack))
+
+    touch(pack / "web" / "ext.js")
+    assert custom_node_cache.pack_fingerprint(str(pack)) == fingerprint
+
+    (pack / "nodes.py").write_text("")
+    changed = custom_node_cache.pack_fingerprint(str(pack))
+    assert changed != fingerprint
+    touch(pack / "nodes.py")
+    assert custom_node_cache.pack_fingerprint(str(pack)) != changed
+
+
+def test_cache_round_trip(tmp_path):
+    pack = make_pack(tmp_path, "pack")
+    path = str(tmp_path / "cache" / "custom_node_cache.json")
+    fingerprint = custom_node_cache.pack_fingerprint(str(pack))
+
+    cache = custom_node_cache.CustomNodeCache(path)
+    assert cache.get(str(pack), fingerprint) is None
+    cache.record(str(pack), fingerprint, False, 1.5)
+    cache.save()
+
+    entry = custom_node_cache.CustomNodeCache(path).get(str(pack), fingerprint)
+    assert entry["success"] is False and entry["import_time"] == 1.5
+    assert custom_node_cache.CustomNodeCache(path).get(str(pack), "other") is None
+
+
+def test_failures_are_retried_after_a_while(tmp_path, monkeypatch):
+    path = str(tmp_path / "custom_node_cache.json")
+    cache = custom_node_cache.CustomNodeCache(path)
+    cache.record("failed", "fp", False, 0.1)
+    cache.record("loaded", "fp", True, 0.1)
+    cache.save()
+
+    now = time.time() + custom_node_cache.FAILURE_RETRY_SECONDS + 60
+    monkeypatch.setattr(custom_node_cache.time, "time", lambda: now)
+    cache = custom_node_cache.CustomNodeCache(path)
+    assert cache.get("failed", "fp") is None
+    assert cache.get("loaded", "fp")["success"] is True
+
+
+def test_cache_is_dropped_when_the_environment_changes(tmp_path, monkeypatch):
+    pack = make_pack(tmp_path, "pack")
+    path = str(tmp_path / "custom_node_cache.json")
+    cache = custom_node_cache.CustomNodeCache(path)
+    cache.record(str(pack), "fp", True, 0.1)
+    cache.save()
+
+    monkeypatch.setattr(custom_node_cache, "environment_fingerprint", lambda: "new packages installed")
+    assert custom_node_cache.CustomNodeCache(path).get(str(pack), "fp") is None
+
+
+def test_declares_parallel_import(tmp_path):
+    assert custom_node_cache.declares_parallel_import(str(make_pack(tmp_path, "a", "[tool.comfy]\nparallel-import = true\n"))) == (custom_node_cache.tomllib is not None)
+    assert not custom_node_cache.declares_parallel_import(str(make_pack(tmp_path, "b", "[tool.comfy]\nPublisherId = \"x\"\n")))
+    assert not custom_node_cache.declares_parallel_import(str(make_pack(tmp_path, "c")))
+    assert not custom_node_cache.declares_parallel_import(str(make_pack(tmp_path, "d", "not [toml")))
@@ -0,0 +1,50 @@
+import json
+import pytest
+
+from app import json_util
+
+
+@pytest.fixture(params=["orjson", "json"])
+def serializer(request):
+    if request.param == "orjson":
+        if json_util.orjson is None:
+            pytest.skip("orjson is not installed")
+        json_util.set_serializer(json_util._orjson_dumps)
+    else:
+        json_util.set_serializer(json_util._stdlib_dumps)
+    yield request.param
+    json_util.set_serializer(None)
+
+
+def test_dumps_roundtrip(serializer):
+    data = {"a": [1, 2.5, None, True], "b": {"c": "ü"}, "d": (1, 2)}
+    assert json.loads(json_util.dumps(data)) == {"a": [1, 2.5, None, True], "b": {"c": "ü"}, "d": [1, 2]}
+    assert json_util.get_serializer_name() == serializer
+
+
+def test_dumps_non_str_keys(serializer):
+    assert json.loads(json_util.dumps({1: "a"})) == {"1": "a"}
+
+
+def test_dumps_big_int_falls_back(serializer):
+    assert json.loads(json_util.dumps({"seed": 2**70})) == {"seed": 2**70}
+
+
+def test_dumps_str():
+    assert isinstance(json_util.dumps_str({"a": 1}), str)
+
+
+def test_json_response():
+    resp = json_util.json_response({"a": 1}, status=400)
+    assert resp.status == 400
+    assert resp.content_type == "application/json"
+    assert json.loads(resp.body) == {"a": 1}
+
+
+def test_custom_serializer():
+    json_util.set_serializer(lambda obj: b'"custom"')
+    try:
+        assert json_util.dumps({"a": 1}) == b'"custom"'
+    finally:
+        json_util.set_serializer(None)
+
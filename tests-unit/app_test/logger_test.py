@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+import app.logger
+from app.logger import LogBuffer, LogInterceptor
+
+
+def test_log_buffer_wraps():
+    buffer = LogBuffer(3)
+    for i in range(5):
+        buffer.append(float(i), str(i))
+    assert len(buffer) == 3
+    assert [m for _, m in buffer] == ["2", "3", "4"]
+    assert buffer.last() == [4.0, "4"]
+
+
+def test_log_buffer_empty():
+    buffer = LogBuffer(3)
+    assert buffer.last() is None
+    assert buffer.snapshot() == []
+
+
+@pytest.fixture
+def interceptor(monkeypatch):
+    monkeypatch.setattr(app.logger, "logs", LogBuffer(10))
+    stream = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    yield LogInterceptor(stream)
+    stream.detach()
+
+
+def test_interceptor_overwrites_progress_lines(interceptor):
+    interceptor.write("start\n")
+    interceptor.write("\r 10%")
+    interceptor.write("\r 50%")
+    interceptor.write("\r100%")
+    interceptor.write("\n")
+    interceptor.write("\rnew line")
+    logs = app.logger.get_logs()
+    assert [x["m"] for x in logs] == ["start\n", "\r100%", "\n", "\rnew line"]
+    assert all(isinstance(x["t"], str) for x in logs)
+
+
+def test_interceptor_flush_callbacks(interceptor):
+    received_a = []
+    received_b = []
+    interceptor.on_flush(received_a.append)
+    interceptor.on_flush(received_b.append)
+    interceptor.write("hello\n")
+    interceptor.flush()
+    interceptor.flush()
+    assert [[x["m"] for x in batch] for batch in received_a] == [["hello\n"]]
+    assert received_a == received_b
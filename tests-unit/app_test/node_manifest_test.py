@@ -0,0 +1,112 @@
+import os
+
+from app import node_manifest
+
+
+class NodeA:
+    pass
+
+
+class NodeB:
+    pass
+
+
+def test_lazy_nodes_are_loaded_on_first_lookup():
+    mappings = node_manifest.NodeClassMappings({"Core": NodeA})
+    loads = []
+
+    def load():
+        loads.append(True)
+        mappings["LazyA"] = NodeA
+        mappings["LazyB"] = NodeB
+        return True
+
+    mappings.add_lazy(["LazyA", "LazyB", "Removed"], "nodes_x.py", load)
+    assert "LazyA" in mappings and len(mappings) == 4
+    assert mappings.lazy_modules() == {"nodes_x.py"}
+    assert len(loads) == 0
+
+    assert mappings["LazyB"] is NodeB
+    assert mappings["LazyA"] is NodeA
+    assert len(loads) == 1
+    # the module didn't register it anymore
+    assert "Removed" not in mappings
+    assert mappings.get("Removed", None) is None
+    assert mappings.lazy_modules() == set()
+
+
+def test_failed_lazy_import_removes_the_nodes():
+    mappings = node_manifest.NodeClassMappings()
+
+    def load():
+        raise ImportError("missing dependency")
+
+    mappings.add_lazy(["LazyA"], "nodes_x.py", load)
+    assert mappings.get("LazyA") is None
+    assert "LazyA" not in mappings
+
+
+def test_items_and_values_resolve_lazy_nodes():
+    mappings = node_manifest.NodeClassMappings({"Core": NodeA})
+
+    def load():
+        mappings["LazyB"] = NodeB
+        return True
+
+    mappings.add_lazy(["LazyB"], "nodes_x.py", load)
+    assert dict(mappings.items()) == {"Core": NodeA, "LazyB": NodeB}
+    assert list(mappings.values()) == [NodeA, NodeB]
+    assert mappings.pop("LazyB") is NodeB
+    assert "LazyB" not in mappings and len(mappings) == 1
+
+
+def test_copies_never_see_placeholders():
+    def make():
+        mappings = node_manifest.NodeClassMappings({"Core": NodeA})
+
+        def load():
+            mappings["LazyB"] = NodeB
+            return True
+
+        mappings.add_lazy(["LazyB", "Removed"], "nodes_x.py", load)
+        return mappings
+
+    expected = {"Core": NodeA, "LazyB": NodeB}
+    assert dict(make().items()) == expected
+    assert make().copy() == expected
+
+    mappings = make()
+    # iterating doesn't import the module
+    assert list(mappings) == ["Core", "LazyB", "Removed"] and len(mappings) == 3
+    assert mappings.lazy_modules() == {"nodes_x.py"}
+    assert dict(mappings) == expected
+    assert list(mappings) == ["Core", "LazyB"]
+    assert {**make(), "Other": NodeA} == {**expected, "Other": NodeA}
+    out = {}
+    out.update(make())
+    assert out == expected
+
+
+def test_manifest_round_trip_and_invalidation(tmp_path):
+    module_path = tmp_path / "nodes_x.py"
+    module_path.write_text("NODE_CLASS_MAPPINGS = {}\n")
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = node_manifest.NodeManifest(manifest_path)
+    assert manifest.get(str(module_path)) is None
+    nodes = {"LazyA": {"display_name": "Lazy A", "category": "test"}}
+    manifest.update(str(module_path), nodes)
+    manifest.save()
+
+    assert node_manifest.NodeManifest(manifest_path).get(str(module_path)) == nodes
+
+    module_path.write_text("NODE_CLASS_MAPPINGS = {'changed': None}\n")
+    st = os.stat(module_path)
+    os.utime(module_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert node_manifest.NodeManifest(manifest_path).get(str(module_path)) is None
+
+
+def test_unreadable_manifest_is_ignored(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text("{not json")
+    assert node_manifest.NodeManifest(str(manifest_path)).modules == {}
@@ -0,0 +1,85 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from aiohttp import web
+
+import folder_paths
+from app import output_archive
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    original = folder_paths.get_output_directory()
+    folder_paths.set_output_directory(str(tmp_path))
+    os.makedirs(tmp_path / "sub")
+    (tmp_path / "sub" / "a.png").write_bytes(b"a" * 1024)
+    (tmp_path / "b.png").write_bytes(b"b")
+    yield tmp_path
+    folder_paths.set_output_directory(original)
+
+
+@pytest.fixture
+def history_entry():
+    return {
+        "outputs": {
+            "9": {
+                "images": [
+                    {"filename": "a.png", "subfolder": "sub", "type": "output"},
+                    {"filename": "b.png", "subfolder": "", "type": "output"},
+                    {"filename": "b.png", "subfolder": "", "type": "output"},
+                    {"filename": "missing.png", "subfolder": "", "type": "output"},
+                    {"filename": "x.png", "subfolder": "../..", "type": "output"},
+                    {"filename": "y.png", "subfolder": "", "type": "invalid"},
+                ],
+                "text": ["not a file"],
+            }
+        }
+    }
+
+
+def test_get_output_files(output_dir, history_entry):
+    files = output_archive.get_output_files(history_entry)
+    assert files == [
+        (os.path.join(str(output_dir), "sub", "a.png"), "sub/a.png"),
+        (os.path.join(str(output_dir), "b.png"), "b.png"),
+    ]
+
+
+@pytest.fixture
+def app(output_dir, history_entry):
+    async def handler(request):
+        files = output_archive.get_output_files(history_entry)
+        archive_format = request.match_info["archive_format"]
+        compress = "compress" in request.rel_url.query
+        return await output_archive.stream_archive(request, files, archive_format, compress, "out." + archive_format)
+
+    app = web.Application()
+    app.router.add_get("/outputs/{prompt_id}.{archive_format:zip|tar}", handler)
+    return app
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compress", [False, True])
+async def test_stream_zip(aiohttp_client, app, compress):
+    client = await aiohttp_client(app)
+    resp = await client.get("/outputs/p.zip" + ("?compress" if compress else ""))
+    assert resp.status == 200
+    assert resp.headers["Transfer-Encoding"] == "chunked"
+    with zipfile.ZipFile(io.BytesIO(await resp.read())) as zf:
+        assert zf.namelist() == ["sub/a.png", "b.png"]
+        assert zf.read("sub/a.png") == b"a" * 1024
+        expected = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        assert all(info.compress_type == expected for info in zf.infolist())
+
+
+@pytest.mark.asyncio
+async def test_stream_tar(aiohttp_client, app):
+    client = await aiohttp_client(app)
+    resp = await client.get("/outputs/p.tar")
+    assert resp.status == 200
+    with tarfile.open(fileobj=io.BytesIO(await resp.read())) as tf:
+        assert tf.getnames() == ["sub/a.png", "b.png"]
+        assert tf.extractfile("b.png").read() == b"b"
@@ -0,0 +1,63 @@
+import importlib
+import json
+import sys
+
+import pytest
+
+from app import startup_profiler
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(startup_profiler, "profiler", None)
+    startup_profiler.enable()
+    yield startup_profiler.profiler
+    startup_profiler.profiler.uninstall()
+
+
+@pytest.fixture
+def package(tmp_path, monkeypatch):
+    pkg = tmp_path / "startup_profiler_pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("import time\ntime.sleep(0.01)\nfrom . import child\n")
+    (pkg / "child.py").write_text("import time\ntime.sleep(0.05)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "startup_profiler_pkg"
+    for name in ("startup_profiler_pkg", "startup_profiler_pkg.child"):
+        sys.modules.pop(name, None)
+
+
+def test_imports_are_timed_per_phase(profiler, package, tmp_path):
+    with startup_profiler.phase("imports"):
+        importlib.import_module(package)
+        # already imported, not recorded again
+        importlib.import_module(package)
+    startup_profiler.finish(str(tmp_path / "report.json"), str(tmp_path / "report.folded"))
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert report["finished"]
+    assert [x["name"] for x in report["phases"]] == ["imports"]
+    imports = {x["module"]: x for x in report["imports"]}
+    assert set(imports) == {package, package + ".child"}
+    parent, child = imports[package], imports[package + ".child"]
+    assert child["parent"] == package and child["phase"] == "imports"
+    assert child["self"] >= 0.05
+    assert parent["inclusive"] >= parent["self"] + child["inclusive"] * 0.99
+    assert parent["self"] < child["self"]
+
+    folded = (tmp_path / "report.folded").read_text().splitlines()
+    assert any(line.startswith("imports;{};{}.child ".format(package, package)) for line in folded)
+
+
+def test_finish_stops_recording(profiler, package, tmp_path):
+    startup_profiler.finish(str(tmp_path / "report.json"))
+    importlib.import_module(package)
+    assert profiler.report()["import_count"] == 0
+
+
+def test_phases_are_noops_when_disabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(startup_profiler, "profiler", None)
+    with startup_profiler.phase("imports"):
+        pass
+    startup_profiler.finish(str(tmp_path / "report.json"))
+    assert not (tmp_path / "report.json").exists()
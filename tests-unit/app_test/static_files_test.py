@@ -0,0 +1,95 @@
+import gzip
+import os
+
+import pytest
+from aiohttp import web
+
+from app import static_files
+from app.static_files import StaticFiles, CompressedCache, parse_accept_encoding
+
+JS = b"console.log('hello world');\n" * 200
+
+
+@pytest.fixture
+def web_root(tmp_path):
+    os.makedirs(tmp_path / "assets")
+    (tmp_path / "assets" / "index-BppSBmxJ.js").write_bytes(JS)
+    (tmp_path / "main.js").write_bytes(JS)
+    (tmp_path / "small.css").write_bytes(b"body {}")
+    (tmp_path / "image.png").write_bytes(b"\x89PNG" * 1000)
+    return tmp_path
+
+
+@pytest.fixture
+def app(web_root, monkeypatch):
+    monkeypatch.setattr(static_files, "brotli", None)
+    app = web.Application()
+    StaticFiles(str(web_root), hashed_assets=True, cache=CompressedCache()).add_routes(app.router, "/")
+    return app
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, deflate, br;q=0") == {"gzip", "deflate"}
+    assert parse_accept_encoding("") == set()
+    assert {"gzip", "br"} <= parse_accept_encoding("*")
+
+
+@pytest.mark.asyncio
+async def test_gzip_negotiation(aiohttp_client, app):
+    client = await aiohttp_client(app)
+    resp = await client.get("/main.js", headers={"Accept-Encoding": "gzip"}, auto_decompress=False)
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(await resp.read()) == JS
+    assert "immutable" not in resp.headers.get("Cache-Control", "")
+
+    resp = await client.get("/main.js", headers={"Accept-Encoding": "identity"}, auto_decompress=False)
+    assert "Content-Encoding" not in resp.headers
+    assert await resp.read() == JS
+
+
+@pytest.mark.asyncio
+async def test_etag_and_immutable_assets(aiohttp_client, app):
+    client = await aiohttp_client(app)
+    resp = await client.get("/assets/index-BppSBmxJ.js", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Cache-Control"] == static_files.IMMUTABLE_CACHE_CONTROL
+    etag = resp.headers["ETag"]
+
+    resp = await client.get("/assets/index-BppSBmxJ.js", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert resp.status == 304
+
+
+@pytest.mark.asyncio
+async def test_precompressed_sibling(aiohttp_client, app, web_root):
+    (web_root / "main.js.gz").write_bytes(gzip.compress(b"from disk"))
+    client = await aiohttp_client(app)
+    resp = await client.get("/main.js", headers={"Accept-Encoding": "gzip"})
+    assert await resp.read() == b"from disk"
+
+
+@pytest.mark.asyncio
+async def test_uncompressed_files(aiohttp_client, app):
+    client = await aiohttp_client(app)
+    for path in ["/small.css", "/image.png"]:
+        resp = await client.get(path, headers={"Accept-Encoding": "gzip"}, auto_decompress=False)
+        assert resp.status == 200
+        assert "Content-Encoding" not in resp.headers
+        assert "ETag" in resp.headers
+
+    assert (await client.get("/missing.js")).status == 404
+    assert (await client.get("/assets")).status == 403
+
+
+def test_cache_invalidation_and_budget(web_root):
+    cache = CompressedCache(max_bytes=100)
+    path = str(web_root / "main.js")
+    st = os.stat(path)
+    assert cache.put(path, "gzip", st, b"x" * 60)
+    assert cache.get(path, "gzip", st) == b"x" * 60
+    assert cache.put(path + "2", "gzip", st, b"y" * 60)
+    assert cache.get(path, "gzip", st) is None  # evicted
+    assert not cache.put(path, "gzip", st, b"z" * 200)
+
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    assert cache.get(path + "2", "gzip", os.stat(path)) is None
@@ -0,0 +1,72 @@
+import os
+
+import safetensors.torch
+import torch
+
+import comfy.converted_model_cache
+import comfy.utils
+
+
+DTYPES = {"weight_dtype": torch.float32, "unet_dtype": torch.float16, "manual_cast_dtype": None}
+
+
+def write_source(tmp_path, name="model.safetensors"):
+    path = str(tmp_path / name)
+    safetensors.torch.save_file({"a.weight": torch.randn(4, 4), "ids": torch.arange(4)}, path)
+    return path
+
+
+def test_key_depends_on_source_and_options(tmp_path):
+    cache = comfy.converted_model_cache.ConvertedModelCache(str(tmp_path / "cache"))
+    path = write_source(tmp_path)
+    key = cache.key(path, {})
+    assert key == cache.key(path, {})
+    assert key != cache.key(path, {"dtype": torch.float8_e4m3fn})
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert key != cache.key(path, {})
+    assert cache.key(str(tmp_path / "missing.safetensors"), {}) is None
+
+
+def test_put_casts_to_target_dtypes(tmp_path):
+    cache = comfy.converted_model_cache.ConvertedModelCache(str(tmp_path / "cache"))
+    path = write_source(tmp_path)
+    key = cache.key(path, {})
+    assert cache.get(key) is None
+
+    source = comfy.utils.load_torch_file(path)
+    assert cache.put(key, source, {"a.weight": torch.float16, "ids": torch.float16}, DTYPES)
+    sd, dtypes = cache.get(key)
+    assert isinstance(sd, comfy.utils.SafetensorsStateDict)
+    assert sd["a.weight"].dtype == torch.float16
+    assert torch.equal(sd["a.weight"], source["a.weight"].half())
+    assert sd["ids"].dtype == torch.int64
+    assert cache.stats == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+    assert os.listdir(cache.directory) == ["{}.safetensors".format(key)]
+
+    # The dtypes the model was loaded with are kept to check them against the ones of the next load
+    assert dtypes == {"weight_dtype": "torch.float32", "unet_dtype": "torch.float16", "manual_cast_dtype": "None"}
+    assert [comfy.converted_model_cache.dtype_from_name(dtypes[k]) for k in comfy.converted_model_cache.DTYPE_KEYS] == [torch.float32, torch.float16, None]
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = comfy.converted_model_cache.ConvertedModelCache(str(tmp_path / "cache"))
+    keys = ["a", "b", "c"]
+    source = {"a.weight": torch.randn(64, 64)}
+    assert cache.put(keys[0], source, {}, DTYPES)
+    cache.max_bytes = os.path.getsize(cache.cache_path(keys[0])) * 2 + 100
+    assert cache.put(keys[1], source, {}, DTYPES)
+
+    # Using the oldest file makes the other one the least recently used
+    for i, key in enumerate(keys[:2]):
+        os.utime(cache.cache_path(key), ns=(0, i * 1000000000))
+    assert cache.get(keys[0]) is not None
+    assert cache.put(keys[2], source, {}, DTYPES)
+    assert sorted(os.listdir(cache.directory)) == sorted("{}.safetensors".format(k) for k in (keys[0], keys[2]))
+    assert cache.stats["evictions"] == 1
+
+    # The file just stored is kept even when it doesn't fit on its own
+    cache.max_bytes = 1
+    assert cache.put(keys[1], source, {}, DTYPES)
+    assert os.listdir(cache.directory) == ["{}.safetensors".format(keys[1])]
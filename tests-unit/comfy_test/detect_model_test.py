@@ -0,0 +1,62 @@
+import safetensors.torch
+import torch
+
+from comfy.cli_args import args
+args.cpu = True  # comfy.model_management picks the torch device on import
+
+import comfy.sd
+import comfy.utils
+
+
+def flux_state_dict(prefix):
+    sd = {
+        "img_in.weight": torch.zeros(8, 64, dtype=torch.bfloat16),
+        "guidance_in.in_layer.weight": torch.zeros(2, 2, dtype=torch.bfloat16),
+        "single_blocks.0.linear1.weight": torch.zeros(2, 2, dtype=torch.bfloat16),
+        "single_blocks.1.linear1.weight": torch.zeros(2, 2, dtype=torch.bfloat16),
+        "scale_fp32": torch.zeros(1),
+    }
+    for i in range(3):
+        sd["double_blocks.{}.img_attn.norm.key_norm.scale".format(i)] = torch.zeros(2, dtype=torch.bfloat16)
+    return {prefix + k: v for k, v in sd.items()}
+
+
+def test_safetensors_header_state_dict(tmp_path):
+    path = str(tmp_path / "model.safetensors")
+    safetensors.torch.save_file({"a": torch.zeros(2, 3, dtype=torch.float16), "b": torch.zeros(4, dtype=torch.int64)}, path, metadata={"x": "y"})
+    sd = comfy.utils.safetensors_header_state_dict(path)
+    assert sorted(sd.keys()) == ["a", "b"]
+    assert sd["a"].shape == (2, 3) and sd["a"].dtype == torch.float16 and sd["a"].is_meta
+    assert sd["b"].dtype == torch.int64
+
+
+def test_detect_checkpoint_from_header(tmp_path):
+    path = str(tmp_path / "flux.safetensors")
+    safetensors.torch.save_file(flux_state_dict("model.diffusion_model."), path)
+    out = comfy.sd.detect_model_from_header(path)
+    assert out["model"] == "Flux"
+    assert out["diffusion_model_prefix"] == "model.diffusion_model."
+    assert out["unet_config"]["depth"] == 3
+    assert out["unet_config"]["depth_single_blocks"] == 2
+    assert out["unet_config"]["guidance_embed"] is True
+    assert out["weight_dtype"] == "bfloat16"
+    assert out["model_type"] == "EPS"
+    assert out["text_encoder"] is None
+
+
+def test_detect_diffusion_model_without_prefix(tmp_path):
+    path = str(tmp_path / "flux_unet.safetensors")
+    safetensors.torch.save_file(flux_state_dict(""), path)
+    out = comfy.sd.detect_model_from_header(path)
+    assert out["model"] == "Flux"
+    assert out["diffusion_model_prefix"] == ""
+
+
+def test_detect_text_encoder_from_header(tmp_path):
+    path = str(tmp_path / "clip_l.safetensors")
+    safetensors.torch.save_file({"text_model.encoder.layers.0.mlp.fc1.weight": torch.zeros(4, 2, dtype=torch.float16)}, path)
+    out = comfy.sd.detect_model_from_header(path)
+    assert out["model"] is None
+    assert out["text_encoder"] == "CLIP_L"
+    assert out["weight_dtype"] == "float16"
+    assert out["parameters"] == 8
@@ -3,6 +3,7 @@
 import pytest
 import os
 import tempfile
+import time
 from unittest.mock import patch
 
 import folder_paths
@@ -63,4 +64,152 @@ def test_get_save_image_path(temp_dir):
         assert filename == "test"
         assert counter == 1
         assert subfolder == ""
-        assert filename_prefix == "test"
\ No newline at end of file
+        assert filename_prefix == "test"
+
+
+def test_get_full_path_cache(temp_dir):
+    os.makedirs(os.path.join(temp_dir, "sub"))
+    model = os.path.join(temp_dir, "sub", "model.safetensors")
+    open(model, "w").close()
+    with patch.dict(folder_paths.folder_names_and_paths, {"cache_test": ([temp_dir], {".safetensors"})}):
+        folder_paths.filename_list_cache.pop("cache_test", None)
+        # Nothing is cached until the file list of the folder has been built
+        assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") == model
+        assert folder_paths.get_filename_list("cache_test") == [os.path.join("sub", "model.safetensors")]
+
+        stats = folder_paths.full_path_cache_stats
+        hits = stats["hits"]
+        assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") == model
+        assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") == model
+        assert folder_paths.get_full_path("cache_test", "missing.safetensors") is None
+        assert folder_paths.get_full_path("cache_test", "missing.safetensors") is None
+        assert stats["hits"] == hits + 2
+
+        # Deleted files aren't returned even before the file list is rebuilt
+        moved = os.path.join(temp_dir, "model.safetensors")
+        os.replace(model, moved)
+        assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") is None
+        os.replace(moved, model)
+        with patch("folder_paths.FULL_PATH_CACHE_MISS_TTL", 0.0):
+            assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") == model
+
+        # Rebuilding the file list invalidates cached results
+        os.remove(model)
+        assert folder_paths.get_filename_list("cache_test") == []
+        assert folder_paths.get_full_path("cache_test", "sub/model.safetensors") is None
+
+        # Misses expire even when the file list wasn't rebuilt
+        open(os.path.join(temp_dir, "missing.safetensors"), "w").close()
+        with patch("folder_paths.FULL_PATH_CACHE_MISS_TTL", 0.0):
+            assert folder_paths.get_full_path("cache_test", "missing.safetensors") == os.path.join(temp_dir, "missing.safetensors")
+        folder_paths.filename_list_cache.pop("cache_test", None)
+
+def test_recursive_search_parallel(temp_dir):
+    for sub in ["a", "b", os.path.join("b", "c"), ".git"]:
+        os.makedirs(os.path.join(temp_dir, sub))
+    for name in ["root.txt", os.path.join("a", "1.txt"), os.path.join("b", "2.txt"), os.path.join("b", "c", "3.txt"), os.path.join(".git", "x.txt")]:
+        open(os.path.join(temp_dir, name), "w").close()
+
+    _, executor = folder_paths.get_scan_executors()
+    serial = folder_paths.recursive_search(temp_dir, excluded_dir_names=[".git"])
+    parallel = folder_paths.recursive_search(temp_dir, excluded_dir_names=[".git"], executor=executor)
+    assert parallel == serial
+    assert set(serial[0]) == {"root.txt", os.path.join("a", "1.txt"), os.path.join("b", "2.txt"), os.path.join("b", "c", "3.txt")}
+    assert set(serial[1]) == {temp_dir, os.path.join(temp_dir, "a"), os.path.join(temp_dir, "b"), os.path.join(temp_dir, "b", "c")}
+
+def test_get_filename_list_multiple_roots(temp_dir):
+    roots = [os.path.join(temp_dir, x) for x in ["r1", "r2", "missing"]]
+    os.makedirs(roots[0])
+    os.makedirs(roots[1])
+    open(os.path.join(roots[0], "a.safetensors"), "w").close()
+    open(os.path.join(roots[1], "a.safetensors"), "w").close()
+    open(os.path.join(roots[1], "b.safetensors"), "w").close()
+    with patch.dict(folder_paths.folder_names_and_paths, {"multi_root_test": (roots, {".safetensors"})}):
+        files, dirs, _ = folder_paths.get_filename_list_("multi_root_test")
+        assert files == ["a.safetensors", "b.safetensors"]
+        assert list(dirs.keys()) == roots[:2]
+
+def patch_folder_mtime(folder, mtime_ns):
+    """Makes os.stat report mtime_ns for folder, as a filesystem with a coarse mtime resolution would."""
+    real_stat = os.stat
+    def stat(path, *args, **kwargs):
+        st = real_stat(path, *args, **kwargs)
+        if os.path.abspath(path) != os.path.abspath(folder):
+            return st
+        return os.stat_result(st[:8] + (mtime_ns // 1_000_000_000,) + st[9:10], {"st_mtime_ns": mtime_ns})
+    return patch("os.stat", side_effect=stat)
+
+def test_save_counter_index(temp_dir):
+    for name in ["img_00001_.png", "img_00007_.png", "img_bad_.png", "other_00020_.png"]:
+        open(os.path.join(temp_dir, name), "w").close()
+
+    # Listed long enough after the last change for the listing to be trusted
+    with patch_folder_mtime(temp_dir, time.time_ns() - 2 * folder_paths.SAVE_COUNTER_RACY_WINDOW_NS):
+        full_output_folder, filename, counter, _, _ = folder_paths.get_save_image_path("img", temp_dir)
+        assert counter == 8
+        file, counter = folder_paths.claim_save_file(full_output_folder, filename, counter, "png")
+        assert (file, counter) == ("img_00008_.png", 8)
+        assert os.path.exists(os.path.join(temp_dir, file))
+
+        # Claimed files update the counters without listing the folder again
+        with patch("os.listdir", side_effect=AssertionError("folder listed")):
+            assert folder_paths.get_save_image_path("img", temp_dir)[2] == 9
+
+def test_save_counter_index_unchanged_mtime(temp_dir):
+    # Files written in the same mtime tick as the listing don't change the folder mtime
+    now = time.time_ns()
+    with patch_folder_mtime(temp_dir, now), patch("time.time_ns", return_value=now) as time_ns:
+        # A racy listing is listed again, get_save_image_path callers that don't claim their files would overwrite it
+        assert folder_paths.get_save_image_path("img", temp_dir)[2] == 1
+        open(os.path.join(temp_dir, "img_00001_.png"), "w").close()
+        assert folder_paths.get_save_image_path("img", temp_dir)[2] == 2
+
+        # Counters advanced by claims are used during the window, a file they miss is skipped over
+        file, counter = folder_paths.claim_save_file(temp_dir, "img", 2, "png")
+        open(os.path.join(temp_dir, "img_00003_.png"), "w").close()
+        assert folder_paths.get_save_image_path("img", temp_dir)[2] == 3
+        assert folder_paths.claim_save_file(temp_dir, "img", 3, "png") == ("img_00004_.png", 4)
+
+        # and the folder is listed again once it has passed
+        open(os.path.join(temp_dir, "img_00007_.png"), "w").close()
+        time_ns.return_value = now + folder_paths.SAVE_COUNTER_RACY_WINDOW_NS
+        assert folder_paths.get_save_image_path("img", temp_dir)[2] == 8
+
+def test_save_counter_index_lists_a_burst_of_saves_once(temp_dir):
+    # Saves less than the racy window apart, the folder was always modified just before
+    with patch("os.listdir", side_effect=os.listdir) as listdir:
+        for i in range(5):
+            full_output_folder, filename, counter, _, _ = folder_paths.get_save_image_path("img", temp_dir)
+            file, counter = folder_paths.claim_save_file(full_output_folder, filename, counter, "png")
+            assert file == f"img_{i + 1:05}_.png"
+    assert listdir.call_count == 1
+
+def test_claim_save_file_skips_existing(temp_dir):
+    open(os.path.join(temp_dir, "img_1_00003_.png"), "w").close()
+    file, counter = folder_paths.claim_save_file(temp_dir, "img_%batch_num%", 3, "png", batch_number=1)
+    assert (file, counter) == ("img_1_00004_.png", 4)
+
+def test_get_input_file_list(temp_dir):
+    os.makedirs(os.path.join(temp_dir, "subdir.png"))
+    for name in ["b.png", "a.wav", "c.latent"]:
+        open(os.path.join(temp_dir, name), "w").close()
+
+    # Last modified long enough ago for the listing to be trusted, creating a file then always changes the mtime
+    modified_ns = time.time_ns() - 5 * folder_paths.INPUT_LIST_RACY_WINDOW_NS
+    os.utime(temp_dir, ns=(modified_ns, modified_ns))
+
+    original = folder_paths.get_input_directory()
+    folder_paths.set_input_directory(temp_dir)
+    try:
+        assert folder_paths.get_input_file_list() == ["a.wav", "b.png", "c.latent"]
+        assert folder_paths.get_input_file_list(["image"]) == ["b.png"]
+        assert folder_paths.get_input_file_list(["audio", "video"]) == ["a.wav"]
+
+        # Served from the cache while the directory is unchanged
+        with patch("os.scandir", side_effect=AssertionError("directory listed")):
+            assert folder_paths.get_input_file_list(["image"]) == ["b.png"]
+
+        open(os.path.join(temp_dir, "d.png"), "w").close()
+        assert folder_paths.get_input_file_list(["image"]) == ["b.png", "d.png"]
+    finally:
+        folder_paths.set_input_directory(original)
@@ -0,0 +1,100 @@
+import pytest
+import safetensors.torch
+import torch
+
+import comfy.utils
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    sd = {
+        "model.diffusion_model.a.weight": torch.randn(4, 4),
+        "model.diffusion_model.a.bias": torch.randn(4),
+        "first_stage_model.b.weight": torch.randn(2, 2, dtype=torch.float16),
+    }
+    path = str(tmp_path / "model.safetensors")
+    safetensors.torch.save_file(sd, path, metadata={"format": "pt"})
+    return path, sd
+
+
+def test_lazy_load_matches_load_file(checkpoint):
+    path, expected = checkpoint
+    sd = comfy.utils.load_torch_file(path, lazy=True)
+    assert isinstance(sd, comfy.utils.SafetensorsStateDict)
+    assert sorted(sd.keys()) == sorted(expected.keys())
+    assert len(sd) == 3
+    for k, v in expected.items():
+        assert torch.equal(sd[k], v)
+        assert sd[k].dtype == v.dtype
+    assert sd.metadata() == {"format": "pt"}
+
+
+def test_lazy_load_only_reads_accessed_keys(checkpoint):
+    path, _ = checkpoint
+    sd = comfy.utils.load_torch_file(path, lazy=True)
+    assert "first_stage_model.b.weight" in sd
+    sd["model.diffusion_model.a.weight"]
+    loaded = [k for k, v in sd.entries.items() if isinstance(v, torch.Tensor)]
+    assert loaded == ["model.diffusion_model.a.weight"]
+
+
+def test_lazy_state_dict_helpers(checkpoint):
+    path, expected = checkpoint
+    sd = comfy.utils.load_torch_file(path, lazy=True)
+    vae_sd = comfy.utils.state_dict_prefix_replace(sd, {"first_stage_model.": ""}, filter_keys=True)
+    assert list(vae_sd.keys()) == ["b.weight"]
+    assert "first_stage_model.b.weight" not in sd
+
+    comfy.utils.state_dict_prefix_replace(sd, {"model.diffusion_model.": ""})
+    assert sorted(sd.keys()) == ["a.bias", "a.weight"]
+
+    module = torch.nn.Linear(4, 4, dtype=torch.float16)
+    m, u = module.load_state_dict({"weight": sd.pop("a.weight"), "bias": sd.pop("a.bias")})
+    assert module.weight.dtype == torch.float16
+    assert torch.equal(module.weight, expected["model.diffusion_model.a.weight"].half())
+    assert len(sd) == 0
+
+
+@pytest.fixture
+def state_dict_cache():
+    cache = comfy.utils.state_dict_cache
+    cache.max_bytes = 1024 * 1024
+    cache.clear()
+    yield cache
+    cache.max_bytes = 0
+    cache.clear()
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_state_dict_cache(checkpoint, state_dict_cache, lazy):
+    path, expected = checkpoint
+    hits = state_dict_cache.stats["hits"]
+    sd = comfy.utils.load_torch_file(path, lazy=lazy)
+    sd.pop("model.diffusion_model.a.weight")
+    sd["extra"] = torch.zeros(1)
+
+    cached = comfy.utils.load_torch_file(path, lazy=lazy)
+    assert state_dict_cache.stats["hits"] == hits + 1
+    assert cached is not sd
+    assert sorted(cached.keys()) == sorted(expected.keys())
+    assert torch.equal(cached["model.diffusion_model.a.weight"], expected["model.diffusion_model.a.weight"])
+
+
+def test_state_dict_cache_invalidated_by_change(checkpoint, state_dict_cache):
+    path, _ = checkpoint
+    comfy.utils.load_torch_file(path)
+    safetensors.torch.save_file({"new": torch.ones(3)}, path)
+    sd = comfy.utils.load_torch_file(path)
+    assert list(sd.keys()) == ["new"]
+
+
+def test_state_dict_cache_eviction(tmp_path):
+    cache = comfy.utils.StateDictCache(max_bytes=10)
+    cache.put("a", {"x": 1}, 6)
+    cache.put("b", {"x": 2}, 6)
+    assert cache.get("a") is None
+    assert cache.get("b") == {"x": 2}
+    assert cache.stats["evictions"] == 1
+    cache.put("c", {"x": 3}, 11)
+    assert cache.get("c") is None
+    assert cache.hit_rate() == pytest.approx(1 / 3)
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+args.cpu = True  # comfy.model_management picks the torch device on import
+
+import comfy.lora
+
+
+def lora_patch(g, out_features, in_shape, rank, strength, alpha=None):
+    up = torch.randn(out_features, rank, generator=g) * 0.1
+    down = torch.randn((rank,) + in_shape, generator=g) * 0.1
+    return (strength, ("lora", (up, down, alpha, None, None, None)), 1.0, None, None)
+
+
+def make_items(g, count, n_loras, shape=(32, 48), rank=4):
+    items = []
+    for i in range(count):
+        weight = torch.randn(shape, generator=g)
+        patches = [lora_patch(g, shape[0], tuple(shape[1:]), rank, 0.5 + j * 0.1, alpha=2.0 if j % 2 else None) for j in range(n_loras)]
+        items.append(("w{}".format(i), patches, weight))
+    return items
+
+
+def reference(items):
+    return [comfy.lora.calculate_weight(patches, weight.clone(), key) for key, patches, weight in items]
+
+
+def test_calculate_weights_matches_calculate_weight():
+    g = torch.Generator().manual_seed(0)
+    items = make_items(g, 5, 3)
+    items += make_items(g, 3, 2, shape=(16, 8, 3, 3))
+    # not a plain lora, goes through calculate_weight
+    items.append(("diff", [(0.5, (torch.randn(32, 48, generator=g),), 1.0, None, None)], torch.randn(32, 48, generator=g)))
+    items.append(("strength_model", [lora_patch(g, 32, (48,), 4, 1.0)[:2] + (0.5, None, None)], torch.randn(32, 48, generator=g)))
+    expected = reference(items)
+
+    # a small batch size splits the groups into several baddbmm calls
+    out = comfy.lora.calculate_weights([(k, p, w.clone()) for k, p, w in items], max_batch_bytes=32 * 48 * 4 * 3)
+    assert len(out) == len(expected)
+    for a, b in zip(out, expected):
+        assert a.shape == b.shape
+        assert torch.allclose(a, b, atol=1e-5)
+
+
+def test_calculate_weights_does_not_modify_inputs():
+    g = torch.Generator().manual_seed(1)
+    items = make_items(g, 2, 2)
+    originals = [w.clone() for _, _, w in items]
+    comfy.lora.calculate_weights(items)
+    for (_, _, w), original in zip(items, originals):
+        assert torch.equal(w, original)
+
+
+@pytest.mark.parametrize("count,n_loras", [(400, 20)])
+def test_batched_lora_merge_benchmark(count, n_loras, record_property):
+    g = torch.Generator().manual_seed(2)
+    items = make_items(g, count, n_loras, shape=(64, 64), rank=8)
+
+    start = time.perf_counter()
+    expected = reference(items)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out = comfy.lora.calculate_weights([(k, p, w.clone()) for k, p, w in items])
+    batched = time.perf_counter() - start
+
+    # Timings are only reported (in the junit xml with --junitxml), they are too noisy on shared runners to assert on
+    record_property("per_key_seconds", round(sequential, 4))
+    record_property("batched_seconds", round(batched, 4))
+    assert len(out) == len(expected)
+    for a, b in zip(out, expected):
+        assert torch.allclose(a, b, atol=1e-4)
+
+
+class Everything:
+    def __contains__(self, x):
+        return True
+
+
+def test_load_lora_bulk_matching_matches_full_scan(monkeypatch):
+    g = torch.Generator().manual_seed(0)
+    t = lambda *shape: torch.randn(shape, generator=g)
+    key_map = {"lora_te_layer_{}".format(i): "clip_l.layer.{}.weight".format(i) for i in range(40)}
+    key_map.update({"layer_{}".format(i): "clip_l.layer.{}.weight".format(i) for i in range(40)})
+    lora = {
+        "lora_te_layer_0.lora_up.weight": t(8, 2), "lora_te_layer_0.lora_down.weight": t(2, 8), "lora_te_layer_0.alpha": torch.tensor(1.0),
+        "lora_te_layer_1_lora.up.weight": t(8, 2), "lora_te_layer_1_lora.down.weight": t(2, 8),
+        "lora_te_layer_2.lora_B.weight": t(8, 2), "lora_te_layer_2.lora_A.weight": t(2, 8),
+        "lora_te_layer_3.lora_linear_layer.up.weight": t(8, 2), "lora_te_layer_3.lora_linear_layer.down.weight": t(2, 8),
+        "lora_te_layer_4.hada_w1_a": t(8, 2), "lora_te_layer_4.hada_w1_b": t(2, 8), "lora_te_layer_4.hada_w2_a": t(8, 2), "lora_te_layer_4.hada_w2_b": t(2, 8),
+        "lora_te_layer_5.lokr_w1": t(2, 2), "lora_te_layer_5.lokr_w2_a": t(4, 2), "lora_te_layer_5.lokr_w2_b": t(2, 4),
+        "lora_te_layer_6.diff": t(8, 8), "lora_te_layer_6.diff_b": t(8),
+        "lora_te_layer_7.set_weight": t(8, 8),
+        "lora_te_layer_8.alpha": torch.tensor(4.0),  # only an alpha, loaded without producing a patch
+        "layer_0.lora.up.weight": t(8, 2), "layer_0.lora.down.weight": t(2, 8),  # maps to the same weight as lora_te_layer_0
+        "layer_9.w_norm": t(8), "layer_9.b_norm": t(8),
+        "unknown.lora_up.weight": t(8, 2),
+    }
+    assert comfy.lora.lora_layer_names(lora) >= {"lora_te_layer_{}".format(i) for i in range(9)}
+
+    loaded = comfy.lora.load_lora(lora, key_map)
+    monkeypatch.setattr(comfy.lora, "lora_layer_names", lambda lora: Everything())
+    expected = comfy.lora.load_lora(lora, key_map)
+
+    assert list(loaded.keys()) == list(expected.keys())
+    for k in expected:
+        assert loaded[k][0] == expected[k][0]
+        assert all(a is b for a, b in zip(loaded[k][1], expected[k][1]))
+
+
+class CountingClip(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.clip_l = torch.nn.Module()
+        self.clip_l.transformer = torch.nn.Linear(4, 4)
+        self.state_dict_calls = 0
+
+    def state_dict(self, *args, **kwargs):
+        self.state_dict_calls += 1
+        return super().state_dict(*args, **kwargs)
+
+
+def test_model_lora_keys_are_memoized_on_the_model():
+    model = CountingClip()
+    first = comfy.lora.model_lora_keys_clip(model, {"existing": "key"})
+    second = comfy.lora.model_lora_keys_clip(model, {})
+    assert model.state_dict_calls == 1
+    assert first == dict(second, existing="key")
+    assert second["text_encoders.clip_l.transformer"] == "clip_l.transformer.weight"
+
+    # the returned map belongs to the caller, changing it doesn't affect the memoized one
+    second["added"] = "key"
+    assert "added" not in comfy.lora.model_lora_keys_clip(model, {})
+
+    other = CountingClip()
+    assert comfy.lora.model_lora_keys_clip(other, {}) == comfy.lora.model_lora_keys_clip(model, {})
+    assert other.state_dict_calls == 1
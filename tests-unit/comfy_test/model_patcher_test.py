@@ -0,0 +1,128 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+args.cpu = True  # comfy.model_management picks the torch device on import
+
+import comfy.model_patcher
+import comfy.ops
+
+
+def make_model(weights):
+    model = torch.nn.Sequential(*[comfy.ops.manual_cast.Linear(64, 64, dtype=torch.float16) for _ in range(6)])
+    model.load_state_dict(weights)
+    return model
+
+
+@pytest.fixture
+def weights():
+    g = torch.Generator().manual_seed(0)
+    return {"{}.{}".format(i, k): torch.randn(shape, generator=g).half() for i in range(6) for k, shape in (("weight", (64, 64)), ("bias", (64,)))}
+
+
+@pytest.fixture
+def lora_patches(weights):
+    g = torch.Generator().manual_seed(1)
+    out = []
+    for _ in range(3):
+        out.append({k: ("lora", (torch.randn(64, 4, generator=g), torch.randn(4, 64, generator=g), None, None, None, None)) for k in weights if k.endswith("weight")})
+    return out
+
+
+def patched_state_dict(weights, lora_patches, workers, monkeypatch):
+    monkeypatch.setattr(comfy.model_patcher, "PATCH_WORKERS", workers)
+    monkeypatch.setattr(comfy.model_patcher, "_patch_executor", None)
+    model = make_model(weights)
+    patcher = comfy.model_patcher.ModelPatcher(model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    for p in lora_patches:
+        patcher.add_patches(p, 0.5)
+    patcher.patch_model(torch.device("cpu"))
+    out = {k: v.clone() for k, v in model.state_dict().items()}
+    patcher.unpatch_model()
+    for k, v in model.state_dict().items():
+        assert torch.equal(v, weights[k])
+    return out
+
+
+def test_pipelined_patching_matches_sequential(weights, lora_patches, monkeypatch):
+    sequential = patched_state_dict(weights, lora_patches, 1, monkeypatch)
+    pipelined = patched_state_dict(weights, lora_patches, 4, monkeypatch)
+    assert sequential.keys() == pipelined.keys()
+    for k in sequential:
+        assert torch.equal(sequential[k], pipelined[k])
+    assert not torch.equal(sequential["0.weight"], weights["0.weight"])
+    assert torch.equal(sequential["0.bias"], weights["0.bias"])
+
+
+def test_patched_weight_cache(weights, lora_patches, monkeypatch):
+    monkeypatch.setattr(comfy.model_patcher, "PATCH_WORKERS", 1)
+    cache = comfy.model_patcher.patched_weight_cache
+    monkeypatch.setattr(cache, "max_bytes", 1024 * 1024)
+    cache.clear()
+
+    model = make_model(weights)
+    patcher = comfy.model_patcher.ModelPatcher(model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    first = patcher.clone()
+    first.add_patches(lora_patches[0], 0.5)
+    second = patcher.clone()
+    second.add_patches(lora_patches[1], 0.5)
+
+    results = []
+    for p in (first, second, first):
+        p.patch_model(torch.device("cpu"))
+        results.append({k: v.clone() for k, v in model.state_dict().items()})
+        p.unpatch_model()
+
+    assert cache.stats["hits"] == 6
+    assert cache.size == 12 * 64 * 64 * 2
+    for k in weights:
+        assert torch.equal(results[0][k], results[2][k])
+    assert not torch.equal(results[0]["0.weight"], results[1]["0.weight"])
+    for k, v in model.state_dict().items():
+        assert torch.equal(v, weights[k])
+    cache.clear()
+
+
+class ConvModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = comfy.ops.disable_weight_init.Conv2d(8, 16, 3, padding=1)
+        self.linear = comfy.ops.disable_weight_init.Linear(16, 8)
+
+    def forward(self, x):
+        return self.linear(self.conv(x).mean(dim=(2, 3)))
+
+
+def run_patched(unmerged, monkeypatch, strength, lowvram=False):
+    monkeypatch.setattr(args, "unmerged_lora", unmerged)
+    g = torch.Generator().manual_seed(0)
+    model = ConvModel()
+    model.load_state_dict({k: torch.randn(v.shape, generator=g) for k, v in model.state_dict().items()})
+    base = {k: v.clone() for k, v in model.state_dict().items()}
+    patches = {
+        "conv.weight": ("lora", (torch.randn(16, 4, 1, 1, generator=g), torch.randn(4, 8, 3, 3, generator=g), 2.0, None, None, None)),
+        "linear.weight": ("lora", (torch.randn(8, 4, generator=g), torch.randn(4, 16, generator=g), None, None, None, None)),
+        "linear.bias": ("diff", (torch.randn(8, generator=g),)),
+    }
+    patcher = comfy.model_patcher.ModelPatcher(model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    patcher.add_patches(patches, strength)
+    patcher.patch_model(torch.device("cpu"), lowvram_model_memory=1 if lowvram else 0)
+    x = torch.randn(2, 8, 6, 6, generator=g)
+    with torch.no_grad():
+        out = model(x)
+    patched_weight = model.conv.weight.clone()
+    patcher.unpatch_model()
+    assert model.conv.lora_branch is None
+    assert torch.equal(model.conv.weight, base["conv.weight"])
+    return out, patched_weight, base
+
+
+@pytest.mark.parametrize("lowvram", [False, True])
+# strength 0 is what LoraLoader adds to the model with strength_model=0
+@pytest.mark.parametrize("strength", [0.7, 0.0])
+def test_unmerged_lora_matches_merged(monkeypatch, lowvram, strength):
+    merged, merged_weight, base = run_patched(False, monkeypatch, strength, lowvram)
+    unmerged, unmerged_weight, _ = run_patched(True, monkeypatch, strength, lowvram)
+    # the weight stays untouched, the lora is applied as a side branch
+    assert torch.equal(unmerged_weight, base["conv.weight"])
+    assert torch.allclose(merged, unmerged, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,100 @@
+import pytest
+from comfy_execution import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_counter(registry):
+    c = metrics.Counter("test_total", "A counter.", ["kind"], registry=registry)
+    c.labels("a").inc()
+    c.labels("a").inc(2)
+    c.labels("b").inc()
+    out = registry.generate_latest()
+    assert "# TYPE test_total counter" in out
+    assert 'test_total{kind="a"} 3' in out
+    assert 'test_total{kind="b"} 1' in out
+
+
+def test_counter_rejects_negative(registry):
+    c = metrics.Counter("test_total", "A counter.", registry=registry)
+    with pytest.raises(ValueError):
+        c.inc(-1)
+
+
+def test_labels_required(registry):
+    c = metrics.Counter("test_total", "A counter.", ["kind"], registry=registry)
+    with pytest.raises(ValueError):
+        c.inc()
+
+
+def test_gauge_function(registry):
+    items = [1, 2, 3]
+    g = metrics.Gauge("test_items", "A gauge.", registry=registry)
+    g.set_function(lambda: len(items))
+    assert "test_items 3" in registry.generate_latest()
+    items.append(4)
+    assert "test_items 4" in registry.generate_latest()
+
+
+def test_histogram(registry):
+    h = metrics.Histogram("test_seconds", "A histogram.", buckets=[0.1, 1.0], registry=registry)
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5)
+    out = registry.generate_latest().splitlines()
+    assert 'test_seconds_bucket{le="0.1"} 1' in out
+    assert 'test_seconds_bucket{le="1"} 2' in out
+    assert 'test_seconds_bucket{le="+Inf"} 3' in out
+    assert "test_seconds_sum 5.55" in out
+    assert "test_seconds_count 3" in out
+
+
+def test_label_escaping(registry):
+    c = metrics.Counter("test_total", "A counter.", ["class_type"], registry=registry)
+    c.labels('a"b\\c').inc()
+    assert 'test_total{class_type="a\\"b\\\\c"} 1' in registry.generate_latest()
+
+
+def test_duplicate_registration(registry):
+    metrics.Counter("test_total", "A counter.", registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Counter("test_total", "A counter.", registry=registry)
+    assert metrics.get_or_create(metrics.Counter, "test_total", "A counter.", registry=registry) is registry.get("test_total")
+
+
+def test_collector_runs_before_render(registry):
+    g = metrics.Gauge("test_value", "A gauge.", registry=registry)
+    registry.add_collector(lambda: g.set(7))
+    assert "test_value 7" in registry.generate_latest()
+
+
+def test_cache_lookups_are_counted_once_per_node_and_prompt():
+    pytest.importorskip("torch")
+    from comfy.cli_args import args
+    args.cpu = True  # comfy.model_management picks the torch device on import
+    from comfy_execution import caching
+    from comfy_execution.graph import DynamicPrompt
+
+    prompt = DynamicPrompt({"1": {"class_type": "PrimitiveNode", "inputs": {}}, "2": {"class_type": "PrimitiveNode", "inputs": {}}})
+    cache = caching.HierarchicalCache(caching.CacheKeySetID)
+    cache.set_prompt(prompt, ["1", "2"], None)
+    cache.set_metrics_name("test_record_lookup")
+    hit = caching.CACHE_LOOKUPS.labels("test_record_lookup", "hit")
+    miss = caching.CACHE_LOOKUPS.labels("test_record_lookup", "miss")
+    # plain gets (prechecks, reading inputs) are not counted
+    cache.set("1", "value")
+    cache.get("1")
+    cache.get("2")
+    assert hit.value == 0 and miss.value == 0
+
+    cache.record_lookup("1", False)
+    cache.record_lookup("1", False)  # executed again after its lazy inputs were evaluated
+    cache.record_lookup("2", True)
+    assert miss.value == 1 and hit.value == 1
+
+    cache.set_prompt(prompt, ["1", "2"], None)
+    cache.record_lookup("1", True)
+    assert miss.value == 1 and hit.value == 2
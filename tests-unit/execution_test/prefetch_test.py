@@ -0,0 +1,121 @@
+import heapq
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from comfy_execution import prefetch
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    for name, size in (("a.safetensors", 3000), ("b.safetensors", 5000), ("lora.safetensors", 1000), ("big.safetensors", 20000)):
+        (tmp_path / name).write_bytes(os.urandom(size))
+
+    def get_full_path(folder_name, filename):
+        path = os.path.join(str(tmp_path), filename)
+        return path if os.path.isfile(path) else None
+    monkeypatch.setattr(prefetch.folder_paths, "get_full_path", get_full_path)
+    monkeypatch.setattr(prefetch, "READ_CHUNK_SIZE", 1024)
+    return tmp_path
+
+
+def make_queue(*prompts):
+    queue = []
+    for i, prompt in enumerate(prompts):
+        heapq.heappush(queue, (i, "prompt{}".format(i), prompt, {}, []))
+    return SimpleNamespace(mutex=threading.RLock(), queue=queue)
+
+
+def checkpoint_prompt(ckpt_name, lora_name=None):
+    prompt = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt_name}},
+        "2": {"class_type": "KSampler", "inputs": {"model": ["1", 0], "seed": 5}},
+    }
+    if lora_name is not None:
+        prompt["3"] = {"class_type": "LoraLoader", "inputs": {"lora_name": lora_name, "model": ["1", 0], "clip": ["1", 1]}}
+    return prompt
+
+
+def test_prompt_model_files(model_dir):
+    prompt = checkpoint_prompt("a.safetensors", "lora.safetensors")
+    prompt["4"] = {"class_type": "UNETLoader", "inputs": {"unet_name": "missing.safetensors"}}
+    prompt["5"] = {"class_type": "VAELoader", "inputs": {"vae_name": ["6", 0]}}
+    assert prefetch.prompt_model_files(prompt) == [str(model_dir / "a.safetensors"), str(model_dir / "lora.safetensors")]
+
+
+def test_prefetch_reads_upcoming_files_within_budget(model_dir):
+    queue = make_queue(checkpoint_prompt("a.safetensors", "lora.safetensors"), checkpoint_prompt("big.safetensors"), checkpoint_prompt("b.safetensors"))
+    prefetcher = prefetch.ModelPrefetcher(queue, lookahead=3, max_bytes=10000)
+    try:
+        prefetcher.prefetch()
+        # big doesn't fit in the budget
+        assert prefetcher.stats["files"] == 3
+        assert prefetcher.stats["bytes"] == 3000 + 1000 + 5000
+        assert list(prefetcher.prefetched) == [str(model_dir / x) for x in ("a.safetensors", "lora.safetensors", "b.safetensors")]
+
+        # files read recently are not read again
+        prefetcher.prefetch()
+        assert prefetcher.stats["files"] == 3
+
+        # unless they changed
+        (model_dir / "a.safetensors").write_bytes(os.urandom(3001))
+        prefetcher.prefetch()
+        assert prefetcher.stats["files"] == 4
+    finally:
+        prefetcher.stop()
+
+
+def test_prefetch_only_looks_ahead_lookahead_prompts(model_dir):
+    queue = make_queue(checkpoint_prompt("a.safetensors"), checkpoint_prompt("b.safetensors"))
+    prefetcher = prefetch.ModelPrefetcher(queue, lookahead=1, max_bytes=10000)
+    try:
+        assert prefetcher.upcoming_files() == [str(model_dir / "a.safetensors")]
+    finally:
+        prefetcher.stop()
+
+
+def test_wake_prefetches_in_the_background(model_dir):
+    queue = make_queue(checkpoint_prompt("b.safetensors"))
+    prefetcher = prefetch.ModelPrefetcher(queue, lookahead=2, max_bytes=10000)
+    try:
+        prefetcher.wake()
+        deadline = time.perf_counter() + 5
+        while prefetcher.stats["files"] == 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert prefetcher.stats["bytes"] == 5000
+    finally:
+        prefetcher.stop()
+        prefetcher.thread.join(timeout=5)
+    assert not prefetcher.thread.is_alive()
+
+
+def test_prefetch_waits_for_the_loaders_of_the_running_prompt(model_dir):
+    queue = make_queue(checkpoint_prompt("b.safetensors"))
+    prefetcher = prefetch.ModelPrefetcher(queue, lookahead=2, max_bytes=10000)
+    try:
+        prefetcher.prompt_started(checkpoint_prompt("a.safetensors", "lora.safetensors"))
+        prefetcher.prefetch()
+        assert prefetcher.stats["files"] == 0
+
+        # the sampler isn't a loader, the lora loader still is to run
+        prefetcher.node_done("1")
+        prefetcher.node_done("2")
+        assert prefetcher.loading()
+        prefetcher.node_done("3")
+        assert not prefetcher.loading()
+        deadline = time.perf_counter() + 5
+        while prefetcher.stats["files"] == 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        assert prefetcher.stats["bytes"] == 5000
+
+        # a prompt without loaders doesn't hold it off, prompt_finished releases one that has some
+        prefetcher.prompt_started({"1": {"class_type": "KSampler", "inputs": {}}})
+        assert not prefetcher.loading()
+        prefetcher.prompt_started(checkpoint_prompt("a.safetensors"))
+        prefetcher.prompt_finished()
+        assert not prefetcher.loading()
+    finally:
+        prefetcher.stop()
@@ -0,0 +1,48 @@
+import pytest
+from types import SimpleNamespace
+
+torch = pytest.importorskip("torch")
+
+from comfy.cli_args import args
+args.cpu = True  # comfy.model_management picks the torch device on import
+
+from comfy_execution.profiler import output_size_bytes, ProfileSummary
+
+
+def test_output_size_bytes():
+    image = torch.zeros((1, 8, 8, 3), dtype=torch.float32)
+    latent = {"samples": torch.zeros((1, 4, 8, 8), dtype=torch.float16)}
+    assert output_size_bytes([[image], [latent], ["text"], [object()]]) == 8 * 8 * 3 * 4 + 4 * 8 * 8 * 2
+
+
+def _entry(class_type, wall_time, cached=False):
+    return {
+        "class_type": class_type,
+        "cached": cached,
+        "executions": 0 if cached else 1,
+        "wall_time": wall_time,
+        "model_load_time": 0.5 if not cached else 0.0,
+        "peak_memory_allocated": None,
+        "ram_rss": None,
+        "output_bytes": 10,
+    }
+
+
+def test_profile_summary():
+    summary = ProfileSummary()
+    summary.add(SimpleNamespace(nodes={"1": _entry("KSampler", 2.0), "2": _entry("VAEDecode", 1.0)}))
+    summary.add(SimpleNamespace(nodes={"1": _entry("KSampler", 4.0), "2": _entry("VAEDecode", 0.0, cached=True)}))
+
+    out = summary.get()
+    assert out["prompts"] == 2
+    ksampler = out["classes"]["KSampler"]
+    assert ksampler["count"] == 2
+    assert ksampler["mean_wall_time"] == 3.0
+    assert ksampler["max_wall_time"] == 4.0
+    assert ksampler["total_model_load_time"] == 1.0
+    assert out["classes"]["VAEDecode"]["cache_hit_rate"] == 0.5
+
+    assert list(summary.get("VAEDecode")["classes"].keys()) == ["VAEDecode"]
+
+    summary.clear()
+    assert summary.get() == {"prompts": 0, "classes": {}}
@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+import folder_paths
+from app.model_file_index import DirectoryIndex, ModelFileIndex, InotifyWatcher
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    os.makedirs(tmp_path / "sub" / ".git")
+    (tmp_path / "a.safetensors").write_bytes(b"")
+    (tmp_path / "sub" / "b.safetensors").write_bytes(b"")
+    (tmp_path / "sub" / "notes.txt").write_bytes(b"")
+    (tmp_path / "sub" / ".git" / "c.safetensors").write_bytes(b"")
+    return str(tmp_path)
+
+
+def test_directory_index(model_dir):
+    index = DirectoryIndex(model_dir)
+    index.refresh()
+    assert sorted(index.files()) == ["a.safetensors", os.path.join("sub", "b.safetensors"), os.path.join("sub", "notes.txt")]
+    assert index.contains(os.path.join("sub", "b.safetensors"))
+    assert not index.contains("b.safetensors")
+
+    os.remove(os.path.join(model_dir, "sub", "b.safetensors"))
+    assert index.changed_dirs() == ["sub"]
+    index.mark_dirty("sub")
+    index.refresh()
+    assert not index.contains(os.path.join("sub", "b.safetensors"))
+
+
+@pytest.mark.parametrize("mode", ["poll", "inotify"])
+def test_model_file_index_picks_up_changes(model_dir, mode):
+    if mode == "inotify" and not InotifyWatcher.available():
+        pytest.skip("inotify is only available on Linux")
+    index = ModelFileIndex(mode, poll_interval=0.05)
+    assert index.polling == (mode == "poll")
+    extensions = {".safetensors"}
+    assert index.get_filename_list([model_dir], extensions) == ["a.safetensors", os.path.join("sub", "b.safetensors")]
+
+    os.makedirs(os.path.join(model_dir, "new"))
+    open(os.path.join(model_dir, "new", "d.safetensors"), "w").close()
+    os.rename(os.path.join(model_dir, "a.safetensors"), os.path.join(model_dir, "sub", "a2.safetensors"))
+    expected = [os.path.join("new", "d.safetensors"), os.path.join("sub", "a2.safetensors"), os.path.join("sub", "b.safetensors")]
+    assert wait_for(lambda: index.get_filename_list([model_dir], extensions) == expected)
+    assert index.get_full_path([model_dir], os.path.join("new", "d.safetensors")) == os.path.join(model_dir, "new", "d.safetensors")
+    assert index.get_full_path([model_dir], "a.safetensors") is None
+
+
+def test_missing_root_is_picked_up(tmp_path):
+    index = ModelFileIndex("poll", poll_interval=0.05)
+    root = str(tmp_path / "later")
+    assert index.get_filename_list([root], set()) == []
+    os.makedirs(root)
+    open(os.path.join(root, "x.bin"), "w").close()
+    assert wait_for(lambda: index.get_filename_list([root], set()) == ["x.bin"])
+
+
+@pytest.fixture
+def enabled_index(monkeypatch, model_dir):
+    monkeypatch.setattr(folder_paths, "model_file_index", ModelFileIndex("poll", poll_interval=60))
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "test_models", ([model_dir], {".safetensors"}))
+
+
+def test_folder_paths_uses_index(enabled_index, model_dir):
+    assert folder_paths.get_filename_list("test_models") == ["a.safetensors", os.path.join("sub", "b.safetensors")]
+    assert folder_paths.get_full_path("test_models", "sub/b.safetensors") == os.path.join(model_dir, "sub", "b.safetensors")
+    # Files the index doesn't know about yet are still found on disk
+    open(os.path.join(model_dir, "late.safetensors"), "w").close()
+    assert folder_paths.get_full_path("test_models", "late.safetensors") == os.path.join(model_dir, "late.safetensors")
+    assert folder_paths.get_full_path("test_models", "missing.safetensors") is None
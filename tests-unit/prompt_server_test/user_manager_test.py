@@ -229,3 +229,84 @@ async def test_move_userdata_full_info(aiohttp_client, app, tmp_path):
     assert not os.path.exists(tmp_path / "source.txt")
     with open(tmp_path / "dest.txt", "r") as f:
         assert f.read() == "test content"
+
+
+async def test_listuserdata_pagination(aiohttp_client, app, tmp_path):
+    os.makedirs(tmp_path / "test_dir")
+    for name in ["c.txt", "a.txt", "b.txt"]:
+        with open(tmp_path / "test_dir" / name, "w") as f:
+            f.write("test content")
+
+    client = await aiohttp_client(app)
+    resp = await client.get("/userdata?dir=test_dir&offset=1&limit=1")
+    assert resp.status == 200
+    assert await resp.json() == ["b.txt"]
+    assert resp.headers["X-Total-Count"] == "3"
+
+    resp = await client.get("/userdata?dir=test_dir&offset=1")
+    assert await resp.json() == ["b.txt", "c.txt"]
+
+    resp = await client.get("/userdata?dir=test_dir&limit=-1")
+    assert resp.status == 400
+
+
+async def test_listuserdata_index_tracks_api_changes(aiohttp_client, app, tmp_path):
+    os.makedirs(tmp_path / "test_dir")
+    with open(tmp_path / "test_dir" / "file1.txt", "w") as f:
+        f.write("test content")
+
+    client = await aiohttp_client(app)
+    resp = await client.get("/userdata?dir=test_dir&recurse=true")
+    assert await resp.json() == ["file1.txt"]
+
+    os.makedirs(tmp_path / "test_dir" / "subdir")  # created by get_request_user_filepath outside of tests
+    await client.post("/userdata/test_dir%2Fsubdir%2Ffile2.txt", data=b"new")
+    await client.post("/userdata/test_dir%2Ffile1.txt/move/test_dir%2Ffile3.txt")
+    resp = await client.get("/userdata?dir=test_dir&recurse=true&full_info=true")
+    result = await resp.json()
+    assert [x["path"] for x in result] == ["file3.txt", "subdir/file2.txt"]
+    assert result[1]["size"] == 3
+
+    await client.delete("/userdata/test_dir%2Ffile3.txt")
+    resp = await client.get("/userdata?dir=test_dir&recurse=true")
+    assert await resp.json() == ["subdir/file2.txt"]
+
+
+async def test_listuserdata_index_tracks_external_changes(aiohttp_client, app, tmp_path):
+    os.makedirs(tmp_path / "test_dir")
+    with open(tmp_path / "test_dir" / "file1.txt", "w") as f:
+        f.write("test content")
+
+    client = await aiohttp_client(app)
+    resp = await client.get("/userdata?dir=test_dir")
+    assert await resp.json() == ["file1.txt"]
+
+    os.remove(tmp_path / "test_dir" / "file1.txt")
+    os.makedirs(tmp_path / "test_dir" / "subdir")
+    with open(tmp_path / "test_dir" / "subdir" / "file2.txt", "w") as f:
+        f.write("test content")
+    with open(tmp_path / "test_dir" / ".hidden", "w") as f:
+        f.write("test content")
+
+    resp = await client.get("/userdata?dir=test_dir&recurse=true")
+    assert await resp.json() == ["subdir/file2.txt"]
+
+
+async def test_listuserdata_follows_symlinked_directories(aiohttp_client, app, tmp_path, tmp_path_factory):
+    shared = tmp_path_factory.mktemp("shared_workflows")
+    with open(shared / "shared.json", "w") as f:
+        f.write("{}")
+    os.makedirs(tmp_path / "test_dir")
+    with open(tmp_path / "test_dir" / "file1.txt", "w") as f:
+        f.write("test content")
+    try:
+        os.symlink(shared, tmp_path / "test_dir" / "linked", target_is_directory=True)
+        # links to the directory itself or a parent are not followed
+        os.symlink(tmp_path / "test_dir", tmp_path / "test_dir" / "loop", target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip("symlinks are not supported")
+
+    client = await aiohttp_client(app)
+    resp = await client.get("/userdata?dir=test_dir&recurse=true")
+    assert resp.status == 200
+    assert set(await resp.json()) == {"file1.txt", "linked/shared.json"}
@@ -113,3 +113,20 @@ async def test_file_service_initialization():
 
         # Verify that the file_service attribute of InternalRoutes is set
         assert internal_routes.file_service == mock_file_service_instance
+
+@pytest.mark.asyncio
+async def test_startup_profile(aiohttp_client_factory, monkeypatch):
+    from app import startup_profiler
+    monkeypatch.setattr(startup_profiler, "profiler", None)
+    client = await aiohttp_client_factory()
+    resp = await client.get('/startup_profile')
+    assert resp.status == 404
+
+    profiler = startup_profiler.StartupProfiler()
+    profiler.start_phase("imports")
+    profiler.finish()
+    monkeypatch.setattr(startup_profiler, "profiler", profiler)
+    resp = await client.get('/startup_profile')
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["finished"] and data["phases"][0]["name"] == "imports"
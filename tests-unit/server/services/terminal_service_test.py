@@ -0,0 +1,42 @@
+from unittest.mock import MagicMock
+
+from api_server.services.terminal_service import TerminalService
+
+
+class ImmediateLoop:
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+    def call_later(self, delay, callback):
+        self.scheduled = callback
+
+
+def test_send_messages_batches_and_coalesces_progress():
+    server = MagicMock()
+    server.loop = ImmediateLoop()
+    server.sockets = {"client": None}
+    service = TerminalService(server)
+    service.subscribe("client")
+
+    service.send_messages([{"t": "0", "m": "Sampling\n"}])
+    service.send_messages([{"t": "1", "m": "\r 10%"}])
+    service.send_messages([{"t": "2", "m": "\r 90%"}])
+    server.send_sync.assert_not_called()
+
+    server.loop.scheduled()
+    server.send_sync.assert_called_once()
+    event, data, sid = server.send_sync.call_args.args
+    assert (event, sid) == ("logs", "client")
+    assert [x["m"] for x in data["entries"]] == ["Sampling\n", "\r 90%"]
+
+    # A new batch is scheduled once the previous one went out
+    service.send_messages([{"t": "3", "m": "done\n"}])
+    server.loop.scheduled()
+    assert server.send_sync.call_count == 2
+
+
+def test_send_messages_without_subscribers():
+    server = MagicMock()
+    service = TerminalService(server)
+    service.send_messages([{"t": "0", "m": "hello\n"}])
+    server.loop.call_soon_threadsafe.assert_not_called()